@@ -5,7 +5,8 @@ from django.utils.translation import gettext_lazy as _
 from .models import (
     Game, CustomUser, ProposedGame, Character, Message,
     CharacterFriend, CharacterFriendRequest, CharacterProfile,
-    Poke, PokeBlock, CharacterIdentityReveal, CharacterBlock
+    Poke, PokeBlock, CharacterIdentityReveal, CharacterBlock, Conversation,
+    NotificationCounter, MessageArchive, PokeInboxEntry, UserFriendship
 )
 
 class CustomUserAdmin(UserAdmin):
@@ -47,10 +48,36 @@ class CharacterProfileAdmin(admin.ModelAdmin):
     search_fields = ('character__nickname',)
 
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('sender_character', 'receiver_character', 'privacy_mode', 'is_read', 'sent_date')
-    list_filter = ('privacy_mode', 'is_read', 'sent_date')
+    list_display = ('sender_character', 'receiver_character', 'privacy_mode', 'sent_date')
+    ordering = ('-sent_date',)
+    list_filter = ('privacy_mode', 'sent_date')
     search_fields = ('sender_character__nickname', 'receiver_character__nickname', 'content')
 
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('character_a', 'character_b', 'last_sent_date', 'unread_count_a', 'unread_count_b')
+    search_fields = ('character_a__nickname', 'character_b__nickname', 'thread_id')
+    readonly_fields = ('thread_id', 'last_message', 'last_sent_date')
+
+class MessageArchiveAdmin(admin.ModelAdmin):
+    list_display = ('thread_id', 'character_a', 'character_b', 'message_count', 'last_sent_date', 'archived_at')
+    search_fields = ('thread_id', 'character_a__nickname', 'character_b__nickname')
+    exclude = ('payload',)
+
+class PokeInboxEntryAdmin(admin.ModelAdmin):
+    list_display = ('owner_character', 'direction', 'other_character', 'status', 'sent_date')
+    list_filter = ('direction', 'status')
+    search_fields = ('owner_character__nickname', 'other_character__nickname')
+    readonly_fields = ('poke', 'owner_character', 'other_character', 'direction', 'status', 'sent_date')
+
+class UserFriendshipAdmin(admin.ModelAdmin):
+    list_display = ('user1', 'user2', 'character_pairs')
+    search_fields = ('user1__username', 'user2__username')
+    readonly_fields = ('user1', 'user2', 'character_pairs')
+
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ('user', 'unread_messages', 'unread_pokes', 'pending_friend_requests')
+    search_fields = ('user__username',)
+
 class PokeAdmin(admin.ModelAdmin):
     list_display = ('sender_character', 'receiver_character', 'status', 'sent_date', 'is_read', 'reported_as_spam')
     list_filter = ('status', 'sent_date', 'is_read', 'reported_as_spam')
@@ -69,11 +96,16 @@ admin.site.register(Game)
 admin.site.register(ProposedGame, ProposedGameAdmin)
 admin.site.register(Character)
 admin.site.register(Message, MessageAdmin)
+admin.site.register(Conversation, ConversationAdmin)
+admin.site.register(NotificationCounter, NotificationCounterAdmin)
+admin.site.register(MessageArchive, MessageArchiveAdmin)
 admin.site.register(CharacterFriend, CharacterFriendAdmin)
+admin.site.register(UserFriendship, UserFriendshipAdmin)
 admin.site.register(CharacterFriendRequest, CharacterFriendRequestAdmin)
 admin.site.register(CharacterProfile, CharacterProfileAdmin)
 admin.site.register(Poke, PokeAdmin)
 admin.site.register(PokeBlock, PokeBlockAdmin)
+admin.site.register(PokeInboxEntry, PokeInboxEntryAdmin)
 
 class CharacterIdentityRevealAdmin(admin.ModelAdmin):
     list_display = ('revealing_character', 'revealed_to_character', 'is_active', 'revealed_at', 'revoked_at')
@@ -82,8 +114,8 @@ class CharacterIdentityRevealAdmin(admin.ModelAdmin):
     readonly_fields = ('revealed_at', 'revoked_at')
 
 class CharacterBlockAdmin(admin.ModelAdmin):
-    list_display = ('blocker_character', 'blocked_character', 'reported_as_spam', 'blocked_at')
-    list_filter = ('reported_as_spam', 'blocked_at')
+    list_display = ('blocker_character', 'blocked_character', 'scope', 'reported_as_spam', 'blocked_at')
+    list_filter = ('scope', 'reported_as_spam', 'blocked_at')
     search_fields = ('blocker_character__nickname', 'blocked_character__nickname', 'reason')
     readonly_fields = ('blocked_at', 'reported_at')
 
@@ -1,18 +1,30 @@
-from rest_framework import viewsets, status
+import hashlib
+import uuid
+
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
-from django.db.models import Q
+from django.conf import settings
+from django.db.models import Q, Count, Max, Sum
 from .models import (
     Game, Character, Message, CustomUser, CharacterFriend,
-    CharacterFriendRequest, CharacterProfile
+    CharacterFriendRequest, CharacterProfile, Conversation, MessageArchive,
+    CharacterIdentityReveal, UserFriendship
 )
+from .pagination import MessageCursorPagination, ConversationCursorPagination
 from .serializers import (
     GameSerializer, CharacterSerializer, MessageSerializer,
     CharacterFriendSerializer, CharacterFriendRequestSerializer,
-    UserProfileSerializer, CharacterProfileSerializer
+    UserProfileSerializer, CharacterProfileSerializer, ConversationSerializer
 )
+from . import transitions
+from .ratelimit import get_rate_limiter, rate_limit_message
+from .relationships import resolve_relationships
+from .suggestions import get_suggestions
+from .nickname_search import MIN_QUERY_LENGTH, search_nicknames
+from .utils import can_send_message
 
 class GameViewSet(viewsets.ModelViewSet):
     queryset = Game.objects.all()
@@ -22,6 +34,258 @@ class CharacterViewSet(viewsets.ModelViewSet):
     queryset = Character.objects.all()
     serializer_class = CharacterSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # Blocked characters drop out of listings, in either direction
+            queryset = queryset.visible_to(self.request.user)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        characters = list(page if page is not None else queryset)
+        # Relationship state for the whole page in a fixed number of queries
+        context = self.get_serializer_context()
+        context['relationships'] = resolve_relationships(request.user, characters)
+        serializer = self.get_serializer_class()(characters, many=True, context=context)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        character = self.get_object()
+        context = self.get_serializer_context()
+        context['relationships'] = resolve_relationships(request.user, [character])
+        return Response(self.get_serializer_class()(character, context=context).data)
+
+    @action(detail=True, methods=['get'])
+    def suggestions(self, request, pk=None):
+        """Players this character might know, best first (?limit=, at most SUGGESTIONS_TOP_K)"""
+        character = self.get_object()
+        if character.user_id != request.user.pk:
+            raise PermissionDenied('You can only see suggestions for your own characters')
+        top_k = getattr(settings, 'SUGGESTIONS_TOP_K', 20)
+        try:
+            limit = min(max(int(request.query_params.get('limit', top_k)), 1), top_k)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        suggestions = get_suggestions(character, limit=limit)
+        characters = Character.objects.in_bulk([suggestion.character_id for suggestion in suggestions])
+        context = self.get_serializer_context()
+        context['relationships'] = resolve_relationships(request.user, characters.values())
+        serializer_class = self.get_serializer_class()
+        return Response([
+            {
+                'character': serializer_class(characters[suggestion.character_id], context=context).data,
+                'mutual_friends': suggestion.mutual_friends,
+                'shared_games': suggestion.shared_games,
+                'score': suggestion.score,
+            }
+            for suggestion in suggestions
+            if suggestion.character_id in characters
+        ])
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Characters whose nickname contains ?q=, most similar first (?limit=, at most 50)"""
+        query = request.query_params.get('q', '').strip()
+        if len(query) < MIN_QUERY_LENGTH:
+            return Response(
+                {'error': f'q must be at least {MIN_QUERY_LENGTH} characters'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        hits = search_nicknames(query, limit=limit, queryset=Character.objects.visible_to(request.user))
+        characters = Character.objects.in_bulk([hit.character_id for hit in hits])
+        context = self.get_serializer_context()
+        context['relationships'] = resolve_relationships(request.user, characters.values())
+        serializer_class = self.get_serializer_class()
+        return Response([
+            {
+                'character': serializer_class(characters[hit.character_id], context=context).data,
+                'similarity': hit.similarity,
+            }
+            for hit in hits
+            if hit.character_id in characters
+        ])
+
+
+def rate_limited_response(rate_limit):
+    return Response(
+        {'error': rate_limit_message(rate_limit)},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(rate_limit.retry_after)}
+    )
+
+
+class MessageViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
+    """
+    Messages of the requesting user's conversations.
+
+    GET  messages/threads/          conversations, most recently active first
+    GET  messages/?thread=<uuid>    messages of a thread, newest first
+    GET  messages/?since=<id>       messages newer than <id> (optionally &thread=), oldest first
+    POST messages/                  send a message
+
+    GET responses carry an ETag; send it back in If-None-Match to get an
+    empty 304 when nothing changed.
+    """
+    serializer_class = MessageSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = MessageCursorPagination
+
+    def get_user_characters(self):
+        return Character.objects.filter(user=self.request.user)
+
+    def get_conversations(self):
+        return Conversation.for_characters(self.get_user_characters())
+
+    def not_modified(self, *state):
+        """Return (etag, is_fresh) for the given state of the requested resource"""
+        raw = '|'.join(str(part) for part in (self.request.user.pk, self.request.get_full_path()) + state)
+        etag = '"%s"' % hashlib.md5(raw.encode('utf-8')).hexdigest()
+        if_none_match = self.request.headers.get('If-None-Match', '')
+        return etag, etag in [tag.strip() for tag in if_none_match.split(',')]
+
+    def with_etag(self, response, etag):
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request):
+        thread_id = request.query_params.get('thread')
+        since = request.query_params.get('since')
+        conversations = self.get_conversations()
+
+        if thread_id is not None:
+            try:
+                thread_id = uuid.UUID(thread_id)
+            except ValueError:
+                return Response({'error': 'Invalid thread id'}, status=status.HTTP_400_BAD_REQUEST)
+            conversations = conversations.filter(thread_id=thread_id)
+            if not conversations.exists():
+                return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({'error': 'since must be a message id'}, status=status.HTTP_400_BAD_REQUEST)
+            return self.delta(conversations, since, thread_id)
+
+        if thread_id is None:
+            return Response(
+                {'error': 'Either the thread or the since parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        conversation = conversations.get()
+        etag, fresh = self.not_modified(conversation.last_message_id, conversation.last_sent_date)
+        if fresh:
+            return self.with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        queryset = Message.objects.filter(thread_id=thread_id)
+        page = self.paginate_queryset(queryset)
+        if not self.paginator.has_next and MessageArchive.restore(thread_id):
+            # Reached the start of an archived thread - page again with the older messages back
+            page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.with_etag(self.get_paginated_response(serializer.data), etag)
+
+    def delta(self, conversations, since, thread_id=None):
+        """Messages with id > since, oldest first, for polling clients"""
+        state = conversations.aggregate(last_message=Max('last_message_id'), threads=Count('id'))
+        etag, fresh = self.not_modified(state['last_message'], state['threads'])
+        if fresh:
+            return self.with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        limit = self.paginator.get_page_size(self.request)
+        if thread_id is not None:
+            queryset = Message.objects.filter(thread_id=thread_id)
+        else:
+            user_characters = self.get_user_characters()
+            queryset = Message.objects.filter(
+                Q(sender_character__in=user_characters) | Q(receiver_character__in=user_characters)
+            )
+        messages = list(queryset.filter(id__gt=since).order_by('id')[:limit + 1])
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+
+        return self.with_etag(Response({
+            'results': self.get_serializer(messages, many=True).data,
+            'next_since': messages[-1].id if messages else since,
+            'has_more': has_more,
+        }), etag)
+
+    @action(detail=False, methods=['get'])
+    def threads(self, request):
+        conversations = self.get_conversations()
+        state = conversations.aggregate(
+            last_message=Max('last_message_id'),
+            threads=Count('id'),
+            unread_a=Sum('unread_count_a'),
+            unread_b=Sum('unread_count_b'),
+        )
+        etag, fresh = self.not_modified(*state.values())
+        if fresh:
+            return self.with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        paginator = ConversationCursorPagination()
+        page = paginator.paginate_queryset(
+            conversations.select_related('character_a', 'character_b', 'last_message'),
+            request,
+            view=self
+        )
+        serializer = ConversationSerializer(page, many=True, context={
+            'request': request,
+            'user_character_ids': set(self.get_user_characters().values_list('id', flat=True)),
+        })
+        return self.with_etag(paginator.get_paginated_response(serializer.data), etag)
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sender_character = serializer.validated_data.get('sender_character')
+        receiver_character = serializer.validated_data.get('receiver_character')
+
+        if not sender_character or not receiver_character:
+            return Response(
+                {'error': 'Both sender_character and receiver_character are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if sender_character.user_id != request.user.id:
+            raise PermissionDenied('You can only send messages from your own characters')
+        if receiver_character.user_id == request.user.id:
+            return Response(
+                {'error': 'Cannot send a message to your own character'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        can_send, reason = can_send_message(sender_character, receiver_character)
+        if not can_send:
+            raise PermissionDenied(reason)
+
+        rate_limit = get_rate_limiter('message').check(request.user.id)
+        if not rate_limit.allowed:
+            return rate_limited_response(rate_limit)
+
+        # Same rule as MessageForm: identity is only shown while a reveal is active
+        identity_revealed = CharacterIdentityReveal.objects.filter(
+            revealing_character=sender_character,
+            revealed_to_character=receiver_character,
+            is_active=True
+        ).exists() and serializer.validated_data.get('privacy_mode', 'REVEAL_IDENTITY') == 'REVEAL_IDENTITY'
+        serializer.save(
+            privacy_mode='REVEAL_IDENTITY' if identity_revealed else 'ANONYMOUS',
+            identity_revealed=identity_revealed
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 
 class CharacterFriendRequestViewSet(viewsets.ModelViewSet):
     queryset = CharacterFriendRequest.objects.all()
@@ -74,6 +338,10 @@ class CharacterFriendRequestViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
+            rate_limit = get_rate_limiter('friend_request').check(request.user.id)
+            if not rate_limit.allowed:
+                return rate_limited_response(rate_limit)
+            
             # Save with validated characters
             serializer.save(
                 sender_character=sender_character,
@@ -88,41 +356,66 @@ class CharacterFriendRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
     
-    @action(detail=True, methods=['post'])
-    def accept(self, request, pk=None):
-        friend_request = self.get_object()
-        
-        if friend_request.receiver_character.user != request.user:
+    def transition(self, handler, pk, new_status):
+        """Apply a guarded status transition (see app.transitions)"""
+        try:
+            handler(self.request.user, pk)
+        except CharacterFriendRequest.DoesNotExist:
+            # Also for requests sent to someone else - do not reveal they exist
+            return Response({'error': 'Friend request not found'}, status=status.HTTP_404_NOT_FOUND)
+        except transitions.InvalidTransition as e:
             return Response(
-                {'error': 'You can only accept requests sent to your characters'},
-                status=status.HTTP_403_FORBIDDEN
+                {'error': f'Friend request is already {e.obj.status.lower()}'},
+                status=status.HTTP_409_CONFLICT
             )
-        
-        # Create friendship
-        CharacterFriend.objects.create(
-            character1=friend_request.sender_character,
-            character2=friend_request.receiver_character
-        )
-        
-        friend_request.status = 'ACCEPTED'
-        friend_request.save()
-        
-        return Response({'status': 'accepted'})
+        return Response({'status': new_status})
+    
+    @action(detail=True, methods=['post'])
+    def accept(self, request, pk=None):
+        return self.transition(transitions.accept_friend_request, pk, 'accepted')
     
     @action(detail=True, methods=['post'])
     def decline(self, request, pk=None):
-        friend_request = self.get_object()
-        
-        if friend_request.receiver_character.user != request.user:
+        return self.transition(transitions.decline_friend_request, pk, 'declined')
+    
+    def bulk_transition(self, handler, new_status):
+        """
+        Apply handler to many received requests: {"ids": [...]} and/or
+        {"character": "<uuid>"} (all pending for that character), or
+        {"all": true}. Form-encoded bodies repeat ids=<id> and send all=true.
+        Requests that are not pending are skipped.
+        """
+        data = self.request.data
+        if hasattr(data, 'getlist'):
+            ids = data.getlist('ids') or None
+            select_all = str(data.get('all', '')).lower() in ('1', 'true')
+        else:
+            ids = data.get('ids')
+            select_all = data.get('all') is True
+        character = data.get('character')
+        if ids is None and not character and not select_all:
             return Response(
-                {'error': 'You can only decline requests sent to your characters'},
-                status=status.HTTP_403_FORBIDDEN
+                {'error': 'Provide ids, character or all'},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        if ids is not None and not isinstance(ids, list):
+            return Response({'error': 'ids must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            request_ids = None if ids is None else [int(pk) for pk in ids]
+            character_id = uuid.UUID(str(character)) if character else None
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid ids or character'}, status=status.HTTP_400_BAD_REQUEST)
         
-        friend_request.status = 'DECLINED'
-        friend_request.save()
-        
-        return Response({'status': 'declined'})
+        count = handler(self.request.user, request_ids, character_id)
+        return Response({'status': new_status, 'count': count})
+    
+    @action(detail=False, methods=['post'], url_path='bulk-accept')
+    def bulk_accept(self, request):
+        return self.bulk_transition(transitions.bulk_accept_friend_requests, 'accepted')
+    
+    @action(detail=False, methods=['post'], url_path='bulk-decline')
+    def bulk_decline(self, request):
+        return self.bulk_transition(transitions.bulk_decline_friend_requests, 'declined')
 
 
 class CharacterProfileViewSet(viewsets.ModelViewSet):
@@ -136,9 +429,8 @@ class CharacterProfileViewSet(viewsets.ModelViewSet):
             return CharacterProfile.objects.filter(
                 Q(is_public=True) |
                 Q(character__user=self.request.user) |
-                Q(character__friends_as_character1__character2__user=self.request.user) |
-                Q(character__friends_as_character2__character1__user=self.request.user)
-            ).distinct()
+                CharacterFriend.friend_ids_filter(self.request.user, field='character')
+            )
         return CharacterProfile.objects.filter(is_public=True)
 
 
@@ -158,16 +450,7 @@ class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = CustomUser.objects.filter(
                 Q(profile_visibility='PUBLIC') |
                 Q(id=user.id) |
-                Q(profile_visibility='FRIENDS_ONLY', id__in=self._get_friends_user_ids(user))
+                Q(profile_visibility='FRIENDS_ONLY') & UserFriendship.friend_ids_filter(user)
             )
         
         return queryset
-    
-    def _get_friends_user_ids(self, user):
-        """Get user IDs of users who are friends through characters"""
-        user_characters = Character.objects.filter(user=user)
-        friend_characters = Character.objects.filter(
-            Q(friends_as_character1__character2__in=user_characters) |
-            Q(friends_as_character2__character1__in=user_characters)
-        )
-        return friend_characters.values_list('user_id', flat=True).distinct()
@@ -0,0 +1,116 @@
+"""
+Cached block sets: for each character, the characters it blocked and the
+characters that blocked it (CharacterBlock, both directions) plus the
+characters that POKE-blocked it (CharacterBlock.SCOPE_POKE, see PokeBlock).
+
+A block set is loaded with one query on a cache miss and then answers
+block checks in O(1) without touching the database. Sets are cached under
+a per-character version; saving or deleting a block bumps the version of
+both characters (see app.signals), so stale sets are never read again and
+simply expire.
+
+Versions live in the default cache, so with a per-process cache (LocMem) a
+worker only sees the blocks saved by itself. Block sets therefore only
+filter listings; checks that guard a write (sending a message or a friend
+request) use has_block(), which asks the database.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .cache_versions import bump_versions, get_versions
+
+BLOCK_SET_TIMEOUT = 24 * 60 * 60
+
+
+class BlockSet:
+    def __init__(self, blocking=(), blocked_by=(), poke_blocked_by=()):
+        self.blocking = frozenset(blocking)                # characters this one blocked
+        self.blocked_by = frozenset(blocked_by)            # characters that blocked this one
+        self.poke_blocked_by = frozenset(poke_blocked_by)  # characters that blocked its POKEs (legacy)
+
+    def is_blocked_by(self, character_id, include_poke_blocks=True):
+        """Whether character_id blocked this character"""
+        return character_id in self.blocked_by or (include_poke_blocks and character_id in self.poke_blocked_by)
+
+    def excluded(self, include_poke_blocks=True):
+        """Every character this one must not interact with, in either direction"""
+        excluded = self.blocking | self.blocked_by
+        if include_poke_blocks:
+            excluded |= self.poke_blocked_by
+        return excluded
+
+
+def _set_key(character_id, version):
+    return f'block_set:{character_id}:{version}'
+
+
+def _load(character_ids):
+    from app.models import CharacterBlock
+
+    sets = {character_id: {'blocking': set(), 'blocked_by': set(), 'poke_blocked_by': set()}
+            for character_id in character_ids}
+    for blocker_id, blocked_id, scope in CharacterBlock.objects.filter(
+        Q(blocker_character__in=character_ids) | Q(blocked_character__in=character_ids)
+    ).order_by().values_list('blocker_character_id', 'blocked_character_id', 'scope'):
+        if scope == CharacterBlock.SCOPE_POKE:
+            if blocked_id in sets:
+                sets[blocked_id]['poke_blocked_by'].add(blocker_id)
+            continue
+        if blocker_id in sets:
+            sets[blocker_id]['blocking'].add(blocked_id)
+        if blocked_id in sets:
+            sets[blocked_id]['blocked_by'].add(blocker_id)
+    return {character_id: BlockSet(**data) for character_id, data in sets.items()}
+
+
+def get_block_sets(character_ids):
+    """{character_id: BlockSet}; misses are loaded together in one query"""
+    character_ids = set(character_ids)
+    if not character_ids:
+        return {}
+    timeout = getattr(settings, 'BLOCK_SET_CACHE_TIMEOUT', BLOCK_SET_TIMEOUT)
+    versions = get_versions('block_set', character_ids)
+    keys = {_set_key(character_id, version): character_id for character_id, version in versions.items()}
+    cached = cache.get_many(list(keys))
+    block_sets = {keys[key]: block_set for key, block_set in cached.items()}
+
+    missing = character_ids - set(block_sets)
+    if missing:
+        loaded = _load(missing)
+        cache.set_many(
+            {_set_key(character_id, versions[character_id]): block_set for character_id, block_set in loaded.items()},
+            timeout
+        )
+        block_sets.update(loaded)
+    return block_sets
+
+
+def get_block_set(character_id):
+    return get_block_sets([character_id])[character_id]
+
+
+def invalidate_block_sets(*character_ids):
+    bump_versions('block_set', *character_ids)
+
+
+def has_block(blocker_id, blocked_id, include_poke_blocks=True):
+    """Whether blocker_id blocked blocked_id, checked in the database"""
+    from app.models import CharacterBlock
+
+    blocks = CharacterBlock.objects.filter(blocker_character_id=blocker_id, blocked_character_id=blocked_id)
+    if not include_poke_blocks:
+        blocks = blocks.exclude(scope=CharacterBlock.SCOPE_POKE)
+    return blocks.exists()
+
+
+def exclude_blocked(viewer_character_ids, candidates, include_poke_blocks=True):
+    """
+    Drop candidates (characters or ids) blocked in either direction by any
+    of the viewer's characters. Costs no queries once the viewer's block
+    sets are cached.
+    """
+    excluded = set()
+    for block_set in get_block_sets(viewer_character_ids).values():
+        excluded |= block_set.excluded(include_poke_blocks)
+    return [candidate for candidate in candidates if getattr(candidate, 'pk', candidate) not in excluded]
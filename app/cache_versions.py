@@ -0,0 +1,57 @@
+"""
+Per-key version counters for cached derived data (block sets, friend sets).
+
+Cached values are stored under a key that includes the current version of
+their owner; bumping the version makes every cached value of that owner
+unreachable, so nothing has to be deleted and concurrent readers never see
+a half-updated set.
+
+Version keys never expire, but the cache may still evict them (LocMem culls
+past MAX_ENTRIES). A missing version is therefore never read as a default:
+it is started from the clock, so values cached under versions issued before
+the eviction can not become reachable again.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _key(prefix, owner_id):
+    return f'{prefix}_version:{owner_id}'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def get_versions(prefix, owner_ids):
+    """{owner_id: current version}; owners without one get a new version"""
+    keys = {_key(prefix, owner_id): owner_id for owner_id in owner_ids}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_version(), None)
+        # Another process may have added the key first
+        found.update(cache.get_many(missing))
+    return {owner_id: found.get(key) or _new_version() for key, owner_id in keys.items()}
+
+
+def bump_versions(prefix, *owner_ids):
+    """
+    Bump the versions of owner_ids now and again once the transaction
+    commits (so a value loaded by a concurrent request before the commit is
+    not kept).
+    """
+    def bump():
+        for owner_id in owner_ids:
+            key = _key(prefix, owner_id)
+            if not cache.add(key, _new_version(), None):
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    cache.set(key, _new_version(), None)
+
+    bump()
+    transaction.on_commit(bump)
@@ -0,0 +1,138 @@
+"""
+Content filter used by validate_poke_content: precompiled URL/e-mail
+detectors and an Aho-Corasick automaton over the profanity wordlist.
+
+The automaton finds every listed term in one pass over the text, so the
+cost of a check depends on the length of the content, not on the number of
+terms. It is built once per process from POKE_PROFANITY_WORDLIST plus the
+optional POKE_PROFANITY_WORDLIST_FILE (one term per line, # starts a
+comment) and rebuilt when the file is modified or the settings change.
+Terms match anywhere in the text, case-insensitively.
+"""
+import os
+import re
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+URL_PATTERN = re.compile(r'(http|https|www\.|\.com|\.net|\.org|://)', re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r'@')
+
+_filter = None
+_filter_source = None
+_filter_lock = threading.Lock()
+
+
+class TermMatcher:
+    """Aho-Corasick automaton over lower-cased terms"""
+
+    def __init__(self, terms):
+        # Node 0 is the root; per node: transitions, failure link, longest term ending here
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+        self.size = 0
+        for term in terms:
+            self._add(term.strip().lower())
+        self._link()
+
+    def _add(self, term):
+        if not term:
+            return
+        node = 0
+        for char in term:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][char] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            node = child
+        if self._output[node] is None:
+            self.size += 1
+        self._output[node] = term
+
+    def _link(self):
+        """Breadth-first pass setting failure links and inheriting their outputs"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0) if node else 0
+                if self._output[child] is None:
+                    self._output[child] = self._output[self._fail[child]]
+                queue.append(child)
+
+    def search(self, text):
+        """First listed term found in text, or None"""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for char in text.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node] is not None:
+                return output[node]
+        return None
+
+    def __len__(self):
+        return self.size
+
+
+def read_wordlist(path):
+    with open(path, encoding='utf-8') as wordlist:
+        for line in wordlist:
+            term = line.split('#', 1)[0].strip()
+            if term:
+                yield term
+
+
+def _wordlist_source():
+    path = getattr(settings, 'POKE_PROFANITY_WORDLIST_FILE', None)
+    if not path:
+        return None
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None
+
+
+def get_profanity_matcher():
+    """Process-wide TermMatcher, rebuilt when the wordlist file changes"""
+    global _filter, _filter_source
+    source = _wordlist_source()
+    if _filter is None or source != _filter_source:
+        with _filter_lock:
+            if _filter is None or source != _filter_source:
+                terms = list(getattr(settings, 'POKE_PROFANITY_WORDLIST', []))
+                if source and source[1] is not None:
+                    terms.extend(read_wordlist(source[0]))
+                _filter = TermMatcher(terms)
+                _filter_source = source
+    return _filter
+
+
+@receiver(setting_changed)
+def reset_profanity_matcher(setting, **kwargs):
+    global _filter
+    if setting in ('POKE_PROFANITY_WORDLIST', 'POKE_PROFANITY_WORDLIST_FILE'):
+        _filter = None
+
+
+def contains_url(content):
+    return URL_PATTERN.search(content) is not None
+
+
+def contains_email(content):
+    return EMAIL_PATTERN.search(content) is not None
+
+
+def contains_profanity(content):
+    return get_profanity_matcher().search(content) is not None
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .counters import get_counters
+
+
+def notification_counts(request):
+    """
+    Expose the user's notification counters to every template.
+    Lazy: the cache is only hit on pages that actually render a badge.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'notification_counts': SimpleLazyObject(lambda: get_counters(user.id))}
+
+
+def live_events(request):
+    """Whether pages subscribe to the event stream or poll (see EVENT_STREAM_ENABLED)"""
+    return {
+        'event_stream_enabled': getattr(settings, 'EVENT_STREAM_ENABLED', False),
+        'event_poll_interval': getattr(settings, 'EVENT_POLL_INTERVAL', 15),
+    }
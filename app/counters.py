@@ -0,0 +1,100 @@
+"""
+Per-user notification counters (unread messages, unread pending POKEs and
+pending friend requests).
+
+Counters are stored in NotificationCounter and adjusted incrementally in the
+same transaction as the rows they count (see app.signals), so showing badges
+never needs a COUNT query. Reads go through the cache; the cached value is
+dropped whenever a counter changes.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Greatest
+
+COUNTER_FIELDS = ('unread_messages', 'unread_pokes', 'pending_friend_requests')
+
+
+def _cache_key(user_id):
+    return f'notification_counts:{user_id}'
+
+
+def invalidate_counters(user_id):
+    """Drop the cached counters of a user once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+
+
+def adjust_counters(user_id, **deltas):
+    """
+    Add deltas to a user's counters, e.g. adjust_counters(user.id, unread_pokes=1).
+    Counters never go below zero. Users without a counter row are skipped -
+    their row is built from scratch on first read.
+    """
+    from app.models import NotificationCounter
+
+    updates = {
+        field: Greatest(models.F(field) + delta, 0)
+        for field, delta in deltas.items()
+        if delta
+    }
+    if not user_id or not updates:
+        return
+    NotificationCounter.objects.filter(user_id=user_id).update(**updates)
+    invalidate_counters(user_id)
+
+
+def count_from_source(user_id):
+    """Compute all counters of a user from the underlying tables"""
+    from app.models import Conversation, Poke, CharacterFriendRequest
+
+    unread_a = Conversation.objects.filter(character_a__user_id=user_id).aggregate(
+        total=models.Sum('unread_count_a')
+    )['total'] or 0
+    unread_b = Conversation.objects.filter(character_b__user_id=user_id).aggregate(
+        total=models.Sum('unread_count_b')
+    )['total'] or 0
+    return {
+        'unread_messages': unread_a + unread_b,
+        'unread_pokes': Poke.objects.filter(
+            receiver_character__user_id=user_id,
+            status='PENDING',
+            is_read=False
+        ).count(),
+        'pending_friend_requests': CharacterFriendRequest.objects.filter(
+            receiver_character__user_id=user_id,
+            status='PENDING'
+        ).count(),
+    }
+
+
+def recount_counters(user_id):
+    """Rebuild a user's counter row from the underlying tables"""
+    from app.models import NotificationCounter
+
+    counts = count_from_source(user_id)
+    NotificationCounter.objects.update_or_create(user_id=user_id, defaults=counts)
+    invalidate_counters(user_id)
+    return counts
+
+
+def get_counters(user_id):
+    """Return a dict with the user's counters (cache, then counter row)"""
+    key = _cache_key(user_id)
+    counts = cache.get(key)
+    if counts is not None:
+        return counts
+
+    from app.models import NotificationCounter
+
+    counts = NotificationCounter.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).first()
+    if counts is None:
+        counts = count_from_source(user_id)
+        try:
+            with transaction.atomic():
+                NotificationCounter.objects.create(user_id=user_id, **counts)
+        except IntegrityError:
+            # Created concurrently - the other row is just as fresh
+            pass
+
+    cache.set(key, counts, getattr(settings, 'NOTIFICATION_COUNTS_CACHE_TIMEOUT', 300))
+    return counts
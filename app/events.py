@@ -0,0 +1,164 @@
+"""
+Live events (new messages, POKEs and friend requests) pushed to users over
+the Server-Sent Events stream (see EventStreamView).
+
+publish_event() hands an event to the configured backend once the current
+transaction commits, and EventStreamView listens on the backend for the
+logged-in user. Backends are selected with the EVENT_BACKEND setting:
+
+- InProcessEventBackend - asyncio queues inside a single server process.
+  Good for development and single-worker deployments.
+- PostgresEventBackend - LISTEN/NOTIFY, so events reach streams served by
+  any worker connected to the same database.
+
+The stream needs an ASGI server (game_player_nick_finder/asgi.py), otherwise
+every open stream holds a whole WSGI worker.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_EVENT_BACKEND = 'app.events.InProcessEventBackend'
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class BaseEventBackend:
+    """Pub/sub interface used by publish_event() and the event stream"""
+
+    def publish(self, user_id, event):
+        """Deliver an event (a JSON-serializable dict) to all streams of a user"""
+        raise NotImplementedError
+
+    async def listen(self, user_id, timeout):
+        """
+        Async generator yielding events for a user as they arrive.
+        Yields None once the subscription is active and then whenever
+        nothing arrived for `timeout` seconds, so the caller can send a
+        keep-alive.
+        """
+        raise NotImplementedError
+
+
+class InProcessEventBackend(BaseEventBackend):
+    """Fan-out to asyncio queues of streams served by this process"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # Loop already closed - the stream is going away
+                pass
+
+    async def listen(self, user_id, timeout):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        try:
+            yield None
+            queue = subscriber[1]
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(subscriber)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+
+class PostgresEventBackend(BaseEventBackend):
+    """
+    LISTEN/NOTIFY on one channel per user. Each open stream holds its own
+    database connection, so size max_connections accordingly.
+    """
+    channel_prefix = 'user_events_'
+
+    def channel(self, user_id):
+        return f'{self.channel_prefix}{int(user_id)}'
+
+    def publish(self, user_id, event):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel(user_id), json.dumps(event)])
+
+    def _connect(self, user_id):
+        import psycopg2
+
+        conn = psycopg2.connect(**connection.get_connection_params())
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel(user_id)}"')
+        return conn
+
+    async def listen(self, user_id, timeout):
+        conn = await asyncio.to_thread(self._connect, user_id)
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(conn.fileno(), readable.set)
+        try:
+            yield None
+            while True:
+                try:
+                    await asyncio.wait_for(readable.wait(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                readable.clear()
+                conn.poll()
+                while conn.notifies:
+                    yield json.loads(conn.notifies.pop(0).payload)
+        finally:
+            loop.remove_reader(conn.fileno())
+            conn.close()
+
+
+def get_event_backend():
+    """Return the process-wide backend configured by EVENT_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_path = getattr(settings, 'EVENT_BACKEND', DEFAULT_EVENT_BACKEND)
+                _backend = import_string(backend_path)()
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_event_backend(setting, **kwargs):
+    global _backend
+    if setting == 'EVENT_BACKEND':
+        _backend = None
+
+
+def publish_event(user_ids, event_type, **data):
+    """
+    Push an event to the streams of the given users after the current
+    transaction commits, e.g. publish_event([user.id], 'poke', poke_id=...).
+    """
+    event = {'type': event_type, **data}
+    user_ids = {user_id for user_id in user_ids if user_id}
+
+    def publish():
+        backend = get_event_backend()
+        for user_id in user_ids:
+            backend.publish(user_id, event)
+
+    if user_ids:
+        transaction.on_commit(publish)
@@ -4,7 +4,7 @@ from .models import (
     Character, Game, CustomUser, Message, ProposedGame,
     CharacterFriendRequest, CharacterProfile, Poke
 )
-from .utils import validate_poke_content, can_send_poke
+from .utils import validate_poke_content, poke_eligibility
 from django.contrib.auth import get_user_model
 from django.db import models
 
@@ -331,9 +331,10 @@ class PokeForm(forms.ModelForm):
             raise forms.ValidationError("User is required to send POKE.")
         
         if receiver_character:
-            can_send, reason = can_send_poke(self.user, receiver_character)
-            if not can_send:
-                raise forms.ValidationError(reason)
+            # Kept on the form so the view can reuse it (e.g. pokes remaining)
+            self.eligibility = poke_eligibility(self.user, [receiver_character])[receiver_character.pk]
+            if not self.eligibility.can_send:
+                raise forms.ValidationError(self.eligibility.reason)
         
         return cleaned_data
     
@@ -0,0 +1,60 @@
+"""
+Cached friendship adjacency: the friend character ids of each character,
+loaded with one query on a cache miss and cached under per-character
+versions (app.cache_versions). Creating or deleting a CharacterFriend bumps
+the versions of both characters (see app.signals).
+
+Versions live in the default cache, so with a per-process cache (LocMem)
+other workers may keep a stale set until it expires. Friend sets only
+rank and annotate listings (suggestions, relationships); profile
+visibility is decided in SQL (CharacterFriend.friend_ids_filter,
+UserFriendship).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .cache_versions import bump_versions, get_versions
+
+FRIENDS_TIMEOUT = 24 * 60 * 60
+
+
+def _timeout():
+    return getattr(settings, 'FRIENDS_CACHE_TIMEOUT', FRIENDS_TIMEOUT)
+
+
+def get_friend_sets(character_ids):
+    """{character_id: frozenset of friend character ids}; misses are loaded in one query"""
+    from app.models import CharacterFriend
+
+    character_ids = set(character_ids)
+    if not character_ids:
+        return {}
+    versions = get_versions('friend_set', character_ids)
+    keys = {f'friend_set:{character_id}:{version}': character_id for character_id, version in versions.items()}
+    friend_sets = {keys[key]: friends for key, friends in cache.get_many(list(keys)).items()}
+
+    missing = character_ids - set(friend_sets)
+    if missing:
+        loaded = {character_id: set() for character_id in missing}
+        for character1_id, character2_id in CharacterFriend.objects.filter(
+            Q(character1__in=missing) | Q(character2__in=missing)
+        ).values_list('character1_id', 'character2_id'):
+            if character1_id in loaded:
+                loaded[character1_id].add(character2_id)
+            if character2_id in loaded:
+                loaded[character2_id].add(character1_id)
+        loaded = {character_id: frozenset(friends) for character_id, friends in loaded.items()}
+        cache.set_many(
+            {
+                f'friend_set:{character_id}:{versions[character_id]}': friends
+                for character_id, friends in loaded.items()
+            },
+            _timeout()
+        )
+        friend_sets.update(loaded)
+    return friend_sets
+
+
+def invalidate_friends(*character_ids):
+    bump_versions('friend_set', *character_ids)
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import Conversation, MessageArchive
+
+
+class Command(BaseCommand):
+    help = (
+        'Move messages of threads inactive for N months out of the hot Message table into '
+        'compressed MessageArchive rows. Archived threads are restored when opened.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int,
+            default=getattr(settings, 'MESSAGE_ARCHIVE_AFTER_MONTHS', 6),
+            help='Archive threads without messages for this many months'
+        )
+        parser.add_argument('--limit', type=int, default=None, help='Archive at most this many threads')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the threads that would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=30 * options['months'])
+        thread_ids = Conversation.objects.filter(last_sent_date__lt=cutoff).order_by('last_sent_date').values_list(
+            'thread_id', flat=True
+        )
+        if options['limit']:
+            thread_ids = thread_ids[:options['limit']]
+
+        threads = archived = 0
+        for thread_id in thread_ids.iterator():
+            if options['dry_run']:
+                self.stdout.write(str(thread_id))
+                continue
+            # One transaction per thread keeps locks short
+            count = MessageArchive.archive_thread(thread_id)
+            if count:
+                threads += 1
+                archived += count
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Archived {archived} message(s) from {threads} thread(s)'))
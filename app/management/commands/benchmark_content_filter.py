@@ -0,0 +1,83 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from app.content_filter import TermMatcher, get_profanity_matcher
+from app.utils import validate_poke_content
+
+WORDS = (
+    'hello again remember me from the old server we played together in the guild '
+    'back in the day are you still online on the same character see you in game'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark validate_poke_content with synthetic profanity wordlists of growing size, '
+        'next to the previous linear substring scan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='100,1000,10000,100000',
+            help='Comma-separated wordlist sizes'
+        )
+        parser.add_argument('--calls', type=int, default=2000, help='Timed calls per wordlist size')
+        parser.add_argument('--naive-calls', type=int, default=200, help='Timed calls of the linear scan (slow)')
+        parser.add_argument('--seed', type=int, default=2004)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        contents = [self.random_content(rng) for _ in range(options['calls'])]
+
+        for size in [int(size) for size in options['sizes'].split(',')]:
+            terms = list({self.random_term(rng) for _ in range(size)})
+            start = time.perf_counter()
+            TermMatcher(terms)
+            build = time.perf_counter() - start
+
+            with override_settings(POKE_PROFANITY_WORDLIST=terms, POKE_PROFANITY_WORDLIST_FILE=None):
+                get_profanity_matcher()
+                timings = self.time_calls(lambda content: validate_poke_content(content), contents)
+            self.report(f'{size} terms', timings, f'(built in {build * 1000:.0f} ms)')
+
+            if options['naive_calls']:
+                naive = self.time_calls(
+                    lambda content: self.naive_search(content, terms),
+                    contents[:options['naive_calls']]
+                )
+                self.report(f'{size} naive', naive)
+
+    def naive_search(self, content, terms):
+        content_lower = content.lower()
+        return any(term in content_lower for term in terms)
+
+    def random_term(self, rng):
+        return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+
+    def random_content(self, rng):
+        # Clean POKE-sized content, so every term has to be ruled out
+        content = ''
+        while len(content) < 90:
+            content += rng.choice(WORDS) + ' '
+        return content.strip()
+
+    def time_calls(self, check, contents):
+        timings = []
+        for content in contents:
+            start = time.perf_counter()
+            check(content)
+            timings.append((time.perf_counter() - start) * 1000000)
+        return timings
+
+    def report(self, label, timings, extra=''):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(
+            f'{label:>14}: {len(timings)} calls, p50 {statistics.median(timings):.1f} us, '
+            f'p95 {p95:.1f} us, max {timings[-1]:.1f} us {extra}'.rstrip()
+        ))
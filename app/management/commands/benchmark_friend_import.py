@@ -0,0 +1,83 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app.models import Character, CharacterFriend, CustomUser, Game, GameCategory
+
+USERNAME_PREFIX = 'friend-bench-'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark importing friendships one save() at a time against CharacterFriend.import_pairs. '
+        'Everything runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pairs', type=int, default=5000, help='Friendships imported by each path')
+        parser.add_argument('--characters', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=2004)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                character_ids = self.generate(options)
+                pairs = self.random_pairs(rng, character_ids, options['pairs'] * 2)
+                self.run('save()', lambda: self.save_each(pairs[:options['pairs']]), options['pairs'])
+                self.run(
+                    'import_pairs',
+                    lambda: CharacterFriend.import_pairs(pairs[options['pairs']:], batch_size=options['batch_size']),
+                    options['pairs']
+                )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def generate(self, options):
+        category = GameCategory.objects.create(title='Friend import benchmark')
+        game = Game.objects.create(name='Friend import benchmark', category=category)
+        password = make_password(None)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f'{USERNAME_PREFIX}{index}', password=password)
+            for index in range(options['characters'] // 2)
+        ], batch_size=options['batch_size'])
+        Character.objects.bulk_create([
+            Character(user_id=users[index // 2].pk, game=game, nickname=f'fb{index}', hash_id=f'f{index:09d}')
+            for index in range(len(users) * 2)
+        ], batch_size=options['batch_size'])
+        return list(Character.objects.filter(game=game).values_list('id', flat=True))
+
+    def random_pairs(self, rng, character_ids, count):
+        pairs = set()
+        while len(pairs) < count:
+            pairs.add(CharacterFriend.ordered_pair(*rng.sample(character_ids, 2)))
+        return list(pairs)
+
+    def save_each(self, pairs):
+        for character1_id, character2_id in pairs:
+            CharacterFriend(character1_id=character1_id, character2_id=character2_id).save()
+
+    def run(self, label, func, count):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{label:>13}: {count} friendships in {elapsed:.2f} s, {count / elapsed:.0f}/s, '
+            f'{len(queries) / count:.2f} queries per friendship'
+        ))
@@ -0,0 +1,139 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app.models import Character, Conversation, CustomUser, Game, GameCategory, Message
+from app.search import _ranked_ids, search_backend, search_terms
+
+WORDS = (
+    'raid boss guild quest dungeon loot tank healer druid knight mage hunter '
+    'server castle dragon sword shield potion level party trade market arena '
+    'respawn war clan hello thanks tomorrow yesterday evening online remember '
+    'old times again friend nick character account ban event season'
+).split()
+YEARS = [str(year) for year in range(1998, 2025)]
+SYLLABLES = 'ka ro mi tu le sa no vi da pe zu ri go fa ne'.split()
+USERNAME_PREFIX = 'search-bench-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark message full-text search against an unindexed scan on a synthetic corpus. '
+        'Run it on a throwaway database - e.g. --messages 10000000 takes a while and a lot of disk.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=100000, help='Size of the synthetic corpus')
+        parser.add_argument('--users', type=int, default=500, help='Number of synthetic users (4 characters each)')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--queries', type=int, default=50, help='Number of timed search queries')
+        parser.add_argument('--scan-queries', type=int, default=5, help='Number of timed unindexed scans (slow)')
+        parser.add_argument('--keep', action='store_true', help='Keep the corpus for another run')
+        parser.add_argument('--seed', type=int, default=2004)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Zipf-like vocabulary: a few very common words and a long tail of rare ones
+        self.vocabulary = WORDS + sorted({
+            ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(20000)
+        } - set(WORDS))
+        self.weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(self.vocabulary))))
+        users = list(CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).values_list('id', flat=True))
+        if not users:
+            self.generate(rng, options)
+            users = list(CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).values_list('id', flat=True))
+
+        self.stdout.write(f'Backend: {search_backend()}, corpus: {Message.objects.count()} messages')
+        queries = [self.random_query(rng) for _ in range(options['queries'])]
+        samples = [(rng.choice(users), query) for query in queries]
+
+        indexed = self.time_queries(samples, backend=None)
+        self.report('indexed', indexed)
+        if options['scan_queries']:
+            scan = self.time_queries(samples[:options['scan_queries']], backend='scan')
+            self.report('scan', scan)
+
+        if not options['keep']:
+            self.cleanup()
+
+    def random_query(self, rng):
+        words = rng.choices(self.vocabulary, cum_weights=self.weights, k=rng.randint(1, 2))
+        if rng.random() < 0.3:
+            words.append(rng.choice(YEARS))
+        return ' '.join(words)
+
+    def generate(self, rng, options):
+        self.stdout.write('Generating corpus...')
+        category, _ = GameCategory.objects.get_or_create(title='Benchmark')
+        game, _ = Game.objects.get_or_create(name='Search benchmark', defaults={'category': category})
+
+        password = make_password(None)
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'{USERNAME_PREFIX}{index}', password=password)
+            for index in range(options['users'])
+        ], batch_size=options['batch_size'])
+        user_ids = CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).values_list('id', flat=True)
+        Character.objects.bulk_create([
+            Character(user_id=user_id, game=game, nickname=f'bench{number}', hash_id=f'b{number:09d}')
+            for number, user_id in enumerate(user_id for user_id in user_ids for _ in range(4))
+        ], batch_size=options['batch_size'])
+        character_ids = list(Character.objects.filter(game=game).values_list('id', flat=True))
+
+        total = options['messages']
+        created = 0
+        started = time.monotonic()
+        while created < total:
+            batch = []
+            for _ in range(min(options['batch_size'], total - created)):
+                sender, receiver = rng.sample(character_ids, 2)
+                words = rng.choices(self.vocabulary, cum_weights=self.weights, k=rng.randint(4, 30))
+                if rng.random() < 0.2:
+                    words.insert(rng.randrange(len(words)), rng.choice(YEARS))
+                batch.append(Message(
+                    sender_character_id=sender,
+                    receiver_character_id=receiver,
+                    thread_id=Conversation.thread_id_for(sender, receiver),
+                    content=' '.join(words),
+                ))
+            # bulk_create skips signals, so no conversation/counter bookkeeping happens here
+            with transaction.atomic():
+                Message.objects.bulk_create(batch)
+            created += len(batch)
+            self.stdout.write(f'  {created}/{total} messages ({time.monotonic() - started:.0f}s)')
+
+    def time_queries(self, samples, backend):
+        timings = []
+        for user_id, query in samples:
+            started = time.perf_counter()
+            _ranked_ids(user_id, search_terms(query), 21, 0, backend=backend)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(
+            f'{label:>8}: {len(timings)} queries, p50 {statistics.median(timings):.1f} ms, '
+            f'p95 {p95:.1f} ms, max {timings[-1]:.1f} ms'
+        ))
+
+    def cleanup(self):
+        self.stdout.write('Removing corpus...')
+        characters = Character.objects.filter(user__username__startswith=USERNAME_PREFIX)
+        character_ids = [
+            Character._meta.pk.get_db_prep_value(pk, connection) for pk in characters.values_list('id', flat=True)
+        ]
+        message_table = connection.ops.quote_name(Message._meta.db_table)
+        # Raw batched DELETE - going through the ORM would send a signal per message
+        with connection.cursor() as cursor:
+            for start in range(0, len(character_ids), 100):
+                chunk = character_ids[start:start + 100]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {message_table} WHERE sender_character_id IN ({placeholders})', chunk)
+        CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        Game.objects.filter(name='Search benchmark').delete()
@@ -0,0 +1,152 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import Character, CustomUser, Game, GameCategory, NicknameTrigram
+from app.nickname_search import MIN_QUERY_LENGTH, index_nicknames, rank_nicknames, search_backend, search_nicknames
+
+WORDS = (
+    'dark knight dragon shadow wolf fire ice storm lord mage killer pro sniper ninja '
+    'king queen night blade ghost hunter master lady angel demon'
+).split()
+SYLLABLES = 'ka ro mi tu le sa no vi da pe zu ri go fa ne ba ko xi lu ma te yo'.split()
+USERNAME_PREFIX = 'nick-bench-'
+GAMES = 4  # one character per user and game keeps (user, nickname, game) unique
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark trigram-indexed nickname search against an unindexed icontains scan on a synthetic '
+        'corpus. Run it on a throwaway database - generating the default million characters takes '
+        'about half an hour.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--characters', type=int, default=1000000, help='Size of the synthetic corpus')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--queries', type=int, default=50, help='Number of typed nicknames (one query per keystroke)'
+        )
+        parser.add_argument('--scan-queries', type=int, default=5, help='Number of timed unindexed scans (slow)')
+        parser.add_argument('--keep', action='store_true', help='Keep the corpus for another run')
+        parser.add_argument('--seed', type=int, default=2004)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Zipf-like vocabulary: a few very common words and a long tail of rare ones
+        self.vocabulary = WORDS + sorted({
+            ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(30000)
+        } - set(WORDS))
+        self.weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(self.vocabulary))))
+        if not CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            self.generate(rng, options)
+
+        self.stdout.write(
+            f'Backend: {search_backend()}, corpus: {Character.objects.count()} characters, '
+            f'{NicknameTrigram.objects.count()} trigrams'
+        )
+        queries = self.typed_queries(rng, options['queries'])
+        self.report('ranked', self.time_queries(queries, lambda query: search_nicknames(query, limit=20)))
+        self.report('list', self.time_queries(queries, self.list_page))
+        if options['scan_queries']:
+            scan = self.time_queries(queries[:options['scan_queries']], self.scan_page)
+            self.report('scan', scan)
+
+        if not options['keep']:
+            self.cleanup()
+
+    def random_nickname(self, rng):
+        words = rng.choices(self.vocabulary, cum_weights=self.weights, k=rng.randint(1, 2))
+        nickname = ''.join(word.capitalize() for word in words)
+        # A bare common word is always taken, so single words come with a number
+        if len(words) == 1 or rng.random() < 0.3:
+            nickname += str(rng.randint(0, 999))
+        return nickname
+
+    def typed_queries(self, rng, count):
+        """Every keystroke of a part of existing nicknames, from MIN_QUERY_LENGTH characters on"""
+        corpus = Character.objects.filter(user__username__startswith=USERNAME_PREFIX).count()
+        nicknames = Character.objects.filter(
+            hash_id__in=[f'n{number:09d}' for number in rng.sample(range(corpus), min(count, corpus))]
+        ).order_by('hash_id').values_list('nickname', flat=True)
+        queries = []
+        for nickname in nicknames:
+            start = rng.randint(0, max(len(nickname) - MIN_QUERY_LENGTH, 0))
+            typed = nickname[start:start + rng.randint(MIN_QUERY_LENGTH, 8)]
+            queries.extend(typed[:end] for end in range(MIN_QUERY_LENGTH, len(typed) + 1))
+        return queries
+
+    def generate(self, rng, options):
+        self.stdout.write('Generating corpus...')
+        category, _ = GameCategory.objects.get_or_create(title='Benchmark')
+        games = [
+            Game.objects.get_or_create(name=f'Nickname benchmark {index}', defaults={'category': category})[0]
+            for index in range(GAMES)
+        ]
+
+        password = make_password(None)
+        total = options['characters']
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'{USERNAME_PREFIX}{index}', password=password)
+            for index in range((total + GAMES - 1) // GAMES)
+        ], batch_size=options['batch_size'])
+        user_ids = list(CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).values_list('id', flat=True))
+
+        created = 0
+        started = time.monotonic()
+        while created < total:
+            batch = [
+                Character(
+                    user_id=user_ids[number // GAMES],
+                    game=games[number % GAMES],
+                    nickname=self.random_nickname(rng),
+                    hash_id=f'n{number:09d}',
+                )
+                for number in range(created, min(created + options['batch_size'], total))
+            ]
+            # bulk_create skips the signal that indexes nicknames, so index them here
+            with transaction.atomic():
+                Character.objects.bulk_create(batch)
+                index_nicknames(batch, replace=False, batch_size=options['batch_size'])
+            created += len(batch)
+            self.stdout.write(f'  {created}/{total} characters ({time.monotonic() - started:.0f}s)')
+
+    def list_page(self, query):
+        """What CharacterListView does for an anonymous visitor: the first ranked page and the count"""
+        ranked = rank_nicknames(query, Character.objects.select_related('user', 'game'))
+        list(ranked[:10])
+        ranked.count()
+
+    def scan_page(self, query):
+        """What CharacterListView did before the index: one page and the count for the paginator"""
+        queryset = Character.objects.filter(nickname__icontains=query)
+        list(queryset[:10])
+        queryset.count()
+
+    def time_queries(self, queries, search):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(
+            f'{label:>8}: {len(timings)} queries, p50 {statistics.median(timings):.1f} ms, '
+            f'p95 {p95:.1f} ms, max {timings[-1]:.1f} ms'
+        ))
+
+    def cleanup(self):
+        self.stdout.write('Removing corpus...')
+        # Delete the trigrams first with one statement instead of through the cascade
+        NicknameTrigram.objects.filter(character__user__username__startswith=USERNAME_PREFIX).delete()
+        CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        Game.objects.filter(name__startswith='Nickname benchmark').delete()
@@ -0,0 +1,71 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import Poke
+
+
+class Command(BaseCommand):
+    help = (
+        'POKE lifecycle maintenance: expire PENDING pokes nobody answered and purge old '
+        'IGNORED/BLOCKED/EXPIRED ones. Works in small batches, each in its own short '
+        'transaction, so it is safe to run from cron and to interrupt and run again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--expire-after-days', type=int,
+            default=getattr(settings, 'POKE_EXPIRE_AFTER_DAYS', 30),
+            help='Expire PENDING pokes older than this'
+        )
+        parser.add_argument(
+            '--purge-after-days', type=int,
+            default=getattr(settings, 'POKE_PURGE_AFTER_DAYS', 180),
+            help='Delete IGNORED, BLOCKED and EXPIRED pokes older than this'
+        )
+        parser.add_argument('--no-purge', action='store_true', help='Only expire, do not delete anything')
+        parser.add_argument('--archive', help='Append purged pokes to this file as JSON lines')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches per step')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the pokes that would be affected')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expire_cutoff = now - timedelta(days=options['expire_after_days'])
+        purge_cutoff = now - timedelta(days=options['purge_after_days'])
+
+        if options['dry_run']:
+            stale = Poke.objects.filter(status='PENDING', sent_date__lt=expire_cutoff).count()
+            closed = Poke.objects.filter(status__in=Poke.CLOSED_STATUSES, sent_date__lt=purge_cutoff).count()
+            self.stdout.write(f'{stale} poke(s) to expire, {closed} poke(s) to purge')
+            return
+
+        expired = self.run_batches(lambda: Poke.expire_stale(expire_cutoff, options['batch_size']), options)
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} poke(s)'))
+
+        if options['no_purge']:
+            return
+        if options['archive']:
+            with open(options['archive'], 'a', encoding='utf-8') as archive:
+                purged = self.run_batches(
+                    lambda: Poke.purge_closed(purge_cutoff, options['batch_size'], archive=archive), options
+                )
+        else:
+            purged = self.run_batches(lambda: Poke.purge_closed(purge_cutoff, options['batch_size']), options)
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} poke(s)'))
+
+    def run_batches(self, batch, options):
+        total = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            count = batch()
+            total += count
+            batches += 1
+            if count < options['batch_size']:
+                break
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return total
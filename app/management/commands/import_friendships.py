@@ -0,0 +1,41 @@
+import csv
+import sys
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import CharacterFriend
+
+
+class Command(BaseCommand):
+    help = (
+        'Import character friendships from a CSV file of character id pairs '
+        '(two columns, no header; "-" reads stdin). Existing friendships, '
+        'self-pairs and unknown characters are skipped. Rows are imported in '
+        'batches that commit one by one: an invalid row stops the import, but '
+        'the batches before it stay imported. Fix the row and run the command '
+        'again; friendships already imported are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file, or - for stdin')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        source = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            created = CharacterFriend.import_pairs(self.read_pairs(source), batch_size=options['batch_size'])
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        self.stdout.write(self.style.SUCCESS(f'Imported {created} friendships'))
+
+    def read_pairs(self, source):
+        reader = csv.reader(source)
+        for row in reader:
+            if not row:
+                continue
+            try:
+                yield uuid.UUID(row[0].strip()), uuid.UUID(row[1].strip())
+            except (IndexError, ValueError) as e:
+                raise CommandError(f'Invalid row {reader.line_num}: {e}')
@@ -0,0 +1,36 @@
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+
+from app.models import Character, CharacterFriend
+from app.suggestions import refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Precompute and cache "players you might know" suggestions for characters with friends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--character', type=uuid.UUID, help='Only this character')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        characters = Character.objects.annotate(
+            has_friends=Exists(CharacterFriend.objects.filter(
+                Q(character1=OuterRef('pk')) | Q(character2=OuterRef('pk'))
+            ))
+        ).filter(has_friends=True).order_by('pk')
+        if options['character']:
+            characters = characters.filter(pk=options['character'])
+
+        total = 0
+        batch = []
+        for character in characters.iterator(chunk_size=options['batch_size']):
+            batch.append(character)
+            if len(batch) >= options['batch_size']:
+                refresh_suggestions(batch)
+                total += len(batch)
+                batch = []
+        refresh_suggestions(batch)
+        total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Precomputed suggestions for {total} characters'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from app.nickname_search import rebuild_nickname_index, search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the nickname trigram index (NicknameTrigram), e.g. after bulk-loading characters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if search_backend() == 'postgresql':
+            self.stdout.write('PostgreSQL searches nicknames through its pg_trgm index - nothing to rebuild')
+            return
+        rows = rebuild_nickname_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt nickname index with {rows} trigrams'))
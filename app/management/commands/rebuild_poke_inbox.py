@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app.models import PokeInboxEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the POKE inbox projection (PokeInboxEntry) from the Poke table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        PokeInboxEntry.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt POKE inbox with {PokeInboxEntry.objects.count()} entries'
+        ))
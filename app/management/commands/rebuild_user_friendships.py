@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.models import UserFriendship
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the user-level friendship projection (UserFriendship) from CharacterFriend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        pairs = UserFriendship.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {pairs} user friendships'))
@@ -0,0 +1,26 @@
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from app.counters import recount_counters
+from app.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Rebuild notification counters (unread messages, POKEs, friend requests) from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', type=uuid.UUID, dest='user_ids',
+                            help='Only recount the given user id (can be repeated)')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by('pk')
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+
+        recounted = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            recount_counters(user_id)
+            recounted += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted notification counters for {recounted} user(s)'))
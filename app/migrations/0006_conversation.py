@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_conversations(apps, schema_editor):
+    Message = apps.get_model('app', 'Message')
+    Conversation = apps.get_model('app', 'Conversation')
+
+    messages = Message.objects.filter(
+        sender_character__isnull=False,
+        receiver_character__isnull=False
+    ).order_by('thread_id', '-sent_date', '-id')
+
+    conversation = None
+    for message in messages.iterator():
+        if conversation is None or conversation.thread_id != message.thread_id:
+            if conversation is not None:
+                conversation.save()
+            # First message seen for a thread is its latest one
+            character_a_id, character_b_id = sorted(
+                [message.sender_character_id, message.receiver_character_id], key=str
+            )
+            conversation = Conversation(
+                thread_id=message.thread_id,
+                character_a_id=character_a_id,
+                character_b_id=character_b_id,
+                last_message_id=message.id,
+                last_sent_date=message.sent_date,
+            )
+        if not message.is_read:
+            if message.receiver_character_id == conversation.character_a_id:
+                conversation.unread_count_a += 1
+            else:
+                conversation.unread_count_b += 1
+    if conversation is not None:
+        conversation.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_add_character_block'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.UUIDField(unique=True)),
+                ('last_sent_date', models.DateTimeField()),
+                ('unread_count_a', models.PositiveIntegerField(default=0)),
+                ('unread_count_b', models.PositiveIntegerField(default=0)),
+                ('character_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations_as_a', to='app.character')),
+                ('character_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations_as_b', to='app.character')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.message')),
+            ],
+            options={
+                'ordering': ['-last_sent_date'],
+                'indexes': [models.Index(fields=['character_a', '-last_sent_date'], name='app_convers_charact_f425e2_idx'), models.Index(fields=['character_b', '-last_sent_date'], name='app_convers_charact_0ec106_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
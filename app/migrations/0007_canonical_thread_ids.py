@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:11
+
+import uuid
+
+from django.db import migrations, models
+
+
+# Must match Conversation.THREAD_ID_NAMESPACE
+THREAD_ID_NAMESPACE = uuid.UUID('8f56833d-9997-433c-b887-8d05ac5dc09f')
+
+
+def canonicalize_thread_ids(apps, schema_editor):
+    """Move every character pair onto a single deterministic thread"""
+    Message = apps.get_model('app', 'Message')
+    Conversation = apps.get_model('app', 'Conversation')
+
+    pairs = set()
+    for sender_id, receiver_id in Message.objects.filter(
+        sender_character__isnull=False,
+        receiver_character__isnull=False
+    ).values_list('sender_character_id', 'receiver_character_id').distinct().iterator():
+        pairs.add(tuple(sorted([sender_id, receiver_id], key=str)))
+
+    for character_a_id, character_b_id in pairs:
+        thread_id = uuid.uuid5(THREAD_ID_NAMESPACE, f'{character_a_id}:{character_b_id}')
+        Message.objects.filter(
+            models.Q(sender_character_id=character_a_id, receiver_character_id=character_b_id) |
+            models.Q(sender_character_id=character_b_id, receiver_character_id=character_a_id)
+        ).update(thread_id=thread_id)
+
+        # Merge duplicate conversation rows of the pair into the newest one
+        conversations = list(Conversation.objects.filter(
+            character_a_id=character_a_id,
+            character_b_id=character_b_id
+        ).order_by('-last_sent_date'))
+        if not conversations:
+            continue
+        conversation, duplicates = conversations[0], conversations[1:]
+        conversation.thread_id = thread_id
+        conversation.unread_count_a = sum(c.unread_count_a for c in conversations)
+        conversation.unread_count_b = sum(c.unread_count_b for c in conversations)
+        Conversation.objects.filter(pk__in=[c.pk for c in duplicates]).delete()
+        conversation.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_conversation'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_thread_ids, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('character_a', 'character_b'), name='unique_conversation_character_pair'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_canonical_thread_ids'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread_id', 'sent_date'], name='app_message_thread__a12943_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:14
+
+from django.db import migrations, models
+
+
+def set_read_watermarks(apps, schema_editor):
+    """Derive per-participant watermarks from the old per-message is_read flags"""
+    Conversation = apps.get_model('app', 'Conversation')
+    Message = apps.get_model('app', 'Message')
+
+    for conversation in Conversation.objects.iterator():
+        for side in ('a', 'b'):
+            received = Message.objects.filter(
+                thread_id=conversation.thread_id,
+                receiver_character_id=getattr(conversation, f'character_{side}_id')
+            )
+            first_unread = received.filter(is_read=False).order_by('id').values_list('id', flat=True).first()
+            if first_unread is None:
+                watermark = conversation.last_message_id or 0
+            else:
+                watermark = first_unread - 1
+            setattr(conversation, f'read_watermark_{side}', watermark)
+            setattr(conversation, f'unread_count_{side}', received.filter(id__gt=watermark).count())
+        conversation.save(update_fields=[
+            'read_watermark_a', 'read_watermark_b', 'unread_count_a', 'unread_count_b'
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_message_thread_sent_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='read_watermark_a',
+            field=models.PositiveBigIntegerField(default=0, help_text='Id of the last message read by character_a'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='read_watermark_b',
+            field=models.PositiveBigIntegerField(default=0, help_text='Id of the last message read by character_b'),
+        ),
+        migrations.RunPython(set_read_watermarks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='read_at',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_conversation_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread_messages', models.PositiveIntegerField(default=0)),
+                ('unread_pokes', models.PositiveIntegerField(default=0)),
+                ('pending_friend_requests', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from app.search import install_search_index
+
+    install_search_index(
+        schema_editor.connection,
+        message_table=apps.get_model('app', 'Message')._meta.db_table,
+        character_table=apps.get_model('app', 'Character')._meta.db_table,
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    from app.search import uninstall_search_index
+
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '0010_notification_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
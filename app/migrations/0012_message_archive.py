@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_message_search'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='message',
+            options={},
+        ),
+        migrations.CreateModel(
+            name='MessageArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.UUIDField(unique=True)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('first_sent_date', models.DateTimeField()),
+                ('last_sent_date', models.DateTimeField()),
+                ('payload', models.BinaryField(help_text='zlib-compressed JSON lines, one message per line')),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+                ('character_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.character')),
+                ('character_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.character')),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_poke_inbox(apps, schema_editor):
+    Poke = apps.get_model('app', 'Poke')
+    PokeInboxEntry = apps.get_model('app', 'PokeInboxEntry')
+
+    batch = []
+    for poke in Poke.objects.order_by('pk').iterator(chunk_size=1000):
+        common = {'poke_id': poke.pk, 'status': poke.status, 'sent_date': poke.sent_date}
+        batch.append(PokeInboxEntry(
+            owner_character_id=poke.receiver_character_id,
+            other_character_id=poke.sender_character_id,
+            direction='RECEIVED',
+            **common
+        ))
+        batch.append(PokeInboxEntry(
+            owner_character_id=poke.sender_character_id,
+            other_character_id=poke.receiver_character_id,
+            direction='SENT',
+            **common
+        ))
+        if len(batch) >= 1000:
+            PokeInboxEntry.objects.bulk_create(batch)
+            batch = []
+    PokeInboxEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_message_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PokeInboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direction', models.CharField(choices=[('RECEIVED', 'Received'), ('SENT', 'Sent')], max_length=8)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RESPONDED', 'Responded'), ('IGNORED', 'Ignored'), ('BLOCKED', 'Blocked')], max_length=20)),
+                ('sent_date', models.DateTimeField()),
+                ('other_character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.character')),
+                ('owner_character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='poke_inbox', to='app.character')),
+                ('poke', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='app.poke')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner_character', 'direction', 'status', '-sent_date'], name='app_pokeinb_owner_c_11115f_idx'), models.Index(fields=['owner_character', '-sent_date'], name='app_pokeinb_owner_c_72126c_idx')],
+                'constraints': [models.UniqueConstraint(fields=('poke', 'direction'), name='unique_poke_inbox_entry')],
+            },
+        ),
+        migrations.RunPython(backfill_poke_inbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_poke_inbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='poke',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('RESPONDED', 'Responded'), ('IGNORED', 'Ignored'), ('BLOCKED', 'Blocked'), ('EXPIRED', 'Expired')], default='PENDING', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='pokeinboxentry',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('RESPONDED', 'Responded'), ('IGNORED', 'Ignored'), ('BLOCKED', 'Blocked'), ('EXPIRED', 'Expired')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='poke',
+            index=models.Index(fields=['status', 'sent_date'], name='app_poke_status_8f68ed_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:02
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fold_poke_blocks(apps, schema_editor):
+    """Copy PokeBlock rows into CharacterBlock with the POKE scope, in pk batches"""
+    PokeBlock = apps.get_model('app', 'PokeBlock')
+    CharacterBlock = apps.get_model('app', 'CharacterBlock')
+    last_pk = 0
+    while True:
+        batch = list(PokeBlock.objects.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        # A pair that is also fully blocked keeps its full block
+        blocked = set(CharacterBlock.objects.filter(
+            blocker_character__in={block.blocker_character_id for block in batch},
+            blocked_character__in={block.blocked_character_id for block in batch},
+        ).values_list('blocker_character_id', 'blocked_character_id'))
+        folded = [
+            block for block in batch
+            if (block.blocker_character_id, block.blocked_character_id) not in blocked
+        ]
+        CharacterBlock.objects.bulk_create([
+            CharacterBlock(
+                blocker_character_id=block.blocker_character_id,
+                blocked_character_id=block.blocked_character_id,
+                scope='POKE',
+                reason=block.reason,
+            )
+            for block in folded
+        ])
+        # auto_now_add stamps blocked_at on insert; restore the original dates
+        for block in folded:
+            CharacterBlock.objects.filter(
+                blocker_character_id=block.blocker_character_id,
+                blocked_character_id=block.blocked_character_id,
+            ).update(blocked_at=block.blocked_at)
+
+
+def unfold_poke_blocks(apps, schema_editor):
+    PokeBlock = apps.get_model('app', 'PokeBlock')
+    CharacterBlock = apps.get_model('app', 'CharacterBlock')
+    poke_blocks = CharacterBlock.objects.filter(scope='POKE')
+    for start in range(0, poke_blocks.count(), BATCH_SIZE):
+        batch = list(poke_blocks.order_by('pk')[start:start + BATCH_SIZE])
+        PokeBlock.objects.bulk_create([
+            PokeBlock(
+                blocker_character_id=block.blocker_character_id,
+                blocked_character_id=block.blocked_character_id,
+                reason=block.reason[:200],
+            )
+            for block in batch
+        ])
+    poke_blocks.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_poke_expired_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='characterblock',
+            name='scope',
+            field=models.CharField(choices=[('ALL', 'All interactions'), ('POKE', 'POKEs only')], default='ALL', max_length=10),
+        ),
+        migrations.RunPython(fold_poke_blocks, unfold_poke_blocks),
+        migrations.DeleteModel(
+            name='PokeBlock',
+        ),
+        migrations.CreateModel(
+            name='PokeBlock',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('app.characterblock',),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_unify_blocks'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='characterblock',
+            index=models.Index(fields=['blocked_character', 'blocker_character'], name='app_charact_blocked_7ffe1f_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='characterblock',
+            name='app_charact_blocked_363613_idx',
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_user_friendships(apps, schema_editor):
+    CharacterFriend = apps.get_model('app', 'CharacterFriend')
+    UserFriendship = apps.get_model('app', 'UserFriendship')
+    pairs = {}
+    for user_a_id, user_b_id, count in CharacterFriend.objects.values_list(
+        'character1__user_id', 'character2__user_id'
+    ).annotate(count=models.Count('pk')).order_by():
+        if user_a_id != user_b_id:
+            key = (user_a_id, user_b_id) if str(user_a_id) < str(user_b_id) else (user_b_id, user_a_id)
+            pairs[key] = pairs.get(key, 0) + count
+    UserFriendship.objects.bulk_create(
+        [UserFriendship(user1_id=user1_id, user2_id=user2_id, character_pairs=count)
+         for (user1_id, user2_id), count in pairs.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_block_reverse_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserFriendship',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('character_pairs', models.PositiveIntegerField(default=0)),
+                ('user1', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friendships_as_user1', to=settings.AUTH_USER_MODEL)),
+                ('user2', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friendships_as_user2', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user2', 'user1'], name='app_userfri_user2_i_4f5d04_idx')],
+                'unique_together': {('user1', 'user2')},
+            },
+        ),
+        migrations.RunPython(backfill_user_friendships, migrations.RunPython.noop),
+    ]
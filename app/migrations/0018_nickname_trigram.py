@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:55
+
+import itertools
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+
+
+def create_nickname_index(apps, schema_editor):
+    from app.nickname_search import install_nickname_index, trigram_rows
+
+    db = schema_editor.connection
+    Character = apps.get_model('app', 'Character')
+    if db.vendor == 'postgresql':
+        install_nickname_index(db, character_table=Character._meta.db_table)
+        return
+    NicknameTrigram = apps.get_model('app', 'NicknameTrigram')
+    characters = Character.objects.using(db.alias).values_list('pk', 'nickname').order_by().iterator(chunk_size=1000)
+    with transaction.atomic(using=db.alias):
+        while True:
+            batch = list(itertools.islice(characters, 1000))
+            if not batch:
+                break
+            NicknameTrigram.objects.using(db.alias).bulk_create(trigram_rows(NicknameTrigram, batch))
+
+
+def drop_nickname_index(apps, schema_editor):
+    from app.nickname_search import uninstall_nickname_index
+
+    uninstall_nickname_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+
+    dependencies = [
+        ('app', '0017_user_friendship'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NicknameTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('trigram_count', models.PositiveSmallIntegerField()),
+                ('nickname', models.CharField(max_length=100)),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nickname_trigrams', to='app.character')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'trigram_count', 'character', 'nickname'], name='app_nicknam_trigram_c8f59d_idx')],
+            },
+        ),
+        migrations.RunPython(create_nickname_index, drop_nickname_index),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction, connection, IntegrityError
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxLengthValidator, MinValueValidator, MaxValueValidator
 from django.db.models.signals import post_save
@@ -12,7 +12,11 @@ import string
 from django.urls import reverse
 from django.contrib.postgres.fields import ArrayField
 from django.utils import timezone
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
 import json
+import zlib
 
 # replace User model with CustomUser
 class CustomUser(AbstractUser):
@@ -184,6 +188,26 @@ class Game(models.Model):
             self.tags = ','.join(tags)
             self.save()
 
+class CharacterQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Leave out characters that blocked any of user's characters or that
+        any of user's characters blocked (full blocks only), as two NOT
+        EXISTS anti-joins so counts and pagination stay exact. Each probe is
+        one lookup on the (blocker, blocked) / (blocked, blocker) indexes of
+        CharacterBlock.
+        """
+        if not user.is_authenticated:
+            return self
+        mine = Character.objects.filter(user=user).values('pk')
+        full_blocks = CharacterBlock.objects.filter(scope=CharacterBlock.SCOPE_ALL)
+        return self.exclude(
+            Exists(full_blocks.filter(blocker_character=OuterRef('pk'), blocked_character__in=mine))
+        ).exclude(
+            Exists(full_blocks.filter(blocked_character=OuterRef('pk'), blocker_character__in=mine))
+        )
+
+
 class Character(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, db_index=True)
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, db_index=True)
@@ -211,6 +235,8 @@ class Character(models.Model):
         help_text="Ended year in format YYYY.",
     )
 
+    objects = CharacterQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.nickname} in {self.game.name}"
 
@@ -245,6 +271,30 @@ class Character(models.Model):
         # Zapewnia, że kombinacja (user, nickname, game) jest unikalna
         unique_together = ('user', 'nickname', 'game')
 
+
+class NicknameTrigram(models.Model):
+    """
+    Trigram index of Character.nickname for SQLite (see
+    app/nickname_search.py), one row per distinct trigram of a nickname.
+    Maintained by a signal on Character. trigram_count is the size of the
+    nickname's trigram set, used to rank matches by similarity, and the
+    lower-cased nickname is repeated so candidates can be checked for the
+    query without reading Character.
+    """
+    character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='nickname_trigrams')
+    trigram = models.CharField(max_length=3)
+    trigram_count = models.PositiveSmallIntegerField()
+    nickname = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            # Posting lists, covering the candidate lookup
+            models.Index(fields=['trigram', 'trigram_count', 'character', 'nickname']),
+        ]
+
+    def __str__(self):
+        return f"{self.trigram!r} of {self.character_id}"
+
 class Friend(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='friends')
     friend = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='friend_of')
@@ -285,12 +335,130 @@ class CharacterFriend(models.Model):
         ]
     
     def save(self, *args, **kwargs):
-        # Ensure character1.id < character2.id to avoid duplicates
-        # We need to compare UUIDs properly
-        if str(self.character1.id) > str(self.character2.id):
-            self.character1, self.character2 = self.character2, self.character1
+        # Ensure character1_id < character2_id to avoid duplicates - compared on
+        # the ids alone, so saving with only ids set does not fetch the characters
+        if (self.character1_id, self.character2_id) != self.ordered_pair(self.character1_id, self.character2_id):
+            fields_cache = self._state.fields_cache
+            if 'character1' in fields_cache and 'character2' in fields_cache:
+                self.character1, self.character2 = self.character2, self.character1
+            else:
+                self.character1_id, self.character2_id = self.character2_id, self.character1_id
         super().save(*args, **kwargs)
     
+    @staticmethod
+    def ordered_pair(character_a_id, character_b_id):
+        """(character1_id, character2_id) in the order friendships are stored in"""
+        if str(character_a_id) > str(character_b_id):
+            return character_b_id, character_a_id
+        return character_a_id, character_b_id
+    
+    @classmethod
+    def friend_ids_filter(cls, user, field='id'):
+        """Q matching the characters befriended by any of user's characters, as two subqueries"""
+        return (
+            models.Q(**{f'{field}__in': cls.objects.filter(character1__user=user).values('character2')}) |
+            models.Q(**{f'{field}__in': cls.objects.filter(character2__user=user).values('character1')})
+        )
+
+    @classmethod
+    def import_pairs(cls, pairs, batch_size=1000):
+        """
+        Create friendships from (character_a_id, character_b_id) pairs without
+        loading any character: pairs are ordered and deduplicated in memory,
+        checked against existing rows and inserted with bulk_create, one batch
+        at a time, so any iterable can be streamed in. Self-pairs and unknown
+        characters are skipped. The bulk INSERT sends no post_save, so the
+        side effects of the CharacterFriend signal receivers (user
+        friendships, friend and suggestion caches) are applied per batch, for
+        the rows it actually inserted. Each batch commits on its own.
+        Returns the number of friendships created.
+        """
+        created = 0
+        batch = set()
+        for character_a_id, character_b_id in pairs:
+            character_a_id, character_b_id = uuid.UUID(str(character_a_id)), uuid.UUID(str(character_b_id))
+            if character_a_id != character_b_id:
+                batch.add(cls.ordered_pair(character_a_id, character_b_id))
+            if len(batch) >= batch_size:
+                created += cls._import_batch(batch)
+                batch = set()
+        if batch:
+            created += cls._import_batch(batch)
+        return created
+    
+    @classmethod
+    def _import_batch(cls, pairs):
+        from .friends import invalidate_friends
+        from .suggestions import invalidate_suggestions_for_friendships
+        
+        with transaction.atomic():
+            owners = dict(Character.objects.filter(
+                pk__in={character_id for pair in pairs for character_id in pair}
+            ).values_list('id', 'user_id'))
+            existing = set(cls.objects.filter(
+                character1__in={pair[0] for pair in pairs}, character2__in={pair[1] for pair in pairs}
+            ).values_list('character1_id', 'character2_id'))
+            new_pairs = [
+                pair for pair in pairs
+                if pair not in existing and pair[0] in owners and pair[1] in owners
+            ]
+            if not new_pairs:
+                return 0
+            # A concurrent import may have inserted some of them since the check
+            new_pairs = cls._insert_pairs(new_pairs, existing)
+            
+            UserFriendship.add_character_pairs((owners[pair[0]], owners[pair[1]]) for pair in new_pairs)
+            invalidate_friends(*{character_id for pair in new_pairs for character_id in pair})
+            invalidate_suggestions_for_friendships(new_pairs)
+        return len(new_pairs)
+    
+    @classmethod
+    def _insert_pairs(cls, pairs, existing):
+        """
+        INSERT the ordered pairs, skipping conflicts, and return the pairs
+        this statement inserted. PostgreSQL and SQLite report them with
+        RETURNING; elsewhere they are re-selected, which can still count a
+        pair inserted concurrently between the check and the INSERT.
+        """
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            cls.objects.bulk_create(
+                [
+                    cls(character1_id=character1_id, character2_id=character2_id)
+                    for character1_id, character2_id in pairs
+                ],
+                ignore_conflicts=True
+            )
+            present = set(cls.objects.filter(
+                character1__in={pair[0] for pair in pairs}, character2__in={pair[1] for pair in pairs}
+            ).values_list('character1_id', 'character2_id'))
+            return [pair for pair in pairs if pair in present and pair not in existing]
+
+        character1 = cls._meta.get_field('character1')
+        character2 = cls._meta.get_field('character2')
+        created_at = cls._meta.get_field('created_at')
+        created_at_value = created_at.get_db_prep_value(timezone.now(), connection)
+        pk = Character._meta.pk
+        inserted = []
+        with connection.cursor() as cursor:
+            for start in range(0, len(pairs), 500):
+                chunk = pairs[start:start + 500]
+                params = []
+                for character1_id, character2_id in chunk:
+                    params += [
+                        character1.get_db_prep_value(character1_id, connection),
+                        character2.get_db_prep_value(character2_id, connection),
+                        created_at_value,
+                    ]
+                cursor.execute(
+                    f"INSERT INTO {cls._meta.db_table} ({character1.column}, {character2.column}, {created_at.column}) "
+                    f"VALUES {', '.join(['(%s, %s, %s)'] * len(chunk))} "
+                    f"ON CONFLICT ({character1.column}, {character2.column}) DO NOTHING "
+                    f"RETURNING {character1.column}, {character2.column}",
+                    params
+                )
+                inserted += [(pk.to_python(row[0]), pk.to_python(row[1])) for row in cursor.fetchall()]
+        return inserted
+    
     def get_other_character(self, character):
         """Get the other character in this friendship"""
         if character == self.character1:
@@ -301,6 +469,118 @@ class CharacterFriend(models.Model):
         return f"{self.character1.nickname} <-> {self.character2.nickname}"
 
 
+class UserFriendship(models.Model):
+    """
+    User-level projection of CharacterFriend: one row per pair of users whose
+    characters are friends, with the number of such character pairs.
+    Maintained by signals on CharacterFriend; user1 sorts before user2 like
+    CharacterFriend's characters, so "are these users friends" is one probe
+    of the unique index.
+    """
+    user1 = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='friendships_as_user1')
+    user2 = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='friendships_as_user2')
+    character_pairs = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user1', 'user2')
+        indexes = [
+            models.Index(fields=['user2', 'user1']),
+        ]
+
+    def __str__(self):
+        return f"{self.user1_id} <-> {self.user2_id} ({self.character_pairs})"
+
+    @staticmethod
+    def ordered(user_a_id, user_b_id):
+        return (user_a_id, user_b_id) if str(user_a_id) < str(user_b_id) else (user_b_id, user_a_id)
+
+    @classmethod
+    def are_friends(cls, user_a, user_b):
+        if not user_a.is_authenticated or not user_b.is_authenticated or user_a.pk == user_b.pk:
+            return False
+        user1_id, user2_id = cls.ordered(user_a.pk, user_b.pk)
+        return cls.objects.filter(user1_id=user1_id, user2_id=user2_id).exists()
+
+    @classmethod
+    def friend_ids_filter(cls, user, field='id'):
+        """Q matching the users user is friends with, as two index-backed subqueries"""
+        return (
+            models.Q(**{f'{field}__in': cls.objects.filter(user1=user).values('user2')}) |
+            models.Q(**{f'{field}__in': cls.objects.filter(user2=user).values('user1')})
+        )
+
+    @classmethod
+    def add_character_pair(cls, user_a_id, user_b_id):
+        cls.add_character_pairs([(user_a_id, user_b_id)])
+
+    @classmethod
+    def add_character_pairs(cls, user_pairs):
+        """Count new character friendships, given as (user_a_id, user_b_id) of their owners"""
+        counts = {}
+        for user_a_id, user_b_id in user_pairs:
+            if user_a_id != user_b_id:
+                key = cls.ordered(user_a_id, user_b_id)
+                counts[key] = counts.get(key, 0) + 1
+
+        if not counts:
+            return
+        existing = set(cls.objects.filter(
+            user1__in={key[0] for key in counts}, user2__in={key[1] for key in counts}
+        ).values_list('user1_id', 'user2_id'))
+        new = {key for key in counts if key not in existing}
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create([
+                    cls(user1_id=user1_id, user2_id=user2_id, character_pairs=counts[(user1_id, user2_id)])
+                    for user1_id, user2_id in new
+                ])
+        except IntegrityError:
+            # Some were created concurrently - fall back to one upsert per pair
+            new = set()
+
+        for (user1_id, user2_id), count in counts.items():
+            if (user1_id, user2_id) in new:
+                continue
+            pair = cls.objects.filter(user1_id=user1_id, user2_id=user2_id)
+            if pair.update(character_pairs=models.F('character_pairs') + count):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(user1_id=user1_id, user2_id=user2_id, character_pairs=count)
+            except IntegrityError:
+                # Created concurrently
+                pair.update(character_pairs=models.F('character_pairs') + count)
+
+    @classmethod
+    def remove_character_pair(cls, user_a_id, user_b_id):
+        if user_a_id == user_b_id:
+            return
+        user1_id, user2_id = cls.ordered(user_a_id, user_b_id)
+        pair = cls.objects.filter(user1_id=user1_id, user2_id=user2_id)
+        pair.filter(character_pairs__gt=0).update(character_pairs=models.F('character_pairs') - 1)
+        pair.filter(character_pairs=0).delete()
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """Recreate every row from CharacterFriend"""
+        pairs = {}
+        for user_a_id, user_b_id, count in CharacterFriend.objects.values_list(
+            'character1__user_id', 'character2__user_id'
+        ).annotate(count=models.Count('pk')).order_by():
+            if user_a_id != user_b_id:
+                key = cls.ordered(user_a_id, user_b_id)
+                pairs[key] = pairs.get(key, 0) + count
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [cls(user1_id=user1_id, user2_id=user2_id, character_pairs=count)
+                 for (user1_id, user2_id), count in pairs.items()],
+                batch_size=batch_size
+            )
+        return len(pairs)
+
+
 class CharacterFriendRequest(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -329,6 +609,13 @@ class CharacterFriendRequest(models.Model):
     class Meta:
         unique_together = ('sender_character', 'receiver_character')
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded state so signals can adjust notification counters
+        instance._loaded_state = {'status': instance.__dict__.get('status')}
+        return instance
+    
     def __str__(self):
         return f"{self.sender_character.nickname} -> {self.receiver_character.nickname} ({self.status})"
 
@@ -353,14 +640,361 @@ class Message(models.Model):
         default=False,
         help_text='Whether sender revealed their user identity'
     )
-    is_read = models.BooleanField(default=False)
-    read_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.sender_character.nickname} -> {self.receiver_character.nickname} ({self.sent_date})"
 
+    def save(self, *args, **kwargs):
+        # A thread is identified by its (unordered) character pair
+        if self.sender_character_id and self.receiver_character_id:
+            self.thread_id = Conversation.thread_id_for(self.sender_character_id, self.receiver_character_id)
+        super().save(*args, **kwargs)
+
     class Meta:
-        ordering = ['sent_date']  # chronologiczne sortowanie wiadomości
+        # No default ordering - thread queries order by (sent_date, id) explicitly
+        indexes = [
+            # Keyset pagination of a thread on (sent_date, id)
+            models.Index(fields=['thread_id', 'sent_date']),
+        ]
+
+
+class Conversation(models.Model):
+    """
+    Materialized index of message threads (one row per thread_id).
+    Kept in sync from Message writes (see app.signals), so the conversation
+    sidebar is a single indexed query instead of several queries per thread.
+    Participants are stored in a stable order (character_a.id < character_b.id)
+    and each pair has exactly one thread with a deterministic thread_id.
+
+    Read state is a per-participant watermark (id of the last message read),
+    so opening a thread is one small write on this row instead of an UPDATE
+    over every unread message.
+    """
+    # Namespace for uuid5 thread ids derived from a character pair - never change it
+    THREAD_ID_NAMESPACE = uuid.UUID('8f56833d-9997-433c-b887-8d05ac5dc09f')
+
+    thread_id = models.UUIDField(unique=True)
+    character_a = models.ForeignKey(
+        Character,
+        on_delete=models.CASCADE,
+        related_name='conversations_as_a'
+    )
+    character_b = models.ForeignKey(
+        Character,
+        on_delete=models.CASCADE,
+        related_name='conversations_as_b'
+    )
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_sent_date = models.DateTimeField()
+    unread_count_a = models.PositiveIntegerField(default=0)
+    unread_count_b = models.PositiveIntegerField(default=0)
+    read_watermark_a = models.PositiveBigIntegerField(
+        default=0,
+        help_text='Id of the last message read by character_a'
+    )
+    read_watermark_b = models.PositiveBigIntegerField(
+        default=0,
+        help_text='Id of the last message read by character_b'
+    )
+
+    class Meta:
+        ordering = ['-last_sent_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['character_a', 'character_b'],
+                name='unique_conversation_character_pair'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['character_a', '-last_sent_date']),
+            models.Index(fields=['character_b', '-last_sent_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.character_a.nickname} <-> {self.character_b.nickname} ({self.thread_id})"
+
+    @staticmethod
+    def order_pair(character1_id, character2_id):
+        """Return the two character ids in the order they are stored in"""
+        if str(character1_id) > str(character2_id):
+            return character2_id, character1_id
+        return character1_id, character2_id
+
+    @classmethod
+    def thread_id_for(cls, character1_id, character2_id):
+        """Deterministic thread id of the conversation between two characters"""
+        character_a_id, character_b_id = cls.order_pair(character1_id, character2_id)
+        return uuid.uuid5(cls.THREAD_ID_NAMESPACE, f'{character_a_id}:{character_b_id}')
+
+    @classmethod
+    def find_thread_id(cls, characters, other_character):
+        """
+        Thread id of the most recent conversation between any of the given
+        characters and other_character, or None if they never talked.
+        """
+        return cls.for_characters(characters).filter(
+            models.Q(character_a=other_character) |
+            models.Q(character_b=other_character)
+        ).order_by('-last_sent_date').values_list('thread_id', flat=True).first()
+
+    def side_of(self, character_id):
+        """Return 'a' or 'b' for a participant of this conversation"""
+        return 'a' if self.character_a_id == character_id else 'b'
+
+    def other_character(self, character_id):
+        """Get the participant that is not character_id"""
+        if self.character_a_id == character_id:
+            return self.character_b
+        return self.character_a
+
+    def unread_count_for(self, character_id):
+        return getattr(self, f'unread_count_{self.side_of(character_id)}')
+
+    def read_watermark_for(self, character_id):
+        return getattr(self, f'read_watermark_{self.side_of(character_id)}')
+
+    def unread_messages_for(self, character_id):
+        """Messages received by character_id after its read watermark"""
+        return Message.objects.filter(
+            thread_id=self.thread_id,
+            receiver_character_id=character_id,
+            id__gt=self.read_watermark_for(character_id)
+        )
+
+    @classmethod
+    def for_characters(cls, characters):
+        """Conversations in which any of the given characters takes part"""
+        return cls.objects.filter(
+            models.Q(character_a__in=characters) |
+            models.Q(character_b__in=characters)
+        )
+
+    @classmethod
+    def record_message(cls, message):
+        """Fold a newly written message into its conversation row"""
+        if not message.sender_character_id or not message.receiver_character_id:
+            return
+        character_a_id, character_b_id = cls.order_pair(
+            message.sender_character_id, message.receiver_character_id
+        )
+        unread_field = 'unread_count_a' if message.receiver_character_id == character_a_id else 'unread_count_b'
+        pair = {'character_a_id': character_a_id, 'character_b_id': character_b_id}
+
+        updated = cls.objects.filter(**pair).update(**{
+            'last_message': message,
+            'last_sent_date': message.sent_date,
+            unread_field: models.F(unread_field) + 1,
+        })
+        if updated:
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    thread_id=message.thread_id,
+                    last_message=message,
+                    last_sent_date=message.sent_date,
+                    **pair,
+                    **{unread_field: 1}
+                )
+        except IntegrityError:
+            # Another writer created the row first - apply the update instead
+            cls.objects.filter(**pair).update(**{
+                'last_message': message,
+                'last_sent_date': message.sent_date,
+                unread_field: models.F(unread_field) + 1,
+            })
+
+    @classmethod
+    def mark_read(cls, characters, thread_ids=None):
+        """
+        Move the read watermark of the given characters up to the last message
+        of each thread (all of their threads when thread_ids is None).
+        Threads whose watermark is already there are not written to; the
+        watermark advances even when the unread counter has drifted to 0.
+        Returns the number of conversations updated.
+        """
+        from .counters import adjust_counters
+
+        if isinstance(thread_ids, (str, uuid.UUID)):
+            thread_ids = [thread_ids]
+
+        updated = 0
+        read_per_user = {}
+        with transaction.atomic():
+            for side in ('a', 'b'):
+                conversations = cls.objects.filter(
+                    models.Q(**{f'unread_count_{side}__gt': 0}) |
+                    models.Q(**{f'read_watermark_{side}__lt': models.F('last_message')}),
+                    **{f'character_{side}__in': characters}
+                )
+                if thread_ids is not None:
+                    conversations = conversations.filter(thread_id__in=thread_ids)
+                rows = list(conversations.select_for_update(of=('self',)).values_list(
+                    'pk', f'character_{side}__user_id', f'unread_count_{side}'
+                ))
+                if not rows:
+                    continue
+                updated += cls.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(**{
+                    f'read_watermark_{side}': Coalesce(models.F('last_message'), models.F(f'read_watermark_{side}')),
+                    f'unread_count_{side}': 0,
+                })
+                for _, user_id, unread_count in rows:
+                    read_per_user[user_id] = read_per_user.get(user_id, 0) + unread_count
+
+            for user_id, read_count in read_per_user.items():
+                if read_count:
+                    adjust_counters(user_id, unread_messages=-read_count)
+        return updated
+
+    @classmethod
+    def rebuild(cls, thread_id):
+        """Recompute a conversation row from its messages (e.g. after a delete)"""
+        latest_message = Message.objects.filter(
+            thread_id=thread_id,
+            sender_character__isnull=False,
+            receiver_character__isnull=False
+        ).order_by('-sent_date', '-id').first()
+        if latest_message is None:
+            if MessageArchive.restore(thread_id):
+                # Only the archived part of the thread was left
+                return cls.rebuild(thread_id)
+            cls.objects.filter(thread_id=thread_id).delete()
+            return None
+
+        character_a_id, character_b_id = cls.order_pair(
+            latest_message.sender_character_id, latest_message.receiver_character_id
+        )
+        conversation, _ = cls.objects.update_or_create(
+            character_a_id=character_a_id,
+            character_b_id=character_b_id,
+            defaults={
+                'thread_id': thread_id,
+                'last_message': latest_message,
+                'last_sent_date': latest_message.sent_date,
+            }
+        )
+        # Unread counters are derived from the read watermarks
+        conversation.unread_count_a = conversation.unread_messages_for(character_a_id).count()
+        conversation.unread_count_b = conversation.unread_messages_for(character_b_id).count()
+        conversation.save(update_fields=['unread_count_a', 'unread_count_b'])
+        return conversation
+
+
+class MessageArchive(models.Model):
+    """
+    Messages of an inactive thread moved out of the hot Message table
+    (see the archive_inactive_threads command) as zlib-compressed JSON lines.
+    The last message of a thread always stays in Message, so the conversation
+    sidebar keeps working; the rest is restored when the thread is opened.
+    """
+    ARCHIVED_FIELDS = (
+        'id', 'sender_character_id', 'receiver_character_id', 'content',
+        'sent_date', 'privacy_mode', 'identity_revealed'
+    )
+
+    thread_id = models.UUIDField(unique=True)
+    character_a = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='+')
+    character_b = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='+')
+    message_count = models.PositiveIntegerField(default=0)
+    first_sent_date = models.DateTimeField()
+    last_sent_date = models.DateTimeField()
+    payload = models.BinaryField(help_text='zlib-compressed JSON lines, one message per line')
+    archived_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Archive of {self.thread_id} ({self.message_count} messages)"
+
+    @classmethod
+    def encode(cls, rows):
+        lines = []
+        for row in rows:
+            row = dict(row)
+            row['sent_date'] = row['sent_date'].isoformat()
+            for key in ('sender_character_id', 'receiver_character_id'):
+                row[key] = str(row[key]) if row[key] else None
+            lines.append(json.dumps(row, ensure_ascii=False))
+        return zlib.compress('\n'.join(lines).encode('utf-8'), 6)
+
+    def decode(self):
+        """Archived messages as a list of dicts (chronological)"""
+        rows = []
+        for line in zlib.decompress(bytes(self.payload)).decode('utf-8').splitlines():
+            row = json.loads(line)
+            row['sent_date'] = parse_datetime(row['sent_date'])
+            rows.append(row)
+        return rows
+
+    @classmethod
+    def archive_thread(cls, thread_id):
+        """
+        Move all messages of a thread except the newest one into its archive.
+        Returns the number of messages archived.
+        """
+        with transaction.atomic():
+            conversation = Conversation.objects.select_for_update().filter(thread_id=thread_id).first()
+            if conversation is None or conversation.last_message_id is None:
+                return 0
+            hot_messages = Message.objects.filter(thread_id=thread_id).exclude(pk=conversation.last_message_id)
+            rows = list(hot_messages.order_by('sent_date', 'id').values(*cls.ARCHIVED_FIELDS))
+            if not rows:
+                return 0
+
+            archive = cls.objects.select_for_update().filter(thread_id=thread_id).first()
+            if archive is None:
+                archive = cls(
+                    thread_id=thread_id,
+                    character_a_id=conversation.character_a_id,
+                    character_b_id=conversation.character_b_id,
+                )
+                archived_rows = []
+            else:
+                archived_rows = archive.decode()
+            all_rows = sorted(archived_rows + rows, key=lambda row: (row['sent_date'], row['id']))
+
+            archive.payload = cls.encode(all_rows)
+            archive.message_count = len(all_rows)
+            archive.first_sent_date = all_rows[0]['sent_date']
+            archive.last_sent_date = all_rows[-1]['sent_date']
+            archive.save()
+            # Plain DELETE on purpose: Message post_delete receivers would rebuild the
+            # conversation and recount unread counters, and neither changes here
+            message_ids = [row['id'] for row in rows]
+            with connection.cursor() as cursor:
+                for start in range(0, len(message_ids), 500):
+                    chunk = message_ids[start:start + 500]
+                    cursor.execute(
+                        f"DELETE FROM {Message._meta.db_table} WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                        chunk
+                    )
+        return len(rows)
+
+    @classmethod
+    def restore(cls, thread_id):
+        """
+        Move an archived thread back into Message, keeping the original ids
+        (read watermarks stay valid). Returns the number of restored messages.
+        """
+        with transaction.atomic():
+            archive = cls.objects.select_for_update().filter(thread_id=thread_id).first()
+            if archive is None:
+                return 0
+            rows = archive.decode()
+            messages = [Message(thread_id=thread_id, **row) for row in rows]
+            Message.objects.bulk_create(messages, batch_size=500)
+            # bulk_create applies auto_now_add - put the original dates back
+            for message, row in zip(messages, rows):
+                message.sent_date = row['sent_date']
+            Message.objects.bulk_update(messages, ['sent_date'], batch_size=500)
+            archive.delete()
+        return len(messages)
+
 
 class CharacterIdentityReveal(models.Model):
     """
@@ -396,6 +1030,25 @@ class CharacterIdentityReveal(models.Model):
         self.revoked_at = timezone.now()
         self.save()
 
+class NotificationCounter(models.Model):
+    """
+    Denormalized per-user counters shown as navbar badges.
+    Maintained incrementally by app.counters - do not edit by hand.
+    """
+    user = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_counter'
+    )
+    unread_messages = models.PositiveIntegerField(default=0)
+    unread_pokes = models.PositiveIntegerField(default=0)
+    pending_friend_requests = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Notifications for {self.user}"
+
+
 class EmailNotification(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     subject = models.CharField(max_length=200)
@@ -459,7 +1112,9 @@ class Poke(models.Model):
         ('RESPONDED', 'Responded'),  # Recipient sent POKE back
         ('IGNORED', 'Ignored'),      # Recipient ignored
         ('BLOCKED', 'Blocked'),      # Blocked by recipient
+        ('EXPIRED', 'Expired'),      # No response in time (expire_pokes)
     ]
+    CLOSED_STATUSES = ('IGNORED', 'BLOCKED', 'EXPIRED')
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     sender_character = models.ForeignKey(
@@ -507,8 +1162,85 @@ class Poke(models.Model):
         indexes = [
             models.Index(fields=['receiver_character', 'status', '-sent_date']),
             models.Index(fields=['sender_character', 'status']),
+            models.Index(fields=['status', 'sent_date']),  # lifecycle maintenance (expire_pokes)
         ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded state so signals can adjust notification counters
+        instance._loaded_state = {
+            'status': instance.__dict__.get('status'),
+            'is_read': instance.__dict__.get('is_read'),
+        }
+        return instance
+    
+    @classmethod
+    def _lock_batch(cls, queryset, batch_size):
+        """Oldest batch of queryset, locked; rows held by live transactions are skipped"""
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True, of=('self',))
+        return queryset.order_by('sent_date', 'pk')[:batch_size]
+
+    @classmethod
+    def expire_stale(cls, cutoff, batch_size=500):
+        """
+        Move one batch of PENDING pokes sent before cutoff to EXPIRED.
+        Bypasses save(), so the inbox projection and notification counters
+        are updated here, for the pokes the UPDATE actually expired.
+        Returns the number of expired pokes.
+        """
+        from .counters import adjust_counters
+
+        with transaction.atomic():
+            rows = list(cls._lock_batch(
+                cls.objects.filter(status='PENDING', sent_date__lt=cutoff), batch_size
+            ).values_list('pk', 'is_read', 'receiver_character__user_id'))
+            if not rows:
+                return 0
+            poke_ids = [poke_id for poke_id, is_read, user_id in rows]
+            expired = cls.objects.filter(pk__in=poke_ids, status='PENDING').update(status='EXPIRED')
+            if expired < len(rows):
+                # Some were answered since the batch was read (no row locks, e.g. SQLite)
+                rows = list(cls.objects.filter(pk__in=poke_ids, status='EXPIRED').values_list(
+                    'pk', 'is_read', 'receiver_character__user_id'
+                ))
+                poke_ids = [poke_id for poke_id, is_read, user_id in rows]
+            PokeInboxEntry.objects.filter(poke_id__in=poke_ids).update(status='EXPIRED')
+
+            unread = {}
+            for poke_id, is_read, user_id in rows:
+                if not is_read:
+                    unread[user_id] = unread.get(user_id, 0) + 1
+            for user_id, count in unread.items():
+                adjust_counters(user_id, unread_pokes=-count)
+        return len(rows)
+
+    @classmethod
+    def purge_closed(cls, cutoff, batch_size=500, archive=None):
+        """
+        Delete one batch of IGNORED, BLOCKED and EXPIRED pokes sent before
+        cutoff (block rows stay, so blocks keep working). With archive
+        (a text file), the deleted rows are appended to it as JSON lines
+        first. Returns the number of deleted pokes.
+        """
+        from django.core.serializers.json import DjangoJSONEncoder
+
+        with transaction.atomic():
+            rows = list(cls._lock_batch(
+                cls.objects.filter(status__in=cls.CLOSED_STATUSES, sent_date__lt=cutoff), batch_size
+            ).values())
+            if not rows:
+                return 0
+            if archive is not None:
+                for row in rows:
+                    archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                archive.flush()
+            # Closed pokes are never counted as unread, so counters need no adjusting
+            PokeInboxEntry.objects.filter(poke_id__in=[row['id'] for row in rows]).delete()
+            cls.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        return len(rows)
+
     def can_send_full_message(self):
         """Check if mutual POKE exchange completed"""
         return self.status == 'RESPONDED' or self.is_mutual()
@@ -525,40 +1257,113 @@ class Poke(models.Model):
         return f"{self.sender_character.nickname} -> {self.receiver_character.nickname} ({self.status})"
 
 
-class PokeBlock(models.Model):
-    """Block POKEs from specific character"""
-    blocker_character = models.ForeignKey(
+class PokeInboxEntry(models.Model):
+    """
+    Per-character projection of POKEs: every Poke has one RECEIVED entry
+    owned by its receiver and one SENT entry owned by its sender, carrying
+    the fields the POKE list filters and sorts on. Kept in sync from Poke
+    writes (see app.signals), so listing POKEs is one index range scan per
+    page instead of a UNION of both directions followed by a COUNT.
+    """
+    RECEIVED = 'RECEIVED'
+    SENT = 'SENT'
+    DIRECTION_CHOICES = [
+        (RECEIVED, 'Received'),
+        (SENT, 'Sent'),
+    ]
+
+    owner_character = models.ForeignKey(
         Character,
         on_delete=models.CASCADE,
-        related_name='blocked_poke_senders'
+        related_name='poke_inbox'
     )
-    blocked_character = models.ForeignKey(
+    other_character = models.ForeignKey(
         Character,
         on_delete=models.CASCADE,
-        related_name='blocked_poke_receivers'
+        related_name='+'
     )
-    blocked_at = models.DateTimeField(auto_now_add=True)
-    reason = models.CharField(
-        max_length=200,
-        blank=True,
-        help_text='Optional reason for blocking'
+    poke = models.ForeignKey(
+        Poke,
+        on_delete=models.CASCADE,
+        related_name='inbox_entries'
     )
-    
+    direction = models.CharField(max_length=8, choices=DIRECTION_CHOICES)
+    status = models.CharField(max_length=20, choices=Poke.STATUS_CHOICES)
+    sent_date = models.DateTimeField()
+
     class Meta:
-        unique_together = ('blocker_character', 'blocked_character')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['poke', 'direction'],
+                name='unique_poke_inbox_entry'
+            ),
+        ]
         indexes = [
-            models.Index(fields=['blocker_character', 'blocked_character']),
+            models.Index(fields=['owner_character', 'direction', 'status', '-sent_date']),
+            models.Index(fields=['owner_character', '-sent_date']),
         ]
-    
+
     def __str__(self):
-        return f"{self.blocker_character.nickname} blocked {self.blocked_character.nickname}"
+        return f"{self.owner_character.nickname} {self.direction.lower()}: {self.poke_id}"
+
+    @property
+    def is_sent(self):
+        return self.direction == self.SENT
+
+    @classmethod
+    def entries_for(cls, poke):
+        """Unsaved RECEIVED and SENT entries of a poke"""
+        common = {'poke_id': poke.pk, 'status': poke.status, 'sent_date': poke.sent_date}
+        return [
+            cls(
+                owner_character_id=poke.receiver_character_id,
+                other_character_id=poke.sender_character_id,
+                direction=cls.RECEIVED,
+                **common
+            ),
+            cls(
+                owner_character_id=poke.sender_character_id,
+                other_character_id=poke.receiver_character_id,
+                direction=cls.SENT,
+                **common
+            ),
+        ]
+
+    @classmethod
+    def record(cls, poke):
+        cls.objects.bulk_create(cls.entries_for(poke), ignore_conflicts=True)
+
+    @classmethod
+    def sync_status(cls, poke):
+        cls.objects.filter(poke_id=poke.pk).exclude(status=poke.status).update(status=poke.status)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """Recreate the whole projection from the Poke table"""
+        with transaction.atomic():
+            cls.objects.all().delete()
+            batch = []
+            for poke in Poke.objects.order_by('pk').iterator(chunk_size=batch_size):
+                batch.extend(cls.entries_for(poke))
+                if len(batch) >= batch_size:
+                    cls.objects.bulk_create(batch)
+                    batch = []
+            cls.objects.bulk_create(batch)
 
 
 class CharacterBlock(models.Model):
     """
-    General blocking between characters.
-    Blocks messages, friend requests, and all interactions.
+    Blocking between characters, one row per (blocker, blocked) pair.
+    SCOPE_ALL blocks messages, friend requests, and all interactions;
+    SCOPE_POKE (see PokeBlock) only blocks POKEs and messages.
     """
+    SCOPE_ALL = 'ALL'
+    SCOPE_POKE = 'POKE'
+    SCOPE_CHOICES = [
+        (SCOPE_ALL, 'All interactions'),
+        (SCOPE_POKE, 'POKEs only'),
+    ]
+
     blocker_character = models.ForeignKey(
         Character,
         on_delete=models.CASCADE,
@@ -569,6 +1374,7 @@ class CharacterBlock(models.Model):
         on_delete=models.CASCADE,
         related_name='blocked_by_characters'  # Characters that blocked me
     )
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, default=SCOPE_ALL)
     blocked_at = models.DateTimeField(auto_now_add=True)
     reason = models.CharField(
         max_length=500,
@@ -580,12 +1386,57 @@ class CharacterBlock(models.Model):
     reported_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
+        # The unique index answers every block check with one lookup, whatever the scope
         unique_together = ('blocker_character', 'blocked_character')
         indexes = [
             models.Index(fields=['blocker_character', 'blocked_at']),
-            models.Index(fields=['blocked_character']),
+            # Reverse direction of the unique index (who blocked these characters)
+            models.Index(fields=['blocked_character', 'blocker_character']),
         ]
         ordering = ['-blocked_at']
     
     def __str__(self):
         return f"{self.blocker_character.nickname} blocked {self.blocked_character.nickname}"
+
+    @classmethod
+    def block(cls, blocker_character, blocked_character, scope=SCOPE_ALL, **defaults):
+        """
+        Block blocked_character with the given scope. A POKE block is widened
+        to a full block, a full block is never narrowed.
+        Returns (block, changed).
+        """
+        with transaction.atomic():
+            block, created = cls.objects.select_for_update().get_or_create(
+                blocker_character=blocker_character,
+                blocked_character=blocked_character,
+                defaults=dict(defaults, scope=scope)
+            )
+            if created or block.scope == cls.SCOPE_ALL or scope == cls.SCOPE_POKE:
+                return block, created
+            block.scope = scope
+            for field, value in defaults.items():
+                if value:
+                    setattr(block, field, value)
+            block.save()
+        return block, True
+
+
+class PokeBlockManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(scope=CharacterBlock.SCOPE_POKE)
+
+
+class PokeBlock(CharacterBlock):
+    """
+    Block POKEs from specific character - the POKE scope of CharacterBlock.
+    Kept so the old PokeBlock queries and creates keep working.
+    """
+    objects = PokeBlockManager()
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.scope = CharacterBlock.SCOPE_POKE
+        super().save(*args, **kwargs)
@@ -0,0 +1,192 @@
+"""
+Substring search over Character.nickname backed by a trigram index.
+
+rank_nicknames() narrows a Character queryset to the nicknames containing a
+query, most similar first, as a queryset the caller can paginate; every
+match can be reached.
+
+PostgreSQL uses pg_trgm: a GIN index on UPPER(nickname) with gin_trgm_ops,
+which is the expression Django compiles nickname__icontains to, so the plain
+lookup becomes an index scan, ranked with similarity(). SQLite uses
+NicknameTrigram, a side table with the trigrams of every nickname kept in
+sync by a signal on Character: candidates are the characters whose postings
+hold every trigram of the query and whose lower-cased nickname, stored next
+to each posting, contains it (having every trigram of the query does not make
+a nickname contain it). Both are created by migration 0018_nickname_trigram.
+Other databases fall back to an unindexed icontains scan.
+
+Similarity is pg_trgm's: shared trigrams / all trigrams of both strings,
+lower-cased and padded. Unlike pg_trgm, the side table does not split
+nicknames into words, so any substring - spaces and punctuation included -
+can be found through its trigrams.
+
+Queries shorter than MIN_QUERY_LENGTH have no trigram and are scanned with
+icontains as well; scanned matches are ordered shortest nickname first
+(a nickname containing the query is the more similar the shorter it is).
+"""
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Count, FloatField, Func, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Length
+
+MIN_QUERY_LENGTH = 3
+INDEX_NAME = 'character_nickname_trgm'
+
+NicknameHit = namedtuple('NicknameHit', ['character_id', 'nickname', 'similarity'])
+
+
+class Similarity(Func):
+    """pg_trgm's similarity()"""
+    function = 'similarity'
+    output_field = FloatField()
+
+
+def nickname_trigrams(nickname):
+    """Distinct trigrams of a nickname, lower-cased and padded like pg_trgm (two spaces before, one after)"""
+    padded = f'  {nickname.lower()} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def query_trigrams(query):
+    """Trigrams every nickname containing query has; unpadded, as the query can be anywhere in it"""
+    query = query.lower()
+    return {query[index:index + 3] for index in range(len(query) - 2)}
+
+
+def _similarity(trigrams_a, trigrams_b):
+    return len(trigrams_a & trigrams_b) / len(trigrams_a | trigrams_b)
+
+
+def similarity(a, b):
+    """Trigram similarity of two strings, 0.0 to 1.0"""
+    return _similarity(nickname_trigrams(a), nickname_trigrams(b))
+
+
+def search_backend():
+    """'postgresql' (pg_trgm), 'trigram' (NicknameTrigram, SQLite) or 'scan' (unindexed icontains)"""
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        return 'trigram'
+    return 'scan'
+
+
+def install_nickname_index(db, character_table='app_character'):
+    """Create the pg_trgm index (idempotent); other databases are indexed through NicknameTrigram"""
+    if db.vendor != 'postgresql':
+        return
+    with db.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} "
+            f"ON {character_table} USING gin (UPPER(nickname::text) gin_trgm_ops)"
+        )
+
+
+def uninstall_nickname_index(db):
+    if db.vendor == 'postgresql':
+        with db.cursor() as cursor:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
+
+
+def trigram_rows(model, characters):
+    """Unsaved NicknameTrigram (model) rows for (character_id, nickname) pairs"""
+    for character_id, nickname in characters:
+        trigrams = nickname_trigrams(nickname)
+        for trigram in trigrams:
+            yield model(
+                character_id=character_id, trigram=trigram, trigram_count=len(trigrams), nickname=nickname.lower()
+            )
+
+
+def index_nicknames(characters, replace=True, batch_size=1000):
+    """
+    Write the NicknameTrigram rows of characters, replacing their old ones
+    unless they are new. Returns the number of rows; a no-op unless the
+    trigram backend is used.
+    """
+    from .models import NicknameTrigram
+
+    if search_backend() != 'trigram':
+        return 0
+    characters = [(character.pk, character.nickname) for character in characters]
+    rows = list(trigram_rows(NicknameTrigram, characters))
+    with transaction.atomic():
+        if replace:
+            NicknameTrigram.objects.filter(character__in=[pk for pk, nickname in characters]).delete()
+        NicknameTrigram.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild_nickname_index(batch_size=1000):
+    """Recreate every NicknameTrigram row from Character; returns the number of rows"""
+    from .models import Character, NicknameTrigram
+
+    if search_backend() != 'trigram':
+        return 0
+    total = 0
+    with transaction.atomic():
+        NicknameTrigram.objects.all().delete()
+        batch = []
+        for character in Character.objects.values_list('pk', 'nickname').order_by().iterator(chunk_size=batch_size):
+            batch.append(character)
+            if len(batch) >= batch_size:
+                total += len(NicknameTrigram.objects.bulk_create(trigram_rows(NicknameTrigram, batch)))
+                batch = []
+        total += len(NicknameTrigram.objects.bulk_create(trigram_rows(NicknameTrigram, batch)))
+    return total
+
+
+def rank_nicknames(query, queryset=None):
+    """
+    Characters of queryset (default: all characters) whose nickname
+    contains query, most similar first (ties: shorter first), as a
+    queryset. With the pg_trgm and trigram backends each row carries its
+    similarity annotation.
+    """
+    from .models import Character, NicknameTrigram
+
+    if queryset is None:
+        queryset = Character.objects.all()
+    backend = search_backend()
+    if len(query) < MIN_QUERY_LENGTH or backend == 'scan':
+        return queryset.filter(nickname__icontains=query).order_by(Length('nickname'), 'pk')
+    if backend == 'postgresql':
+        return queryset.filter(nickname__icontains=query).annotate(
+            similarity=Similarity('nickname', Value(query))
+        ).order_by('-similarity', 'pk')
+
+    trigrams = query_trigrams(query)
+    padded = nickname_trigrams(query)
+    postings = NicknameTrigram.objects.filter(character=OuterRef('pk')).order_by()
+    # Every trigram of the query, and the query itself, in the lower-cased nickname of the postings
+    candidates = NicknameTrigram.objects.filter(
+        trigram__in=trigrams, nickname__contains=query.lower()
+    ).order_by().values('character_id').annotate(found=Count('pk')).filter(found=len(trigrams))
+    shared = Subquery(
+        postings.filter(trigram__in=padded).values('character_id').annotate(shared=Count('pk')).values('shared'),
+        output_field=IntegerField()
+    )
+    size = Subquery(postings.values('trigram_count')[:1], output_field=IntegerField())
+    return queryset.filter(pk__in=candidates.values('character_id')).annotate(
+        shared_trigrams=shared, trigram_count=size
+    ).annotate(
+        similarity=Cast('shared_trigrams', FloatField()) / (
+            Value(len(padded)) + Cast('trigram_count', FloatField()) - Cast('shared_trigrams', FloatField())
+        )
+    ).order_by('-similarity', 'trigram_count', 'pk')
+
+
+def search_nicknames(query, limit=20, queryset=None):
+    """The first limit NicknameHits of rank_nicknames(query, queryset)"""
+    if limit < 1:
+        return []
+    ranked = rank_nicknames(query, queryset)
+    if 'similarity' in ranked.query.annotations:
+        rows = ranked.values_list('pk', 'nickname', 'similarity')[:limit]
+        return [NicknameHit(*row) for row in rows]
+    return [
+        NicknameHit(character_id, nickname, similarity(nickname, query))
+        for character_id, nickname in ranked.values_list('pk', 'nickname')[:limit]
+    ]
@@ -0,0 +1,143 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+def encode_cursor(timestamp, pk):
+    """Encode a (timestamp, pk) position as an opaque URL-safe cursor"""
+    raw = f"{timestamp.isoformat()}|{pk}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by encode_cursor().
+    Raises ValueError for malformed cursors.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), pk
+    except (TypeError, UnicodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+class KeysetPage:
+    """One slice of a keyset-paginated queryset"""
+
+    def __init__(self, object_list, has_older, has_newer, date_field, newest_first=False):
+        self.object_list = object_list
+        self.has_older = has_older
+        self.has_newer = has_newer
+        self.date_field = date_field
+        self.newest_first = newest_first
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, self.date_field), obj.pk)
+
+    @property
+    def older_cursor(self):
+        if not self.has_older or not self.object_list:
+            return None
+        oldest = self.object_list[-1] if self.newest_first else self.object_list[0]
+        return self._cursor(oldest)
+
+    @property
+    def newer_cursor(self):
+        if not self.has_newer or not self.object_list:
+            return None
+        newest = self.object_list[0] if self.newest_first else self.object_list[-1]
+        return self._cursor(newest)
+
+    @property
+    def end_cursor(self):
+        """Cursor of the newest object on the page, for fetching whatever arrives after it"""
+        if not self.object_list:
+            return None
+        newest = self.object_list[0] if self.newest_first else self.object_list[-1]
+        return self._cursor(newest)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination anchored on (date_field, pk).
+
+    Unlike django.core.paginator.Paginator it never runs COUNT(*) or OFFSET,
+    so every page costs one index range scan regardless of its position.
+    Without a cursor the newest page is returned.
+    """
+
+    def __init__(self, queryset, per_page, date_field='sent_date', newest_first=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.date_field = date_field
+        self.newest_first = newest_first
+
+    def page(self, before=None, after=None):
+        """
+        Return the page right before (older than) or right after (newer than)
+        the given cursor, or the newest page when no cursor is given.
+        """
+        date_field = self.date_field
+        if after:
+            timestamp, pk = decode_cursor(after)
+            queryset = self.queryset.filter(
+                Q(**{f'{date_field}__gt': timestamp}) |
+                Q(**{date_field: timestamp, 'pk__gt': pk})
+            ).order_by(date_field, 'pk')
+        else:
+            queryset = self.queryset
+            if before:
+                timestamp, pk = decode_cursor(before)
+                queryset = queryset.filter(
+                    Q(**{f'{date_field}__lt': timestamp}) |
+                    Q(**{date_field: timestamp, 'pk__lt': pk})
+                )
+            queryset = queryset.order_by(f'-{date_field}', '-pk')
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if after:
+            has_older, has_newer = True, has_more
+        else:
+            has_older, has_newer = has_more, bool(before)
+            rows.reverse()
+
+        # rows are chronological at this point
+        if self.newest_first:
+            rows.reverse()
+        return KeysetPage(rows, has_older, has_newer, date_field, self.newest_first)
+
+
+class MessageCursorPagination(CursorPagination):
+    """REST pagination of a thread, newest messages first"""
+    ordering = ('-sent_date', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, 'MESSAGE_THREAD_PAGE_SIZE', 50)
+        return super().get_page_size(request)
+
+
+class ConversationCursorPagination(CursorPagination):
+    """REST pagination of the thread list, most recently active first"""
+    ordering = ('-last_sent_date', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, 'MESSAGE_SIDEBAR_PAGE_SIZE', 30)
+        return super().get_page_size(request)
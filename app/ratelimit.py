@@ -0,0 +1,195 @@
+"""
+Per-user rate limits of write actions (POKEs, friend requests, messages).
+
+Two algorithms are available:
+
+- SlidingWindowLimiter - at most `limit` actions per `window` seconds.
+  With `exact` (the default for the daily POKE and friend request limits)
+  the actions are counted in the database on every check, so the limit
+  holds across all worker processes whatever the cache backend is.
+  Otherwise usage is approximated in the cache from the counts of the
+  current and previous fixed windows, seeded from the database when a key
+  is first seen (or after the cache was flushed); with a per-process cache
+  such a limit is enforced per worker.
+- TokenBucketLimiter - bursts of up to `capacity` actions, refilled at
+  `rate` tokens per second. State is not seeded; an empty cache means a
+  full bucket.
+
+Limits are configured per action in the RATE_LIMITS setting. Views call
+get_rate_limiter(name).check(user.id) before acting; actions are recorded
+with hit() by the post_save receivers in app.signals, so every code path
+that creates a row counts against the limit.
+"""
+import math
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+RateLimitStatus = namedtuple('RateLimitStatus', ['allowed', 'limit', 'remaining', 'retry_after'])
+
+
+class SlidingWindowLimiter:
+    def __init__(self, name, limit, window, seed=None, exact=False):
+        if exact and seed is None:
+            raise ValueError(f"Exact rate limit {name!r} needs a database seed")
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.seed = seed
+        self.exact = exact
+
+    def _key(self, key, suffix):
+        return f'ratelimit:{self.name}:{key}:{suffix}'
+
+    def _warm(self, key, now):
+        """Seed the current window from the database if the cache knows nothing about key"""
+        if self.seed is None or cache.get(self._key(key, 'seeded')):
+            return False
+        index = int(now // self.window)
+        # The seed covers the whole last window: a leftover previous-window
+        # count would be added on top of it by usage()
+        cache.delete(self._key(key, index - 1))
+        cache.set(self._key(key, index), self.seed(key, self.window), self.window * 2)
+        cache.set(self._key(key, 'seeded'), True, self.window)
+        return True
+
+    def usage(self, key, now=None):
+        """Number of actions in the last `window` seconds (estimated unless exact)"""
+        if self.exact:
+            return self.seed(key, self.window)
+        now = time.time() if now is None else now
+        self._warm(key, now)
+        index = int(now // self.window)
+        counts = cache.get_many([self._key(key, index), self._key(key, index - 1)])
+        current = counts.get(self._key(key, index), 0)
+        previous = counts.get(self._key(key, index - 1), 0)
+        # The previous window counts in proportion to how much of it still overlaps
+        overlap = 1 - (now % self.window) / self.window
+        return previous * overlap + current
+
+    def check(self, key, now=None):
+        now = time.time() if now is None else now
+        used = self.usage(key, now)
+        remaining = max(0, math.floor(self.limit - used))
+        retry_after = 0 if remaining else math.ceil(self.window - now % self.window)
+        return RateLimitStatus(remaining > 0, self.limit, remaining, retry_after)
+
+    def hit(self, key, now=None):
+        """Record an action that has already been stored"""
+        if self.exact:
+            # Counted in the database already
+            return
+        now = time.time() if now is None else now
+        if self._warm(key, now):
+            # The seed counted the stored action already
+            return
+        current = self._key(key, int(now // self.window))
+        cache.add(current, 0, self.window * 2)
+        try:
+            cache.incr(current)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(current, 1, self.window * 2)
+
+    def reset(self, key):
+        index = int(time.time() // self.window)
+        cache.delete_many([self._key(key, index), self._key(key, index - 1), self._key(key, 'seeded')])
+
+
+class TokenBucketLimiter:
+    """
+    Read-modify-write of the bucket is not atomic, so concurrent requests of
+    the same user may occasionally both take the last token.
+    """
+
+    def __init__(self, name, capacity, rate):
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+
+    def _key(self, key):
+        return f'ratelimit:{self.name}:{key}:bucket'
+
+    def _timeout(self):
+        # Once refilled completely the bucket is equivalent to a missing key
+        return math.ceil(self.capacity / self.rate)
+
+    def tokens(self, key, now=None):
+        now = time.time() if now is None else now
+        tokens, updated = cache.get(self._key(key), (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def check(self, key, now=None):
+        tokens = self.tokens(key, now)
+        retry_after = 0 if tokens >= 1 else math.ceil((1 - tokens) / self.rate)
+        return RateLimitStatus(tokens >= 1, self.capacity, math.floor(tokens), retry_after)
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        tokens = max(0, self.tokens(key, now) - 1)
+        cache.set(self._key(key), (tokens, now), self._timeout())
+
+    def reset(self, key):
+        cache.delete(self._key(key))
+
+
+def _count_pokes(user_id, window):
+    from app.models import Poke
+    return Poke.objects.filter(
+        sender_character__user_id=user_id,
+        sent_date__gte=timezone.now() - timedelta(seconds=window)
+    ).count()
+
+
+def _count_friend_requests(user_id, window):
+    from app.models import CharacterFriendRequest
+    return CharacterFriendRequest.objects.filter(
+        sender_character__user_id=user_id,
+        sent_date__gte=timezone.now() - timedelta(seconds=window)
+    ).count()
+
+
+SEEDS = {
+    'poke': _count_pokes,
+    'friend_request': _count_friend_requests,
+}
+
+
+def rate_limits():
+    """Configuration of all limits: RATE_LIMITS on top of the defaults"""
+    return {
+        'poke': {
+            'algorithm': 'sliding_window',
+            'limit': getattr(settings, 'POKE_MAX_PER_USER_PER_DAY', 5),
+            'window': 24 * 60 * 60,
+            'exact': True,
+        },
+        'friend_request': {'algorithm': 'sliding_window', 'limit': 20, 'window': 24 * 60 * 60, 'exact': True},
+        'message': {'algorithm': 'token_bucket', 'capacity': 20, 'rate': 1 / 3},
+        **getattr(settings, 'RATE_LIMITS', {}),
+    }
+
+
+def get_rate_limiter(name):
+    config = dict(rate_limits()[name])
+    algorithm = config.pop('algorithm')
+    if algorithm == 'sliding_window':
+        return SlidingWindowLimiter(name, seed=SEEDS.get(name), **config)
+    if algorithm == 'token_bucket':
+        return TokenBucketLimiter(name, **config)
+    raise ValueError(f"Unknown rate limit algorithm {algorithm!r} for {name!r}")
+
+
+def rate_limit_message(status):
+    """User-facing explanation of a denied RateLimitStatus"""
+    if status.retry_after >= 3600:
+        wait = f"{math.ceil(status.retry_after / 3600)} hours"
+    elif status.retry_after >= 60:
+        wait = f"{math.ceil(status.retry_after / 60)} minutes"
+    else:
+        wait = f"{max(status.retry_after, 1)} seconds"
+    return f"You are doing this too often. Try again in {wait}."
@@ -0,0 +1,97 @@
+"""
+Viewer-specific relationship state (friend, POKEs, blocks, can message)
+between the characters of the logged-in user and a page of other
+characters, resolved in a fixed number of queries regardless of page size.
+
+The rules are the same as app.utils.can_send_message and is_blocked, applied
+to every (viewer character, result character) pair at once.
+"""
+from django.db.models import Q
+
+from .blocks import get_block_sets
+from .friends import get_friend_sets
+
+
+class Relationship:
+    """How the viewer relates to one character, across all of the viewer's characters"""
+
+    def __init__(self, own=False):
+        self.own = own
+        self.is_friend = False
+        self.poke_sent = None       # status of a POKE from the viewer, if any
+        self.poke_received = None   # status of a POKE to the viewer, if any
+        self.blocked_by_them = False
+        self.blocked_by_me = False
+        self.can_message = False
+
+    def as_dict(self):
+        return {
+            'own': self.own,
+            'is_friend': self.is_friend,
+            'poke_sent': self.poke_sent,
+            'poke_received': self.poke_received,
+            'blocked_by_them': self.blocked_by_them,
+            'blocked_by_me': self.blocked_by_me,
+            'can_message': self.can_message,
+        }
+
+
+def resolve_relationships(user, characters, viewer_character_ids=None):
+    """
+    {character_id: Relationship} for the given characters (instances or
+    ids) as seen by user. Four queries at most (two once the viewer's block
+    and friend sets are cached), none for anonymous users.
+    """
+    from app.models import Character, Poke
+
+    character_ids = {getattr(character, 'pk', character) for character in characters}
+    if not user.is_authenticated or not character_ids:
+        return {}
+    if viewer_character_ids is None:
+        viewer_character_ids = set(Character.objects.filter(user=user).values_list('id', flat=True))
+    mine = set(viewer_character_ids)
+    relationships = {character_id: Relationship(own=character_id in mine) for character_id in character_ids}
+    if not mine:
+        return relationships
+    others = character_ids - mine
+
+    for friends in get_friend_sets(mine).values():
+        for other_id in friends & others:
+            relationships[other_id].is_friend = True
+
+    # (viewer character, other character) pairs that unlock messaging, see can_send_message
+    unlocked = set()
+    for sender_id, receiver_id, status in Poke.objects.filter(
+        Q(sender_character__in=mine, receiver_character__in=others) |
+        Q(sender_character__in=others, receiver_character__in=mine)
+    ).values_list('sender_character_id', 'receiver_character_id', 'status'):
+        if sender_id in mine:
+            relationships[receiver_id].poke_sent = status
+            if status == 'RESPONDED':
+                unlocked.add((sender_id, receiver_id))
+        else:
+            relationships[sender_id].poke_received = status
+            if status in ('PENDING', 'RESPONDED'):
+                unlocked.add((receiver_id, sender_id))
+
+    # Blocks in both directions come from the viewer's cached block sets (app.blocks)
+    blocked_pairs = set()
+    for viewer_id, block_set in get_block_sets(mine).items():
+        for other_id in block_set.blocking & others:
+            relationships[other_id].blocked_by_me = True
+        for other_id in (block_set.blocked_by | block_set.poke_blocked_by) & others:
+            relationships[other_id].blocked_by_them = True
+            blocked_pairs.add((viewer_id, other_id))
+
+    for pair in unlocked - blocked_pairs:
+        relationships[pair[1]].can_message = True
+    return relationships
+
+
+def annotate_relationships(user, characters):
+    """Set .relationship on each character (e.g. a page of a ListView) and return them"""
+    characters = list(characters)
+    relationships = resolve_relationships(user, characters)
+    for character in characters:
+        character.relationship = relationships.get(character.pk)
+    return characters
@@ -0,0 +1,271 @@
+"""
+Full-text search over Message.content, scoped to one user's characters.
+
+PostgreSQL matches against an expression GIN index on
+to_tsvector('simple', content); SQLite uses the contentless FTS5 table
+app_message_fts kept in sync by triggers. Both are created by migration
+0011_message_search. Other databases (or SQLite builds without FTS5) fall
+back to an unindexed icontains scan.
+"""
+import re
+from functools import lru_cache
+
+from django.db import OperationalError, connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .pagination import encode_cursor
+
+SEARCH_CONFIG = 'simple'  # must match the expression of the GIN index
+FTS_TABLE = 'app_message_fts'
+MAX_TERMS = 16
+
+
+# The FTS5 table is contentless: it stores only the index of message content
+# plus an "owners" column holding one token per participating user
+# (u<user id>), so the caller scope is a posting-list intersection inside
+# FTS5 instead of a join over every match.
+SQLITE_OWNERS = (
+    "'u' || (SELECT user_id FROM {character_table} WHERE id = {row}.sender_character_id) || ' u' || "
+    "(SELECT user_id FROM {character_table} WHERE id = {row}.receiver_character_id)"
+)
+SQLITE_TRIGGERS = {
+    'app_message_fts_ai': (
+        "AFTER INSERT ON {message_table} BEGIN "
+        "INSERT INTO {fts_table}(rowid, content, owners) VALUES (new.id, new.content, {new_owners}); END"
+    ),
+    'app_message_fts_ad': (
+        "AFTER DELETE ON {message_table} BEGIN "
+        "INSERT INTO {fts_table}({fts_table}, rowid, content, owners) "
+        "VALUES ('delete', old.id, old.content, {old_owners}); END"
+    ),
+    'app_message_fts_au': (
+        "AFTER UPDATE OF content ON {message_table} BEGIN "
+        "INSERT INTO {fts_table}({fts_table}, rowid, content, owners) "
+        "VALUES ('delete', old.id, old.content, {old_owners}); "
+        "INSERT INTO {fts_table}(rowid, content, owners) VALUES (new.id, new.content, {new_owners}); END"
+    ),
+}
+
+
+def install_search_index(db, message_table='app_message', character_table='app_character'):
+    """
+    Create the full-text index on the given connection (idempotent). On
+    SQLite the sync triggers are dropped whenever a migration rebuilds the
+    message table, so this also runs after every migrate (see app.signals)
+    and re-indexes when triggers had to be recreated.
+    """
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS message_content_search "
+                f"ON {message_table} USING gin (to_tsvector('{SEARCH_CONFIG}', content))"
+            )
+        elif db.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    f"content, owners, content='', tokenize='unicode61 remove_diacritics 2')"
+                )
+            except OperationalError:
+                # SQLite built without FTS5 - search falls back to a scan
+                return
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                list(SQLITE_TRIGGERS)
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if len(existing) == len(SQLITE_TRIGGERS):
+                return
+            names = {
+                'message_table': message_table,
+                'fts_table': FTS_TABLE,
+                'new_owners': SQLITE_OWNERS.format(character_table=character_table, row='new'),
+                'old_owners': SQLITE_OWNERS.format(character_table=character_table, row='old'),
+            }
+            for name, body in SQLITE_TRIGGERS.items():
+                if name not in existing:
+                    cursor.execute(f"CREATE TRIGGER {name} " + body.format(**names))
+            # Contentless tables cannot 'rebuild' - re-index from scratch
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, content, owners) "
+                f"SELECT m.id, m.content, {SQLITE_OWNERS.format(character_table=character_table, row='m')} "
+                f"FROM {message_table} m"
+            )
+    _fts_table_exists.cache_clear()
+
+
+def uninstall_search_index(db):
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute("DROP INDEX CONCURRENTLY IF EXISTS message_content_search")
+        elif db.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts_table_exists.cache_clear()
+
+
+def search_terms(query):
+    """Lower-cased word tokens of a query; punctuation and operators are dropped"""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+@lru_cache(maxsize=None)
+def _fts_table_exists(alias):
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def search_backend():
+    """'postgresql', 'fts5' or 'scan'"""
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite' and _fts_table_exists(connection.alias):
+        return 'fts5'
+    return 'scan'
+
+
+class SearchHit:
+    """A matching message with its rank and the thread it belongs to"""
+
+    def __init__(self, message, rank, terms, user_character_ids):
+        self.message = message
+        self.rank = rank
+        self.terms = terms
+        self.own_character = (
+            message.sender_character
+            if message.sender_character_id in user_character_ids
+            else message.receiver_character
+        )
+        self.other_character = (
+            message.receiver_character
+            if self.own_character == message.sender_character
+            else message.sender_character
+        )
+
+    @property
+    def snippet(self):
+        return make_snippet(self.message.content, self.terms)
+
+    @property
+    def thread_url(self):
+        """Open the thread on the page that starts with this message"""
+        # ?after= is exclusive, so point it right before the message
+        cursor = encode_cursor(self.message.sent_date, self.message.pk - 1)
+        return f"{reverse('message_list')}?thread_id={self.message.thread_id}&after={cursor}"
+
+
+class SearchResultsPage:
+    """One page of ranked hits. There is no COUNT(*) - only whether a next page exists"""
+
+    def __init__(self, hits, number, has_next):
+        self.object_list = hits
+        self.number = number
+        self.has_next = has_next
+        self.has_previous = number > 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def make_snippet(content, terms, width=80):
+    """HTML-escaped excerpt around the first matching term, with matches in <mark>"""
+    pattern = None
+    if terms:
+        pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE)
+    match = pattern.search(content) if pattern else None
+    start = max(match.start() - width // 2, 0) if match else 0
+    excerpt = content[start:start + width * 2]
+    html = escape(excerpt)
+    if pattern:
+        html = pattern.sub(lambda m: f'<mark>{m.group(0)}</mark>', html)
+    if start > 0:
+        html = '…' + html
+    if start + width * 2 < len(content):
+        html += '…'
+    return mark_safe(html)
+
+
+def _ranked_ids(user_id, terms, limit, offset, backend=None):
+    """[(message_id, rank)] of matching messages, best first"""
+    from .models import Character, Message
+
+    message_table = connection.ops.quote_name(Message._meta.db_table)
+    character_table = connection.ops.quote_name(Character._meta.db_table)
+    scope = (
+        f"(m.sender_character_id IN (SELECT id FROM {character_table} WHERE user_id = %s) "
+        f"OR m.receiver_character_id IN (SELECT id FROM {character_table} WHERE user_id = %s))"
+    )
+    backend = backend or search_backend()
+    # Raw SQL params bypass field conversion (UUIDs are stored as hex on SQLite)
+    db_user_id = Character._meta.get_field('user').get_db_prep_value(user_id, connection)
+
+    if backend == 'postgresql':
+        # Terms are \w+ only, so they are safe tsquery lexemes; the last one matches as a prefix
+        tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        sql = (
+            f"SELECT m.id, ts_rank(to_tsvector('{SEARCH_CONFIG}', m.content), q.query) AS rank "
+            f"FROM {message_table} m, to_tsquery('{SEARCH_CONFIG}', %s) AS q(query) "
+            f"WHERE to_tsvector('{SEARCH_CONFIG}', m.content) @@ q.query AND {scope} "
+            f"ORDER BY rank DESC, m.sent_date DESC, m.id DESC LIMIT %s OFFSET %s"
+        )
+        params = [tsquery, db_user_id, db_user_id, limit, offset]
+    elif backend == 'fts5':
+        phrases = ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+        match = f'owners : "u{db_user_id}" AND content : ({phrases})'
+        # bm25() is lower-is-better; negate it so rank is comparable with ts_rank.
+        # The owners column gets weight 0 so it does not affect ranking.
+        sql = (
+            f"SELECT rowid, -bm25({FTS_TABLE}, 1.0, 0.0) AS rank FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s ORDER BY rank DESC, rowid DESC LIMIT %s OFFSET %s"
+        )
+        params = [match, limit, offset]
+    else:
+        queryset = Message.objects.filter(
+            Q(sender_character__user_id=user_id) | Q(receiver_character__user_id=user_id)
+        )
+        for term in terms:
+            queryset = queryset.filter(content__icontains=term)
+        ids = queryset.order_by('-sent_date', '-id').values_list('id', flat=True)[offset:offset + limit]
+        return [(message_id, None) for message_id in ids]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search_messages(user, query, page=1, per_page=20):
+    """Ranked page of the user's messages matching query"""
+    from .models import Character, Message
+
+    terms = search_terms(query)
+    if not terms:
+        return SearchResultsPage([], 1, False)
+
+    page = max(int(page), 1)
+    rows = _ranked_ids(user.id, terms, per_page + 1, (page - 1) * per_page)
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    messages = Message.objects.select_related(
+        'sender_character', 'receiver_character', 'sender_character__game'
+    ).in_bulk([message_id for message_id, rank in rows])
+    user_character_ids = set(Character.objects.filter(user=user).values_list('id', flat=True))
+    hits = [
+        SearchHit(messages[message_id], rank, terms, user_character_ids)
+        for message_id, rank in rows
+        if message_id in messages
+    ]
+    return SearchResultsPage(hits, page, has_next)
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import (
     Game, Character, Message, CustomUser, CharacterFriend, 
-    CharacterFriendRequest, CharacterProfile
+    CharacterFriendRequest, CharacterProfile, Conversation
 )
 
 class GameSerializer(serializers.ModelSerializer):
@@ -10,10 +10,17 @@ class GameSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class CharacterSerializer(serializers.ModelSerializer):
+    relationship = serializers.SerializerMethodField()
+
     class Meta:
         model = Character
         fields = '__all__'
 
+    def get_relationship(self, obj):
+        """The viewer's relationship, when resolved by the view (context['relationships'])"""
+        relationship = self.context.get('relationships', {}).get(obj.pk)
+        return relationship.as_dict() if relationship else None
+
 
 class MessageSerializer(serializers.ModelSerializer):
     privacy_mode = serializers.CharField(required=False)
@@ -24,10 +31,43 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'sender_character', 'receiver_character', 
             'content', 'sent_date', 'thread_id', 'privacy_mode',
-            'identity_revealed', 'is_read', 'read_at'
+            'identity_revealed'
         ]
 
 
+class ConversationSerializer(serializers.ModelSerializer):
+    """A thread as seen by the requesting user (context['user_character_ids'])"""
+    own_character = serializers.SerializerMethodField()
+    other_character = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
+    last_message = MessageSerializer(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = [
+            'thread_id', 'own_character', 'other_character',
+            'last_message', 'last_sent_date', 'unread_count'
+        ]
+
+    def _own_character_id(self, obj):
+        if obj.character_a_id in self.context['user_character_ids']:
+            return obj.character_a_id
+        return obj.character_b_id
+
+    def _character(self, character):
+        return {'id': character.id, 'nickname': character.nickname, 'game': character.game_id}
+
+    def get_own_character(self, obj):
+        own_id = self._own_character_id(obj)
+        return self._character(obj.character_a if obj.character_a_id == own_id else obj.character_b)
+
+    def get_other_character(self, obj):
+        return self._character(obj.other_character(self._own_character_id(obj)))
+
+    def get_unread_count(self, obj):
+        return obj.unread_count_for(self._own_character_id(obj))
+
+
 class CharacterFriendSerializer(serializers.ModelSerializer):
     class Meta:
         model = CharacterFriend
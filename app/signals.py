@@ -10,3 +10,200 @@
 # def create_account_for_user(sender, instance, created, **kwargs):
 #     if created:
 #         Account.objects.create(user=instance)
+
+from django.db import connections, transaction
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .blocks import invalidate_block_sets
+from .counters import adjust_counters, recount_counters
+from .friends import invalidate_friends
+from .events import publish_event
+from .nickname_search import index_nicknames
+from .ratelimit import get_rate_limiter
+from .search import FTS_TABLE, install_search_index
+from .suggestions import invalidate_suggestions_for_friendship
+from .models import (
+    Character, Message, Conversation, Poke, PokeInboxEntry, CharacterFriend, CharacterFriendRequest, CharacterBlock,
+    PokeBlock, UserFriendship
+)
+
+
+# Conversation index -------------------------------------
+
+@receiver(post_save, sender=Message)
+def update_conversation_on_message(sender, instance, created, **kwargs):
+    """Keep the conversation row and counters in sync with new messages and push them live"""
+    if created:
+        Conversation.record_message(instance)
+        if instance.receiver_character_id:
+            adjust_counters(instance.receiver_character.user_id, unread_messages=1)
+        if instance.sender_character_id and instance.receiver_character_id:
+            event = {
+                'message_id': instance.pk,
+                'thread_id': str(instance.thread_id),
+                'sender_character': str(instance.sender_character_id),
+                'receiver_character': str(instance.receiver_character_id),
+            }
+            publish_event([instance.receiver_character.user_id], 'message', incoming=True, **event)
+            publish_event([instance.sender_character.user_id], 'message', incoming=False, **event)
+            get_rate_limiter('message').hit(instance.sender_character.user_id)
+
+
+@receiver(post_delete, sender=Message)
+def rebuild_conversation_on_message_delete(sender, instance, **kwargs):
+    Conversation.rebuild(instance.thread_id)
+    _recount_participants_on_commit(instance.sender_character_id, instance.receiver_character_id)
+
+
+@receiver(post_delete, sender=Conversation)
+def recount_on_conversation_delete(sender, instance, **kwargs):
+    _recount_participants_on_commit(instance.character_a_id, instance.character_b_id)
+
+
+def _recount_participants_on_commit(*character_ids):
+    def recount():
+        user_ids = Character.objects.filter(pk__in=character_ids).values_list('user_id', flat=True)
+        for user_id in set(user_ids):
+            recount_counters(user_id)
+    transaction.on_commit(recount)
+
+
+# POKE inbox ---------------------------------------------
+
+@receiver(post_save, sender=Poke)
+def update_poke_inbox(sender, instance, created, **kwargs):
+    """Project new POKEs into both inboxes and keep their status in sync"""
+    # Runs before update_counters_on_poke_save, which replaces _loaded_state
+    if created:
+        PokeInboxEntry.record(instance)
+    elif getattr(instance, '_loaded_state', {}).get('status') != instance.status:
+        PokeInboxEntry.sync_status(instance)
+
+
+# Notification counters ----------------------------------
+
+def _is_unread_pending_poke(status, is_read):
+    return status == 'PENDING' and not is_read
+
+
+@receiver(post_save, sender=Poke)
+def update_counters_on_poke_save(sender, instance, created, **kwargs):
+    counted = _is_unread_pending_poke(instance.status, instance.is_read)
+    if created:
+        was_counted = False
+    elif hasattr(instance, '_loaded_state'):
+        was_counted = _is_unread_pending_poke(**instance._loaded_state)
+    else:
+        was_counted = counted
+    instance._loaded_state = {'status': instance.status, 'is_read': instance.is_read}
+
+    if counted != was_counted:
+        adjust_counters(instance.receiver_character.user_id, unread_pokes=1 if counted else -1)
+    if created:
+        get_rate_limiter('poke').hit(instance.sender_character.user_id)
+        publish_event(
+            [instance.receiver_character.user_id],
+            'poke',
+            poke_id=str(instance.pk),
+            sender_character=str(instance.sender_character_id),
+            receiver_character=str(instance.receiver_character_id),
+        )
+
+
+@receiver(post_delete, sender=Poke)
+def update_counters_on_poke_delete(sender, instance, **kwargs):
+    if _is_unread_pending_poke(instance.status, instance.is_read):
+        adjust_counters(instance.receiver_character.user_id, unread_pokes=-1)
+
+
+@receiver(post_save, sender=CharacterFriendRequest)
+def update_counters_on_friend_request_save(sender, instance, created, **kwargs):
+    pending = instance.status == 'PENDING'
+    if created:
+        was_pending = False
+    elif hasattr(instance, '_loaded_state'):
+        was_pending = instance._loaded_state['status'] == 'PENDING'
+    else:
+        was_pending = pending
+    instance._loaded_state = {'status': instance.status}
+
+    if pending != was_pending:
+        adjust_counters(instance.receiver_character.user_id, pending_friend_requests=1 if pending else -1)
+    if created:
+        get_rate_limiter('friend_request').hit(instance.sender_character.user_id)
+        publish_event(
+            [instance.receiver_character.user_id],
+            'friend_request',
+            friend_request_id=instance.pk,
+            sender_character=str(instance.sender_character_id),
+            receiver_character=str(instance.receiver_character_id),
+        )
+
+
+@receiver(post_delete, sender=CharacterFriendRequest)
+def update_counters_on_friend_request_delete(sender, instance, **kwargs):
+    if instance.status == 'PENDING':
+        adjust_counters(instance.receiver_character.user_id, pending_friend_requests=-1)
+
+
+# Block sets ---------------------------------------------
+
+@receiver(post_save, sender=CharacterBlock)
+@receiver(post_delete, sender=CharacterBlock)
+@receiver(post_save, sender=PokeBlock)
+@receiver(post_delete, sender=PokeBlock)
+def invalidate_block_sets_on_change(sender, instance, **kwargs):
+    """Both sides of a block see it (blocking / blocked_by), so both sets go stale"""
+    invalidate_block_sets(instance.blocker_character_id, instance.blocked_character_id)
+
+
+# Friend adjacency and user friendships -----------------
+
+def _friendship_users(instance):
+    users = dict(Character.objects.filter(
+        pk__in=(instance.character1_id, instance.character2_id)
+    ).values_list('id', 'user_id'))
+    return users.get(instance.character1_id), users.get(instance.character2_id)
+
+
+def _invalidate_friendship(instance):
+    character_ids = (instance.character1_id, instance.character2_id)
+    invalidate_friends(*character_ids)
+    invalidate_suggestions_for_friendship(*character_ids)
+
+
+@receiver(post_save, sender=CharacterFriend)
+def update_friends_on_save(sender, instance, created, **kwargs):
+    if created:
+        user_ids = _friendship_users(instance)
+        UserFriendship.add_character_pair(*user_ids)
+        _invalidate_friendship(instance)
+
+
+@receiver(post_delete, sender=CharacterFriend)
+def update_friends_on_delete(sender, instance, **kwargs):
+    user_ids = _friendship_users(instance)
+    if None not in user_ids:
+        UserFriendship.remove_character_pair(*user_ids)
+    _invalidate_friendship(instance)
+
+
+# Message search -----------------------------------------
+
+@receiver(post_migrate)
+def repair_message_search_index(sender, using, **kwargs):
+    """SQLite drops the FTS sync triggers when a migration rebuilds app_message"""
+    if sender.name != 'app':
+        return
+    db = connections[using]
+    if db.vendor == 'sqlite' and FTS_TABLE in db.introspection.table_names():
+        install_search_index(db)
+
+
+# Nickname search ----------------------------------------
+
+@receiver(post_save, sender=Character)
+def index_nickname(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or 'nickname' in update_fields:
+        index_nicknames([instance], replace=not created)
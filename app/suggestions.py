@@ -0,0 +1,122 @@
+"""
+"Players you might know": characters two hops away in the CharacterFriend
+graph, scored by mutual friends and by games both players play.
+
+The traversal is bounded: at most SUGGESTIONS_MAX_FRONTIER friends are
+expanded, and each hop is one batched lookup of cached friend sets
+(app.friends), so a cold computation costs two friend-set queries plus one
+query for the candidates' games. The top SUGGESTIONS_TOP_K results are
+cached per character. A friendship change only invalidates the characters
+whose two-hop neighbourhood it touches (both sides and their friends), and
+blocks are applied when reading, so blocking never needs a recompute.
+"""
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .blocks import exclude_blocked
+from .cache_versions import bump_versions, get_versions
+from .friends import get_friend_sets
+
+SUGGESTIONS_TIMEOUT = 24 * 60 * 60
+
+Suggestion = namedtuple('Suggestion', ['character_id', 'mutual_friends', 'shared_games', 'score'])
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def compute_suggestions(character):
+    """Ranked top-K Suggestions for character, ignoring blocks"""
+    from app.models import Character
+
+    max_frontier = _setting('SUGGESTIONS_MAX_FRONTIER', 500)
+    friends = get_friend_sets([character.pk])[character.pk]
+    # Bounded, deterministic first hop
+    frontier = sorted(friends, key=str)[:max_frontier]
+
+    mutual = Counter()
+    for friends_of_friend in get_friend_sets(frontier).values():
+        mutual.update(friends_of_friend)
+    for character_id in friends | {character.pk}:
+        mutual.pop(character_id, None)
+    if not mutual:
+        return []
+
+    # Games of the candidates' owners and of the character's owner, in one query
+    candidate_users = {}
+    games = {}
+    for character_id, user_id, game_id in Character.objects.filter(
+        user__in=Character.objects.filter(pk__in=list(mutual) + [character.pk]).values('user_id')
+    ).values_list('id', 'user_id', 'game_id'):
+        if character_id in mutual:
+            candidate_users[character_id] = user_id
+        games.setdefault(user_id, set()).add(game_id)
+    my_games = games.get(character.user_id, set())
+
+    mutual_weight = _setting('SUGGESTIONS_MUTUAL_FRIEND_WEIGHT', 3)
+    game_weight = _setting('SUGGESTIONS_SHARED_GAME_WEIGHT', 1)
+    suggestions = []
+    for character_id, user_id in candidate_users.items():
+        if user_id == character.user_id:
+            continue
+        shared_games = len(my_games & games[user_id])
+        score = mutual[character_id] * mutual_weight + shared_games * game_weight
+        suggestions.append(Suggestion(character_id, mutual[character_id], shared_games, score))
+    suggestions.sort(
+        key=lambda suggestion: (-suggestion.score, -suggestion.mutual_friends, str(suggestion.character_id))
+    )
+    return suggestions[:_setting('SUGGESTIONS_TOP_K', 20)]
+
+
+def _key(character_id, version):
+    return f'suggestions:{character_id}:{version}'
+
+
+def get_suggestions(character, limit=None):
+    """Cached suggestions for character, without characters blocked in either direction"""
+    version = get_versions('suggestions', [character.pk])[character.pk]
+    key = _key(character.pk, version)
+    suggestions = cache.get(key)
+    if suggestions is None:
+        suggestions = compute_suggestions(character)
+        cache.set(key, suggestions, _setting('SUGGESTIONS_CACHE_TIMEOUT', SUGGESTIONS_TIMEOUT))
+    blocked_free = set(exclude_blocked([character.pk], [suggestion.character_id for suggestion in suggestions]))
+    suggestions = [suggestion for suggestion in suggestions if suggestion.character_id in blocked_free]
+    return suggestions[:limit] if limit else suggestions
+
+
+def refresh_suggestions(characters):
+    """Recompute and cache suggestions for characters (e.g. a precompute batch)"""
+    characters = list(characters)
+    versions = get_versions('suggestions', [character.pk for character in characters])
+    timeout = _setting('SUGGESTIONS_CACHE_TIMEOUT', SUGGESTIONS_TIMEOUT)
+    cache.set_many(
+        {_key(character.pk, versions[character.pk]): compute_suggestions(character) for character in characters},
+        timeout
+    )
+
+
+def invalidate_suggestions_for_friendship(character1_id, character2_id):
+    invalidate_suggestions_for_friendships([(character1_id, character2_id)])
+
+
+def invalidate_suggestions_for_friendships(pairs):
+    """
+    A new or removed friendship between two characters changes the two-hop
+    neighbourhood of both of them and of their friends. Their friends are
+    looked up once the transaction commits, so saving a friendship does not
+    load (and cache) friend sets in the middle of the write.
+    """
+    characters = {character_id for pair in pairs for character_id in pair}
+
+    def bump():
+        affected = set(characters)
+        for friends in get_friend_sets(characters).values():
+            affected |= friends
+        bump_versions('suggestions', *affected)
+
+    transaction.on_commit(bump)
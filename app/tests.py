@@ -1,7 +1,39 @@
 # game_player_nick_finder/app/tests.py
-from django.test import TestCase
+import json
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+from io import StringIO
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.models import User
-from .models import ProposedGame
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, IntegrityError
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .models import (
+    ProposedGame, GameCategory, Game, Character, Message, Conversation,
+    Poke, CharacterFriendRequest, NotificationCounter, MessageArchive, CharacterBlock, PokeBlock, PokeInboxEntry,
+    CharacterFriend, CharacterProfile, UserFriendship, NicknameTrigram
+)
+from .blocks import exclude_blocked, get_block_set, get_block_sets
+from .content_filter import TermMatcher, get_profanity_matcher
+from .counters import get_counters
+from .events import BaseEventBackend, get_event_backend
+from .friends import get_friend_sets
+from .nickname_search import index_nicknames, nickname_trigrams, rank_nicknames, search_nicknames, similarity
+from .search import search_backend, search_messages
+from .suggestions import get_suggestions
+from . import transitions
+from .relationships import resolve_relationships
+from .ratelimit import SlidingWindowLimiter, TokenBucketLimiter, get_rate_limiter
+from .utils import can_send_message, can_send_poke, is_blocked, poke_eligibility, validate_poke_content
 
 class YourModelTestCase(TestCase):
     def setUp(self):
@@ -25,3 +57,1207 @@ class ProposedGameTestCase(TestCase):
         game = ProposedGame.objects.get(name='Test Game')
         self.assertEqual(game.description, 'Test Description')
         self.assertEqual(game.votes, 0)
+
+
+class MessagingTestMixin:
+    """Shared fixtures for messaging tests"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user1 = User.objects.create_user(username='alice', password='secret-pass-1')
+        self.user2 = User.objects.create_user(username='bob', password='secret-pass-2')
+        category = GameCategory.objects.create(title='MMORPG')
+        self.game = Game.objects.create(name='Tibia', category=category)
+        self.char1 = Character.objects.create(user=self.user1, game=self.game, nickname='Knight')
+        self.char2 = Character.objects.create(user=self.user2, game=self.game, nickname='Druid')
+
+    def send(self, sender, receiver, content='hi', **kwargs):
+        return Message.objects.create(
+            sender_character=sender,
+            receiver_character=receiver,
+            content=content,
+            **kwargs
+        )
+
+
+class ConversationIndexTestCase(MessagingTestMixin, TestCase):
+    def test_message_creates_and_updates_conversation(self):
+        first = self.send(self.char1, self.char2, thread_id=uuid.uuid4())
+        second = self.send(self.char2, self.char1, thread_id=first.thread_id)
+        self.send(self.char1, self.char2, thread_id=first.thread_id)
+
+        conversation = Conversation.objects.get(thread_id=first.thread_id)
+        self.assertEqual(conversation.unread_count_for(self.char2.id), 2)
+        self.assertEqual(conversation.unread_count_for(self.char1.id), 1)
+        self.assertEqual(Conversation.objects.count(), 1)
+
+        Conversation.mark_read([self.char2], thread_ids=first.thread_id)
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.unread_count_for(self.char2.id), 0)
+
+        second.delete()
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.unread_count_for(self.char1.id), 0)
+
+    def test_character_pair_has_single_deterministic_thread(self):
+        first = self.send(self.char1, self.char2, thread_id=uuid.uuid4())
+        reply = self.send(self.char2, self.char1, thread_id=uuid.uuid4())
+
+        self.assertEqual(first.thread_id, reply.thread_id)
+        self.assertEqual(first.thread_id, Conversation.thread_id_for(self.char2.id, self.char1.id))
+        self.assertEqual(Conversation.find_thread_id([self.char1], self.char2), first.thread_id)
+
+        character_a_id, character_b_id = Conversation.order_pair(self.char1.id, self.char2.id)
+        with self.assertRaises(IntegrityError):
+            Conversation.objects.create(
+                thread_id=uuid.uuid4(),
+                character_a_id=character_a_id,
+                character_b_id=character_b_id,
+                last_sent_date=first.sent_date
+            )
+
+    def test_read_watermark(self):
+        first = self.send(self.char2, self.char1)
+        self.client.force_login(self.user1)
+        self.client.get(reverse('message_list'), {'thread_id': first.thread_id})
+
+        conversation = Conversation.objects.get(thread_id=first.thread_id)
+        self.assertEqual(conversation.read_watermark_for(self.char1.id), first.id)
+        self.assertEqual(conversation.unread_count_for(self.char1.id), 0)
+
+        second = self.send(self.char2, self.char1)
+        conversation.refresh_from_db()
+        self.assertEqual(list(conversation.unread_messages_for(self.char1.id)), [second])
+        self.assertEqual(conversation.unread_count_for(self.char1.id), 1)
+
+    def test_watermark_advances_after_counter_drift(self):
+        message = self.send(self.char2, self.char1)
+        conversation = Conversation.objects.get(thread_id=message.thread_id)
+        side = conversation.side_of(self.char1.id)
+        Conversation.objects.filter(pk=conversation.pk).update(**{f'unread_count_{side}': 0})
+
+        self.assertEqual(Conversation.mark_read([self.char1]), 1)
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.read_watermark_for(self.char1.id), message.id)
+        self.assertEqual(Conversation.mark_read([self.char1]), 0)
+
+    def test_bulk_mark_read(self):
+        other = Character.objects.create(user=self.user2, game=self.game, nickname='Mage')
+        self.send(self.char2, self.char1)
+        self.send(other, self.char1)
+        self.client.force_login(self.user1)
+
+        response = self.client.post(reverse('mark_conversations_read'), {'all': '1'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json(), {'updated': 2})
+        self.assertFalse(Conversation.objects.filter(unread_count_a__gt=0).exists())
+        self.assertFalse(Conversation.objects.filter(unread_count_b__gt=0).exists())
+
+    def test_sidebar_query_count_does_not_grow_with_threads(self):
+        for index in range(5):
+            other = Character.objects.create(user=self.user2, game=self.game, nickname=f'Alt{index}')
+            self.send(other, self.char1, thread_id=uuid.uuid4())
+
+        self.client.force_login(self.user1)
+        self.client.get(reverse('message_list'))  # warm up the notification counters
+        with CaptureQueriesContext(connection) as few_threads:
+            response = self.client.get(reverse('message_list'))
+        self.assertEqual(len(response.context['conversations']), 5)
+
+        for index in range(5, 15):
+            other = Character.objects.create(user=self.user2, game=self.game, nickname=f'Alt{index}')
+            self.send(other, self.char1, thread_id=uuid.uuid4())
+
+        with CaptureQueriesContext(connection) as many_threads:
+            response = self.client.get(reverse('message_list'))
+        self.assertEqual(len(response.context['conversations']), 15)
+        self.assertEqual(len(few_threads), len(many_threads))
+
+
+@override_settings(MESSAGE_THREAD_PAGE_SIZE=3)
+class MessageThreadPaginationTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.thread = [self.send(self.char1, self.char2, content=f'm{index}') for index in range(7)]
+        self.thread_id = self.thread[0].thread_id
+        self.client.force_login(self.user1)
+
+    def test_thread_opens_on_newest_page(self):
+        response = self.client.get(reverse('message_list'), {'thread_id': self.thread_id})
+        self.assertEqual([m.content for m in response.context['messages']], ['m4', 'm5', 'm6'])
+        self.assertTrue(response.context['thread_page'].has_older)
+        self.assertFalse(response.context['thread_page'].has_newer)
+
+    def test_slice_endpoint_walks_older_and_newer(self):
+        url = reverse('message_thread_slice', kwargs={'thread_id': self.thread_id})
+        newest = self.client.get(url).json()
+        older = self.client.get(url, {'before': newest['older_cursor']}).json()
+        self.assertEqual([m['content'] for m in older['messages']], ['m1', 'm2', 'm3'])
+        self.assertTrue(older['has_older'])
+
+        oldest = self.client.get(url, {'before': older['older_cursor']}).json()
+        self.assertEqual([m['content'] for m in oldest['messages']], ['m0'])
+        self.assertFalse(oldest['has_older'])
+
+        newer = self.client.get(url, {'after': oldest['newer_cursor']}).json()
+        self.assertEqual([m['content'] for m in newer['messages']], ['m1', 'm2', 'm3'])
+        self.assertEqual(self.client.get(url, {'before': 'garbage'}).status_code, 400)
+
+    def test_slice_endpoint_requires_participation(self):
+        self.client.force_login(get_user_model().objects.create_user(username='eve', password='x'))
+        url = reverse('message_thread_slice', kwargs={'thread_id': self.thread_id})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class NotificationCounterTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # Materialize the (empty) counter rows so later changes are applied incrementally
+        get_counters(self.user1.id)
+
+    def counters(self):
+        cache.clear()
+        return get_counters(self.user1.id)
+
+    def test_message_counter_follows_read_watermark(self):
+        self.send(self.char2, self.char1)
+        self.send(self.char2, self.char1)
+        self.assertEqual(self.counters()['unread_messages'], 2)
+
+        Conversation.mark_read([self.char1])
+        self.assertEqual(self.counters()['unread_messages'], 0)
+
+    def test_poke_counter(self):
+        poke = Poke.objects.create(sender_character=self.char2, receiver_character=self.char1, content='hey')
+        self.assertEqual(self.counters()['unread_pokes'], 1)
+
+        poke.status = 'RESPONDED'
+        poke.save()
+        self.assertEqual(self.counters()['unread_pokes'], 0)
+
+        third = Character.objects.create(user=self.user2, game=self.game, nickname='Mage')
+        Poke.objects.create(sender_character=third, receiver_character=self.char1, content='again').delete()
+        self.assertEqual(self.counters()['unread_pokes'], 0)
+
+    def test_friend_request_counter(self):
+        request = CharacterFriendRequest.objects.create(sender_character=self.char2, receiver_character=self.char1)
+        self.assertEqual(self.counters()['pending_friend_requests'], 1)
+
+        request = CharacterFriendRequest.objects.get(pk=request.pk)
+        request.status = 'ACCEPTED'
+        request.save()
+        self.assertEqual(self.counters()['pending_friend_requests'], 0)
+
+    def test_recount_command_repairs_drift(self):
+        Poke.objects.create(sender_character=self.char2, receiver_character=self.char1, content='hey')
+        NotificationCounter.objects.filter(user=self.user1).update(unread_pokes=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('recount_notification_counters', user_ids=[self.user1.id], stdout=StringIO())
+        self.assertEqual(get_counters(self.user1.id)['unread_pokes'], 1)
+
+    def test_navbar_badges_do_not_count(self):
+        self.send(self.char2, self.char1)
+        Poke.objects.create(sender_character=self.char2, receiver_character=self.char1, content='hey')
+        self.counters()
+        self.client.force_login(self.user1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('account_characters_list'))
+        self.assertContains(response, 'id="poke-badge">1<')
+        self.assertContains(response, 'id="message-badge">1<')
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'].upper()])
+
+
+class RecordingEventBackend(BaseEventBackend):
+    """Collects published events instead of delivering them"""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, user_id, event):
+        self.published.append((user_id, event))
+
+
+class LiveEventsTestCase(MessagingTestMixin, TestCase):
+    @override_settings(EVENT_BACKEND='app.tests.RecordingEventBackend')
+    def test_events_are_published_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            message = self.send(self.char1, self.char2)
+            Poke.objects.create(sender_character=self.char1, receiver_character=self.char2, content='hey')
+        self.assertEqual(get_event_backend().published, [])
+
+        for callback in callbacks:
+            callback()
+        published = [
+            (user_id, event['type'], event.get('incoming')) for user_id, event in get_event_backend().published
+        ]
+        self.assertIn((self.user2.id, 'message', True), published)
+        self.assertIn((self.user1.id, 'message', False), published)
+        self.assertIn((self.user2.id, 'poke', None), published)
+        message_event = next(event for user_id, event in get_event_backend().published if event['type'] == 'message')
+        self.assertEqual(message_event['thread_id'], str(message.thread_id))
+
+    @override_settings(
+        EVENT_BACKEND='app.events.InProcessEventBackend', EVENT_STREAM_HEARTBEAT=1, EVENT_STREAM_ENABLED=True
+    )
+    async def test_stream_delivers_events_to_the_right_user(self):
+        await self.async_client.aforce_login(self.user2)
+        response = await self.async_client.get(reverse('event_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+
+        backend = get_event_backend()
+        backend.publish(self.user1.id, {'type': 'poke', 'poke_id': 'not-for-bob'})
+        backend.publish(self.user2.id, {'type': 'poke', 'poke_id': 'for-bob'})
+        chunk = await anext(chunks)
+        self.assertTrue(chunk.startswith(b'event: poke\n'))
+        self.assertIn(b'for-bob', chunk)
+        self.assertNotIn(b'not-for-bob', chunk)
+        self.assertEqual(await anext(chunks), b': keep-alive\n\n')
+        await chunks.aclose()
+
+    def test_stream_requires_login(self):
+        self.assertEqual(self.client.get(reverse('event_stream')).status_code, 401)
+
+    @override_settings(EVENT_STREAM_ENABLED=False)
+    def test_pages_poll_when_stream_disabled(self):
+        self.client.force_login(self.user1)
+        self.assertEqual(self.client.get(reverse('event_stream')).status_code, 204)
+        self.assertNotContains(self.client.get(reverse('message_list')), 'new EventSource')
+        with self.settings(EVENT_STREAM_ENABLED=True):
+            self.assertContains(self.client.get(reverse('message_list')), 'new EventSource')
+
+    def test_send_with_fetch_returns_json(self):
+        self.client.force_login(self.user1)
+        response = self.client.post(
+            reverse('message_list'),
+            {
+                'receiver_character': self.char2.id,
+                'sender_character': self.char1.id,
+                'content': 'hello',
+                'privacy_mode': 'ANONYMOUS',
+            },
+            HTTP_ACCEPT='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        message = Message.objects.get(content='hello')
+        self.assertEqual(response.json()['thread_id'], str(message.thread_id))
+
+        url = reverse('message_thread_slice', kwargs={'thread_id': message.thread_id})
+        html = self.client.get(url, {'html': '1'}).json()['messages'][0]['html']
+        self.assertIn('hello', html)
+
+
+class MessageSearchTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.raid = self.send(self.char2, self.char1, content='Remember the raid on Ferumbras in 2004?')
+        self.send(self.char1, self.char2, content='Sure, <b>epic</b> raid')
+        self.send(self.char1, self.char2, content='See you tomorrow')
+        eve = get_user_model().objects.create_user(username='eve', password='x')
+        self.outsider = Character.objects.create(user=eve, game=self.game, nickname='Spy')
+        self.send(self.outsider, self.char2, content='raid 2004 secret plans')
+
+    def test_uses_full_text_index(self):
+        self.assertEqual(search_backend(), 'fts5')
+
+    def test_ranked_hits_scoped_to_own_characters(self):
+        hits = list(search_messages(self.user1, 'raid 2004'))
+        self.assertEqual([hit.message for hit in hits], [self.raid])
+        self.assertEqual(hits[0].other_character, self.char2)
+        self.assertIn(f'thread_id={self.raid.thread_id}', hits[0].thread_url)
+
+        contents = [hit.message.content for hit in search_messages(self.user1, 'rai')]
+        self.assertEqual(len(contents), 2)
+        self.assertNotIn('raid 2004 secret plans', contents)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.raid.content = 'Remember the siege?'
+        self.raid.save()
+        self.assertEqual(len(search_messages(self.user1, 'siege')), 1)
+        self.assertEqual(len(search_messages(self.user1, 'ferumbras')), 0)
+        self.raid.delete()
+        self.assertEqual(len(search_messages(self.user1, 'siege')), 0)
+
+    def test_pagination_and_snippets(self):
+        page = search_messages(self.user1, 'raid', per_page=1)
+        self.assertTrue(page.has_next)
+        second = search_messages(self.user1, 'raid', page=2, per_page=1)
+        self.assertFalse(second.has_next)
+        self.assertNotEqual(page.object_list[0].message, second.object_list[0].message)
+
+        snippet = next(hit.snippet for hit in search_messages(self.user1, 'epic'))
+        self.assertIn('&lt;b&gt;<mark>epic</mark>&lt;/b&gt;', snippet)
+
+    def test_search_view(self):
+        self.client.force_login(self.user1)
+        response = self.client.get(reverse('message_search'), {'q': 'Ferumbras "2004'})
+        self.assertContains(response, '<mark>Ferumbras</mark>')
+        self.assertNotContains(response, 'secret plans')
+
+
+class MessageArchiveTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.thread = [self.send(self.char1, self.char2, content=f'old {index}') for index in range(5)]
+        long_ago = timezone.now() - timedelta(days=400)
+        for index, message in enumerate(self.thread):
+            Message.objects.filter(pk=message.pk).update(sent_date=long_ago + timedelta(minutes=index))
+        Conversation.objects.update(last_sent_date=long_ago)
+        self.thread_id = self.thread[0].thread_id
+        self.original = list(Message.objects.order_by('id').values_list('id', 'sent_date', 'content'))
+
+    def test_archive_keeps_last_message_hot(self):
+        call_command('archive_inactive_threads', months=6, stdout=StringIO())
+        self.assertEqual(list(Message.objects.values_list('id', flat=True)), [self.thread[-1].id])
+        archive = MessageArchive.objects.get(thread_id=self.thread_id)
+        self.assertEqual(archive.message_count, 4)
+        self.assertEqual([row['content'] for row in archive.decode()], ['old 0', 'old 1', 'old 2', 'old 3'])
+        self.assertEqual(Conversation.objects.get(thread_id=self.thread_id).last_message_id, self.thread[-1].id)
+
+    def test_recent_threads_are_not_archived(self):
+        self.send(self.char2, self.char1, content='fresh')
+        call_command('archive_inactive_threads', months=6, stdout=StringIO())
+        self.assertFalse(MessageArchive.objects.exists())
+
+    def test_opening_thread_rehydrates_it(self):
+        call_command('archive_inactive_threads', months=6, stdout=StringIO())
+        self.client.force_login(self.user1)
+        response = self.client.get(reverse('message_list'), {'thread_id': self.thread_id})
+        self.assertEqual([m.content for m in response.context['messages']], [f'old {index}' for index in range(5)])
+        self.assertEqual(list(Message.objects.order_by('id').values_list('id', 'sent_date', 'content')), self.original)
+        self.assertFalse(MessageArchive.objects.exists())
+
+    def test_deleting_last_hot_message_restores_archive(self):
+        MessageArchive.archive_thread(self.thread_id)
+        Message.objects.get(pk=self.thread[-1].pk).delete()
+        self.assertEqual(Message.objects.count(), 4)
+        self.assertEqual(Conversation.objects.get(thread_id=self.thread_id).last_message_id, self.thread[3].id)
+
+
+@override_settings(MESSAGE_THREAD_PAGE_SIZE=2)
+class MessageApiTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.thread = [self.send(self.char1, self.char2, content=f'api {index}') for index in range(3)]
+        self.thread_id = self.thread[0].thread_id
+        self.client.force_login(self.user1)
+        self.url = '/api/v1/messages/'
+
+    def test_threads_list(self):
+        response = self.client.get(self.url + 'threads/')
+        self.assertEqual(response.status_code, 200)
+        [thread] = response.json()['results']
+        self.assertEqual(thread['thread_id'], str(self.thread_id))
+        self.assertEqual(thread['other_character']['nickname'], 'Druid')
+        self.assertEqual(thread['last_message']['id'], self.thread[-1].id)
+
+    def test_thread_messages_are_cursor_paginated(self):
+        response = self.client.get(self.url, {'thread': self.thread_id})
+        data = response.json()
+        self.assertEqual([m['content'] for m in data['results']], ['api 2', 'api 1'])
+        older = self.client.get(data['next']).json()
+        self.assertEqual([m['content'] for m in older['results']], ['api 0'])
+        self.assertIsNone(older['next'])
+
+    def test_foreign_thread_is_not_found(self):
+        self.client.force_login(get_user_model().objects.create_user(username='eve', password='x'))
+        response = self.client.get(self.url, {'thread': self.thread_id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_since_returns_only_newer_messages(self):
+        response = self.client.get(self.url, {'since': self.thread[0].id})
+        data = response.json()
+        self.assertEqual([m['content'] for m in data['results']], ['api 1', 'api 2'])
+        self.assertEqual(data['next_since'], self.thread[-1].id)
+        self.assertFalse(data['has_more'])
+
+    def test_etag_not_modified_until_new_message(self):
+        first = self.client.get(self.url, {'since': self.thread[-1].id})
+        etag = first['ETag']
+        repeat = self.client.get(self.url, {'since': self.thread[-1].id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.send(self.char2, self.char1, content='reply')
+        changed = self.client.get(self.url, {'since': self.thread[-1].id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual([m['content'] for m in changed.json()['results']], ['reply'])
+
+    def test_send_requires_poke_exchange(self):
+        payload = {'sender_character': self.char1.id, 'receiver_character': self.char2.id, 'content': 'hello'}
+        self.assertEqual(self.client.post(self.url, payload).status_code, 403)
+        Poke.objects.create(sender_character=self.char2, receiver_character=self.char1, content='hey')
+        response = self.client.post(self.url, payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['privacy_mode'], 'ANONYMOUS')
+
+
+class PokeEligibilityTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.char3 = Character.objects.create(user=self.user2, game=self.game, nickname='Sorcerer')
+        self.own = Character.objects.create(user=self.user1, game=self.game, nickname='Paladin')
+
+    def test_batch_is_two_queries(self):
+        Poke.objects.create(sender_character=self.char1, receiver_character=self.char2, content='hey')
+        CharacterBlock.objects.create(blocker_character=self.char3, blocked_character=self.char1)
+        # The receivers in one query, the POKEs sent today in the other
+        with self.assertNumQueries(2):
+            results = poke_eligibility(self.user1, [self.char2, self.char3, self.own])
+        self.assertEqual(results[self.char2.pk].reason, "You can send only 1 POKE to the same character per 30 days")
+        self.assertEqual(results[self.char3.pk].reason, "You have been blocked by this character")
+        self.assertEqual(results[self.own.pk].reason, "You cannot send POKE to your own character")
+        self.assertEqual(results[self.char2.pk].pokes_remaining, 4)
+
+    @override_settings(POKE_MAX_PER_USER_PER_DAY=1)
+    def test_daily_limit(self):
+        self.assertEqual(can_send_poke(self.user1, self.char2), (True, None))
+        Poke.objects.create(sender_character=self.char1, receiver_character=self.char2, content='hey')
+        self.assertEqual(can_send_poke(self.user1, self.char3), (False, "You can send maximum 1 POKEs per 24 hours"))
+
+    def test_user_without_characters(self):
+        newcomer = get_user_model().objects.create_user(username='newcomer', password='x')
+        can_send, reason = can_send_poke(newcomer, self.char2)
+        self.assertFalse(can_send)
+        self.assertEqual(reason, "You need to create a character first to send POKEs")
+
+
+class RateLimitTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_sliding_window_weights_previous_window(self):
+        limiter = SlidingWindowLimiter('test', limit=4, window=100)
+        for _ in range(4):
+            limiter.hit('k', now=1050)
+        self.assertFalse(limiter.check('k', now=1099).allowed)
+        # Three quarters into the next window only a quarter of the old hits count
+        status = limiter.check('k', now=1175)
+        self.assertTrue(status.allowed)
+        self.assertEqual(status.remaining, 3)
+
+    def test_token_bucket_refills(self):
+        limiter = TokenBucketLimiter('test', capacity=2, rate=0.5)
+        limiter.hit('k', now=0)
+        limiter.hit('k', now=0)
+        status = limiter.check('k', now=1)
+        self.assertFalse(status.allowed)
+        self.assertEqual(status.retry_after, 1)
+        self.assertTrue(limiter.check('k', now=2).allowed)
+
+    def test_poke_limit_is_counted_in_database(self):
+        Poke.objects.create(sender_character=self.char1, receiver_character=self.char2, content='hey')
+        # Another worker's cache knows nothing about the POKE
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_rate_limiter('poke').check(self.user1.id).remaining, 4)
+
+    def test_shipped_daily_limits_are_exact(self):
+        # No override_settings: the limits as configured in settings/base.py
+        self.assertTrue(get_rate_limiter('poke').exact)
+        self.assertTrue(get_rate_limiter('friend_request').exact)
+
+    def test_reseed_drops_previous_window(self):
+        stored = {'k': 2}
+        limiter = SlidingWindowLimiter('test', limit=4, window=100, seed=lambda key, window: stored[key])
+        limiter.hit('k', now=1050)
+        limiter.hit('k', now=1050)
+        # The seeded flag expired; the previous window's count did not
+        cache.delete(limiter._key('k', 'seeded'))
+        self.assertEqual(limiter.check('k', now=1110).remaining, 2)
+
+    @override_settings(RATE_LIMITS={'message': {'algorithm': 'token_bucket', 'capacity': 1, 'rate': 0.001}})
+    def test_message_api_is_throttled(self):
+        Poke.objects.create(sender_character=self.char2, receiver_character=self.char1, content='hey')
+        self.client.force_login(self.user1)
+        payload = {'sender_character': self.char1.id, 'receiver_character': self.char2.id, 'content': 'hello'}
+        self.assertEqual(self.client.post('/api/v1/messages/', payload).status_code, 201)
+        response = self.client.post('/api/v1/messages/', payload)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class ContentFilterTestCase(TestCase):
+    def test_matcher_finds_overlapping_terms(self):
+        matcher = TermMatcher(['he', 'She', 'hers', 'usher'])
+        self.assertEqual(len(matcher), 4)
+        self.assertEqual(matcher.search('USHERS'), 'she')
+        self.assertEqual(matcher.search('a hershey'), 'he')
+        self.assertIsNone(matcher.search('nothing to see'))
+
+    @override_settings(POKE_PROFANITY_WORDLIST=['noob'])
+    def test_validate_poke_content(self):
+        errors, _ = validate_poke_content('You are a NOOB')
+        self.assertEqual(errors, ["Inappropriate content is not allowed"])
+        errors, _ = validate_poke_content('see www.example.com or mail me@example.com')
+        self.assertEqual(errors, [
+            "URLs and links are not allowed in POKE content",
+            "Email addresses are not allowed in POKE content",
+        ])
+        self.assertEqual(validate_poke_content('Remember the old guild?')[0], [])
+
+    def test_wordlist_file_is_reloaded_when_modified(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as wordlist:
+            wordlist.write('# banned\nnoob\n')
+        self.addCleanup(os.unlink, wordlist.name)
+        with override_settings(POKE_PROFANITY_WORDLIST=[], POKE_PROFANITY_WORDLIST_FILE=wordlist.name):
+            self.assertEqual(get_profanity_matcher().search('hi noob'), 'noob')
+            with open(wordlist.name, 'w') as changed:
+                changed.write('camper\n')
+            stat = os.stat(wordlist.name)
+            os.utime(wordlist.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            self.assertIsNone(get_profanity_matcher().search('hi noob'))
+            self.assertEqual(get_profanity_matcher().search('a camper'), 'camper')
+
+
+@override_settings(POKE_MAX_PER_USER_PER_DAY=100)
+class PokeInboxTestCase(MessagingTestMixin, TestCase):
+    def poke(self, sender, receiver, **kwargs):
+        return Poke.objects.create(sender_character=sender, receiver_character=receiver, content='hey', **kwargs)
+
+    def test_poke_is_projected_into_both_inboxes(self):
+        poke = self.poke(self.char2, self.char1)
+        entries = {entry.direction: entry for entry in PokeInboxEntry.objects.filter(poke=poke)}
+        self.assertEqual(entries['RECEIVED'].owner_character, self.char1)
+        self.assertEqual(entries['SENT'].owner_character, self.char2)
+
+        poke.status = 'IGNORED'
+        poke.save(update_fields=['status'])
+        self.assertEqual(set(PokeInboxEntry.objects.filter(poke=poke).values_list('status', flat=True)), {'IGNORED'})
+
+    def test_list_pages_with_cursors(self):
+        others = [
+            Character.objects.create(user=self.user2, game=self.game, nickname=f'Alt{index}')
+            for index in range(5)
+        ]
+        for other in others[:3]:
+            self.poke(other, self.char1)
+        for other in others[3:]:
+            self.poke(self.char1, other)
+        self.client.force_login(self.user1)
+
+        url = reverse('poke_list')
+        self.client.get(url)  # warm the notification counters cache
+        with self.assertNumQueries(2):  # user, page
+            response = self.client.get(url, {'status': 'received'})
+        self.assertEqual([entry.other_character for entry in response.context['pokes']], others[2::-1])
+
+        view_class = response.resolver_match.func.view_class
+        page_size, view_class.paginate_by = view_class.paginate_by, 2
+        try:
+            first = self.client.get(url)
+            self.assertEqual([entry.other_character for entry in first.context['pokes']], [others[4], others[3]])
+            older = self.client.get(url, {'before': first.context['page_obj'].older_cursor})
+            self.assertEqual([entry.other_character for entry in older.context['pokes']], [others[2], others[1]])
+        finally:
+            view_class.paginate_by = page_size
+
+    def test_rebuild(self):
+        self.poke(self.char2, self.char1)
+        PokeInboxEntry.objects.all().delete()
+        call_command('rebuild_poke_inbox', stdout=StringIO())
+        self.assertEqual(PokeInboxEntry.objects.count(), 2)
+
+
+@override_settings(POKE_MAX_PER_USER_PER_DAY=100)
+class PokeLifecycleTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.others = [
+            Character.objects.create(user=self.user2, game=self.game, nickname=f'Alt{index}')
+            for index in range(4)
+        ]
+
+    def poke(self, sender, receiver, days_ago, **kwargs):
+        poke = Poke.objects.create(sender_character=sender, receiver_character=receiver, content='hey', **kwargs)
+        Poke.objects.filter(pk=poke.pk).update(sent_date=timezone.now() - timedelta(days=days_ago))
+        return poke
+
+    def test_expire_stale_pending_pokes(self):
+        stale = [self.poke(other, self.char1, days_ago=40) for other in self.others[:3]]
+        fresh = self.poke(self.others[3], self.char1, days_ago=1)
+        self.assertEqual(get_counters(self.user1.id)['unread_pokes'], 4)
+
+        call_command('expire_pokes', batch_size=2, sleep=0, no_purge=True, stdout=StringIO())
+
+        self.assertEqual(set(Poke.objects.filter(status='EXPIRED').values_list('pk', flat=True)), {p.pk for p in stale})
+        self.assertEqual(Poke.objects.get(pk=fresh.pk).status, 'PENDING')
+        self.assertEqual(PokeInboxEntry.objects.filter(status='EXPIRED').count(), 6)
+        cache.clear()
+        self.assertEqual(get_counters(self.user1.id)['unread_pokes'], 1)
+
+    def test_purge_closed_pokes_to_archive(self):
+        old = self.poke(self.others[0], self.char1, days_ago=200, status='IGNORED')
+        recent = self.poke(self.others[1], self.char1, days_ago=10, status='BLOCKED')
+        pending = self.poke(self.others[2], self.char1, days_ago=200)
+        with tempfile.NamedTemporaryFile('r', suffix='.jsonl', delete=False) as archive:
+            pass
+        self.addCleanup(os.unlink, archive.name)
+
+        call_command('expire_pokes', expire_after_days=365, archive=archive.name, sleep=0, stdout=StringIO())
+
+        self.assertEqual(set(Poke.objects.values_list('pk', flat=True)), {recent.pk, pending.pk})
+        self.assertFalse(PokeInboxEntry.objects.filter(poke_id=old.pk).exists())
+        with open(archive.name) as archived:
+            self.assertEqual([json.loads(line)['id'] for line in archived], [str(old.pk)])
+
+
+@override_settings(POKE_MAX_PER_USER_PER_DAY=100)
+class TransitionTestCase(MessagingTestMixin, TestCase):
+    def test_respond_poke_is_applied_once(self):
+        poke = Poke.objects.create(sender_character=self.char2, receiver_character=self.char1, content='hey')
+        self.assertEqual(get_counters(self.user1.id)['unread_pokes'], 1)
+        self.client.force_login(self.user1)
+        url = reverse('respond_poke', args=[poke.pk])
+        self.client.post(url)
+        self.client.post(url)  # double click
+
+        self.assertEqual(Poke.objects.get(pk=poke.pk).status, 'RESPONDED')
+        self.assertEqual(Poke.objects.filter(sender_character=self.char1, receiver_character=self.char2).count(), 1)
+        self.assertEqual(
+            set(PokeInboxEntry.objects.filter(poke=poke).values_list('status', flat=True)), {'RESPONDED'}
+        )
+        cache.clear()
+        self.assertEqual(get_counters(self.user1.id)['unread_pokes'], 0)
+
+    def test_only_receiver_can_transition(self):
+        poke = Poke.objects.create(sender_character=self.char2, receiver_character=self.char1, content='hey')
+        with self.assertRaises(Poke.DoesNotExist):
+            transitions.ignore_poke(self.user2, poke.pk)
+        transitions.ignore_poke(self.user1, poke.pk)
+        with self.assertRaises(transitions.InvalidTransition):
+            transitions.ignore_poke(self.user1, poke.pk)
+        transitions.block_poke(self.user1, poke.pk, report_spam=True)
+        poke.refresh_from_db()
+        self.assertEqual((poke.status, poke.reported_by), ('BLOCKED', self.user1))
+
+    def test_accept_friend_request_twice(self):
+        friend_request = CharacterFriendRequest.objects.create(
+            sender_character=self.char2, receiver_character=self.char1
+        )
+        self.client.force_login(self.user1)
+        url = f'/api/v1/friend-requests/{friend_request.pk}/accept/'
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 409)
+        self.assertEqual(CharacterFriend.objects.count(), 1)
+        cache.clear()
+        self.assertEqual(get_counters(self.user1.id)['pending_friend_requests'], 0)
+
+
+@override_settings(POKE_MAX_PER_USER_PER_DAY=100)
+class RelationshipTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.others = [
+            Character.objects.create(user=self.user2, game=self.game, nickname=f'Alt{index}')
+            for index in range(4)
+        ]
+
+    def test_resolved_in_constant_queries(self):
+        friend, poked_me, blocker, stranger = self.others
+        CharacterFriend.objects.create(character1=self.char1, character2=friend)
+        Poke.objects.create(sender_character=poked_me, receiver_character=self.char1, content='hey')
+        Poke.objects.create(sender_character=blocker, receiver_character=self.char1, content='hey')
+        CharacterBlock.objects.create(blocker_character=blocker, blocked_character=self.char1)
+
+        with self.assertNumQueries(4):
+            relationships = resolve_relationships(self.user1, self.others + [self.char1])
+        with self.assertNumQueries(2):
+            resolve_relationships(self.user1, self.others + [self.char1])
+        self.assertTrue(relationships[friend.pk].is_friend)
+        self.assertEqual(relationships[poked_me.pk].poke_received, 'PENDING')
+        self.assertTrue(relationships[poked_me.pk].can_message)
+        self.assertTrue(relationships[blocker.pk].blocked_by_them)
+        self.assertFalse(relationships[blocker.pk].can_message)
+        self.assertFalse(relationships[stranger.pk].can_message)
+        self.assertTrue(relationships[self.char1.pk].own)
+        for other in self.others:
+            self.assertEqual(
+                relationships[other.pk].can_message, can_send_message(self.char1, other)[0]
+            )
+
+    def test_game_players_page_shows_badges(self):
+        CharacterFriend.objects.create(character1=self.char1, character2=self.others[0])
+        self.client.force_login(self.user1)
+        response = self.client.get(reverse('game_players', args=[self.game.slug]))
+        self.assertContains(response, 'badge bg-success', count=1)
+
+    def test_api_includes_relationship(self):
+        Poke.objects.create(sender_character=self.char1, receiver_character=self.others[0], content='hey')
+        self.client.force_login(self.user1)
+        data = self.client.get(f'/api/v1/characters/{self.others[0].pk}/').json()
+        self.assertEqual(data['relationship']['poke_sent'], 'PENDING')
+
+
+class BlockSetTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.char3 = Character.objects.create(user=self.user2, game=self.game, nickname='Mage')
+
+    def test_checks_are_served_from_cache(self):
+        CharacterBlock.objects.create(blocker_character=self.char2, blocked_character=self.char1)
+        get_block_sets([self.char1.pk, self.char2.pk])
+
+        with self.assertNumQueries(0):
+            self.assertTrue(get_block_set(self.char1.pk).is_blocked_by(self.char2.pk))
+            self.assertFalse(get_block_set(self.char2.pk).is_blocked_by(self.char1.pk))
+
+    def test_evicted_version_does_not_revive_old_sets(self):
+        self.assertFalse(get_block_set(self.char1.pk).is_blocked_by(self.char2.pk))
+        # Saved without signals, then the version key is culled from the cache
+        CharacterBlock.objects.bulk_create([CharacterBlock(blocker_character=self.char2, blocked_character=self.char1)])
+        cache.delete(f'block_set_version:{self.char1.pk}')
+        self.assertTrue(get_block_set(self.char1.pk).is_blocked_by(self.char2.pk))
+
+    def test_write_checks_ignore_stale_block_sets(self):
+        Poke.objects.create(sender_character=self.char2, receiver_character=self.char1, content='hey')
+        get_block_sets([self.char1.pk, self.char2.pk])
+        # Saved without signals, like a block made in a worker with its own cache
+        CharacterBlock.objects.bulk_create([CharacterBlock(blocker_character=self.char2, blocked_character=self.char1)])
+        self.assertFalse(get_block_set(self.char1.pk).is_blocked_by(self.char2.pk))
+        self.assertEqual(can_send_message(self.char1, self.char2), (False, "You have been blocked by this character"))
+
+    def test_block_and_unblock_invalidate(self):
+        self.assertFalse(is_blocked(self.char2, self.char1))
+        block = CharacterBlock.objects.create(blocker_character=self.char2, blocked_character=self.char1)
+        self.assertTrue(is_blocked(self.char2, self.char1))
+        self.assertEqual(get_block_set(self.char2.pk).blocking, {self.char1.pk})
+
+        block.delete()
+        self.assertFalse(is_blocked(self.char2, self.char1))
+        self.assertEqual(get_block_set(self.char2.pk).blocking, frozenset())
+
+        PokeBlock.objects.create(blocker_character=self.char2, blocked_character=self.char1)
+        self.assertTrue(get_block_set(self.char1.pk).is_blocked_by(self.char2.pk))
+        self.assertFalse(get_block_set(self.char1.pk).is_blocked_by(self.char2.pk, include_poke_blocks=False))
+
+    def test_exclude_blocked_filters_both_directions(self):
+        other = Character.objects.create(user=self.user2, game=self.game, nickname='Rogue')
+        CharacterBlock.objects.create(blocker_character=self.char1, blocked_character=self.char2)
+        CharacterBlock.objects.create(blocker_character=self.char3, blocked_character=self.char1)
+        get_block_set(self.char1.pk)
+
+        with self.assertNumQueries(0):
+            remaining = exclude_blocked([self.char1.pk], [self.char2, self.char3, other])
+        self.assertEqual(remaining, [other])
+        self.assertEqual(exclude_blocked([self.char1.pk], [self.char2.pk, other.pk]), [other.pk])
+
+    def test_poke_block_shares_the_block_table(self):
+        poke = Poke.objects.create(sender_character=self.char2, receiver_character=self.char1, content='hey')
+        transitions.block_poke(self.user1, poke.pk, reason='spam')
+        block = CharacterBlock.objects.get(blocker_character=self.char1, blocked_character=self.char2)
+        self.assertEqual(block.scope, CharacterBlock.SCOPE_POKE)
+        self.assertEqual(list(PokeBlock.objects.all()), [block])
+        self.assertTrue(get_block_set(self.char2.pk).is_blocked_by(self.char1.pk))
+        self.assertFalse(is_blocked(self.char1, self.char2))
+
+        # A full block widens the POKE block in place; a POKE block never narrows it
+        block, changed = CharacterBlock.block(self.char1, self.char2, reason='harassment')
+        self.assertTrue(changed)
+        self.assertEqual((block.scope, block.reason), (CharacterBlock.SCOPE_ALL, 'harassment'))
+        self.assertTrue(is_blocked(self.char1, self.char2))
+        self.assertFalse(PokeBlock.objects.exists())
+        block, changed = CharacterBlock.block(self.char1, self.char2, scope=CharacterBlock.SCOPE_POKE)
+        self.assertFalse(changed)
+        self.assertEqual(CharacterBlock.objects.get().scope, CharacterBlock.SCOPE_ALL)
+
+
+class VisibleToTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.char3 = Character.objects.create(user=self.user2, game=self.game, nickname='Mage')
+        self.char4 = Character.objects.create(user=self.user2, game=self.game, nickname='Rogue')
+        CharacterBlock.objects.create(blocker_character=self.char2, blocked_character=self.char1)
+        CharacterBlock.objects.create(blocker_character=self.char1, blocked_character=self.char3)
+        PokeBlock.objects.create(blocker_character=self.char4, blocked_character=self.char1)
+
+    def test_blocked_characters_are_hidden_in_both_directions(self):
+        visible = Character.objects.visible_to(self.user1)
+        self.assertEqual(set(visible), {self.char1, self.char4})
+        self.assertEqual(visible.count(), 2)
+        self.assertEqual(Character.objects.visible_to(AnonymousUser()).count(), 4)
+
+    def test_listings_exclude_blocked(self):
+        self.client.force_login(self.user1)
+        response = self.client.get(reverse('game_players', args=[self.game.slug]))
+        self.assertEqual(set(response.context['characters']), {self.char1, self.char4})
+        self.assertEqual(response.context['paginator'].count, 2)
+        response = self.client.get(reverse('character_list'))
+        self.assertNotContains(response, 'Druid')
+        data = self.client.get('/api/v1/characters/').json()
+        results = data['results'] if isinstance(data, dict) else data
+        self.assertEqual({item['id'] for item in results}, {str(self.char1.pk), str(self.char4.pk)})
+
+    def test_anti_joins_use_block_indexes(self):
+        players = Character.objects.bulk_create([
+            Character(user=self.user2, game=self.game, nickname=f'Player{index}', hash_id=f'p{index:09d}')
+            for index in range(3000)
+        ])
+        CharacterBlock.objects.bulk_create([
+            CharacterBlock(blocker_character=players[index], blocked_character=players[index + 1])
+            for index in range(0, 3000, 2)
+        ])
+        with connection.cursor() as cursor:
+            if connection.vendor in ('sqlite', 'postgresql'):
+                cursor.execute('ANALYZE')
+
+        plan = Character.objects.visible_to(self.user1).filter(game=self.game).explain()
+        full_scans = {'sqlite': 'SCAN app_characterblock', 'postgresql': 'Seq Scan on app_characterblock'}
+        if connection.vendor not in full_scans:
+            self.skipTest(f'No plan expectations for {connection.vendor}')
+        self.assertNotIn(full_scans[connection.vendor], plan)
+        self.assertEqual(Character.objects.visible_to(self.user1).count(), 3002)
+
+
+class FriendsCacheTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user3 = get_user_model().objects.create_user(username='carol', password='secret-pass-3')
+        self.char3 = Character.objects.create(user=self.user3, game=self.game, nickname='Mage')
+
+    def test_adjacency_is_cached_and_invalidated(self):
+        self.assertEqual(get_friend_sets([self.char1.pk])[self.char1.pk], frozenset())
+        friendship = CharacterFriend.objects.create(character1=self.char1, character2=self.char2)
+        friend_sets = get_friend_sets([self.char1.pk, self.char2.pk])
+        self.assertEqual(friend_sets, {self.char1.pk: {self.char2.pk}, self.char2.pk: {self.char1.pk}})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_friend_sets([self.char1.pk, self.char2.pk]), friend_sets)
+
+        friendship.delete()
+        self.assertEqual(get_friend_sets([self.char1.pk])[self.char1.pk], frozenset())
+
+    def test_friends_only_profiles(self):
+        self.user2.profile_visibility = 'FRIENDS_ONLY'
+        self.user2.save()
+        CharacterProfile.objects.create(character=self.char2, is_public=False)
+        self.client.force_login(self.user1)
+        url = reverse('user_profile_display', args=[self.user2.username])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        friendship = CharacterFriend.objects.create(character1=self.char1, character2=self.char2)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        data = self.client.get('/api/v1/user-profiles/').json()
+        results = data['results'] if isinstance(data, dict) else data
+        self.assertIn(self.user2.username, [item['username'] for item in results])
+        data = self.client.get('/api/v1/character-profiles/').json()
+        results = data['results'] if isinstance(data, dict) else data
+        self.assertEqual(len(results), 1)
+
+        friendship.delete()
+        data = self.client.get('/api/v1/character-profiles/').json()
+        results = data['results'] if isinstance(data, dict) else data
+        self.assertEqual(len(results), 0)
+
+
+class SuggestionsTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.user3 = User.objects.create_user(username='carol', password='secret-pass-3')
+        self.user4 = User.objects.create_user(username='dave', password='secret-pass-4')
+        other_game = Game.objects.create(name='Ultima Online', category=self.game.category)
+        self.char3 = Character.objects.create(user=self.user3, game=self.game, nickname='Mage')
+        self.char4 = Character.objects.create(user=self.user4, game=self.game, nickname='Rogue')
+        Character.objects.create(user=self.user1, game=other_game, nickname='Paladin')
+        Character.objects.create(user=self.user4, game=other_game, nickname='Bard')
+        # Knight - Druid - Mage, Knight - Rogue - Mage: Mage is two hops away through two friends
+        for character1, character2 in [
+            (self.char1, self.char2), (self.char2, self.char3), (self.char1, self.char4), (self.char4, self.char3)
+        ]:
+            CharacterFriend.objects.create(character1=character1, character2=character2)
+
+    def test_two_hop_suggestions_are_scored(self):
+        suggestions = get_suggestions(self.char1)
+        self.assertEqual([suggestion.character_id for suggestion in suggestions], [self.char3.pk])
+        self.assertEqual((suggestions[0].mutual_friends, suggestions[0].shared_games), (2, 1))
+
+        # Druid knows Rogue through Knight and Mage
+        suggestion = get_suggestions(self.char2)[0]
+        self.assertEqual((suggestion.character_id, suggestion.mutual_friends), (self.char4.pk, 2))
+        with self.assertNumQueries(0):
+            get_suggestions(self.char1)
+
+    def test_refreshed_on_friendship_change_and_filtered_by_blocks(self):
+        self.assertEqual(len(get_suggestions(self.char1)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            CharacterFriend.objects.create(character1=self.char1, character2=self.char3)
+        self.assertEqual(get_suggestions(self.char1), [])
+        self.assertEqual(get_suggestions(self.char2)[0].character_id, self.char4.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CharacterFriend.objects.filter(
+                character1__in=[self.char1, self.char3], character2__in=[self.char1, self.char3]
+            ).delete()
+        CharacterBlock.objects.create(blocker_character=self.char3, blocked_character=self.char1)
+        self.assertEqual(get_suggestions(self.char1), [])
+
+    def test_api_only_for_own_characters(self):
+        self.client.force_login(self.user1)
+        data = self.client.get(f'/api/v1/characters/{self.char1.pk}/suggestions/').json()
+        self.assertEqual(data[0]['character']['id'], str(self.char3.pk))
+        self.assertEqual(data[0]['mutual_friends'], 2)
+        # Out-of-range limits are clamped to 1..SUGGESTIONS_TOP_K
+        data = self.client.get(f'/api/v1/characters/{self.char1.pk}/suggestions/', {'limit': -1}).json()
+        self.assertEqual(len(data), 1)
+        response = self.client.get(f'/api/v1/characters/{self.char2.pk}/suggestions/')
+        self.assertEqual(response.status_code, 403)
+
+
+class UserFriendshipTestCase(MessagingTestMixin, TestCase):
+    def test_reference_counted_per_character_pair(self):
+        alt = Character.objects.create(user=self.user2, game=self.game, nickname='Alt')
+        first = CharacterFriend.objects.create(character1=self.char1, character2=self.char2)
+        CharacterFriend.objects.create(character1=self.char1, character2=alt)
+        self.assertEqual(UserFriendship.objects.get().character_pairs, 2)
+        with self.assertNumQueries(1):
+            self.assertTrue(UserFriendship.are_friends(self.user2, self.user1))
+
+        first.delete()
+        self.assertEqual(UserFriendship.objects.get().character_pairs, 1)
+        alt.delete()
+        self.assertFalse(UserFriendship.objects.exists())
+        self.assertFalse(UserFriendship.are_friends(self.user1, self.user2))
+
+    def test_own_characters_are_not_a_user_friendship(self):
+        own = Character.objects.create(user=self.user1, game=self.game, nickname='Alt')
+        CharacterFriend.objects.create(character1=self.char1, character2=own)
+        self.assertFalse(UserFriendship.objects.exists())
+
+    def test_rebuild_command(self):
+        CharacterFriend.objects.create(character1=self.char1, character2=self.char2)
+        UserFriendship.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_user_friendships', stdout=out)
+        self.assertIn('Rebuilt 1 user friendships', out.getvalue())
+        self.assertTrue(UserFriendship.are_friends(self.user1, self.user2))
+
+
+class BulkFriendRequestTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.senders = []
+        for index in range(5):
+            user = User.objects.create_user(username=f'fan{index}', password='secret-pass')
+            self.senders.append(Character.objects.create(user=user, game=self.game, nickname=f'Fan{index}'))
+        self.alt = Character.objects.create(user=self.user1, game=self.game, nickname='Alt')
+        self.requests = [
+            CharacterFriendRequest.objects.create(sender_character=sender, receiver_character=self.char1)
+            for sender in self.senders[:4]
+        ]
+        CharacterFriendRequest.objects.create(sender_character=self.senders[4], receiver_character=self.alt)
+        # Not the user's to accept
+        self.foreign = CharacterFriendRequest.objects.create(
+            sender_character=self.senders[0], receiver_character=self.char2
+        )
+
+    def test_bulk_accept_by_ids(self):
+        ids = [friend_request.pk for friend_request in self.requests[:3]] + [self.foreign.pk]
+        self.assertEqual(transitions.bulk_accept_friend_requests(self.user1, ids), 3)
+        self.assertEqual(CharacterFriend.objects.count(), 3)
+        self.assertEqual(CharacterFriendRequest.objects.get(pk=self.foreign.pk).status, 'PENDING')
+        self.assertTrue(UserFriendship.are_friends(self.user1, self.senders[0].user))
+        self.assertTrue(UserFriendship.are_friends(self.user1, self.senders[2].user))
+        # Already accepted requests are skipped
+        self.assertEqual(transitions.bulk_accept_friend_requests(self.user1, ids), 0)
+        cache.clear()
+        self.assertEqual(get_counters(self.user1.id)['pending_friend_requests'], 2)
+
+    def test_bulk_decline_for_character_via_api(self):
+        self.client.force_login(self.user1)
+        response = self.client.post(
+            '/api/v1/friend-requests/bulk-decline/', {'character': str(self.char1.pk)}, content_type='application/json'
+        )
+        self.assertEqual(response.json(), {'status': 'declined', 'count': 4})
+        self.assertEqual(
+            CharacterFriendRequest.objects.filter(receiver_character=self.alt, status='PENDING').count(), 1
+        )
+        response = self.client.post('/api/v1/friend-requests/bulk-accept/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/v1/friend-requests/bulk-accept/', {'ids': '12'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        # Form-encoded bodies are accepted too
+        response = self.client.post('/api/v1/friend-requests/bulk-accept/', {'all': 'true'})
+        self.assertEqual(response.json()['count'], 1)
+        response = self.client.post(
+            '/api/v1/friend-requests/bulk-accept/', {'all': True}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_list_is_paginated_and_bulk_view(self):
+        self.client.force_login(self.user1)
+        response = self.client.get(reverse('friend_request_list'))
+        self.assertEqual(response.context['paginator'].count, 5)
+        response = self.client.post(reverse('bulk_friend_requests'), {'action': 'accept', 'all': '1'})
+        self.assertRedirects(response, reverse('friend_request_list'))
+        self.assertEqual(CharacterFriend.objects.count(), 5)
+
+
+class FriendshipImportTestCase(MessagingTestMixin, TestCase):
+    def test_save_with_ids_does_not_fetch_characters(self):
+        low, high = CharacterFriend.ordered_pair(self.char1.pk, self.char2.pk)
+        friendship = CharacterFriend(character1_id=high, character2_id=low)
+        with CaptureQueriesContext(connection) as queries:
+            friendship.save()
+        self.assertEqual((friendship.character1_id, friendship.character2_id), (low, high))
+        character_lookup = 'FROM "app_character" WHERE "app_character"."id" ='
+        self.assertFalse([query for query in queries if character_lookup in query['sql']])
+
+    def test_import_pairs(self):
+        User = get_user_model()
+        others = [
+            Character.objects.create(
+                user=User.objects.create_user(username=f'guild{index}'), game=self.game, nickname=f'G{index}'
+            )
+            for index in range(3)
+        ]
+        CharacterFriend.objects.create(character1=self.char1, character2=self.char2)
+        pairs = [
+            (self.char2.pk, self.char1.pk),        # already friends
+            (str(self.char1.pk), str(others[0].pk)),
+            (others[0].pk, self.char1.pk),         # duplicate in the other order
+            (others[1].pk, others[2].pk),
+            (others[1].pk, others[1].pk),          # self-pair
+            (others[2].pk, uuid.uuid4()),          # unknown character
+        ]
+        self.assertEqual(CharacterFriend.import_pairs(pairs, batch_size=2), 2)
+        self.assertEqual(CharacterFriend.objects.count(), 3)
+        self.assertTrue(UserFriendship.are_friends(self.user1, others[0].user))
+        self.assertTrue(UserFriendship.are_friends(others[1].user, others[2].user))
+        self.assertEqual(CharacterFriend.import_pairs(pairs), 0)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csv_file:
+            csv_file.write(f'{self.char1.pk},{self.char2.pk}\n')
+        self.addCleanup(os.unlink, csv_file.name)
+        out = StringIO()
+        call_command('import_friendships', csv_file.name, stdout=out)
+        self.assertIn('Imported 1 friendships', out.getvalue())
+        self.assertEqual(UserFriendship.objects.get().character_pairs, 1)
+
+    def test_import_command_stops_at_invalid_row(self):
+        alt = Character.objects.create(user=self.user2, game=self.game, nickname='Alt')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csv_file:
+            csv_file.write(f'{self.char1.pk},{self.char2.pk}\nnot-a-uuid,{alt.pk}\n{self.char1.pk},{alt.pk}\n')
+        self.addCleanup(os.unlink, csv_file.name)
+        with self.assertRaisesMessage(CommandError, 'Invalid row 2'):
+            call_command('import_friendships', csv_file.name, '--batch-size', '1', stdout=StringIO())
+        # The batch before the invalid row stays imported
+        self.assertEqual(CharacterFriend.objects.count(), 1)
+
+    def test_user_friendships_count_only_inserted_rows(self):
+        alt = Character.objects.create(user=self.user2, game=self.game, nickname='Alt')
+        pairs = [
+            CharacterFriend.ordered_pair(self.char1.pk, self.char2.pk),
+            CharacterFriend.ordered_pair(self.char1.pk, alt.pk),
+        ]
+        # Inserted by someone else after the existence check
+        CharacterFriend.objects.bulk_create([CharacterFriend(character1_id=pairs[0][0], character2_id=pairs[0][1])])
+        self.assertEqual(CharacterFriend._insert_pairs(pairs, existing=set()), pairs[1:])
+        self.assertEqual(CharacterFriend.objects.count(), 2)
+
+
+class NicknameSearchTestCase(MessagingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def add_characters(self, nicknames):
+        characters = Character.objects.bulk_create([
+            Character(user=self.user2, game=self.game, nickname=nickname, hash_id=f's{index:09d}')
+            for index, nickname in enumerate(nicknames)
+        ])
+        index_nicknames(characters, replace=False)
+        return characters
+
+    def test_index_follows_saves_and_deletes(self):
+        def indexed(character):
+            return set(NicknameTrigram.objects.filter(character=character).values_list('trigram', flat=True))
+
+        self.assertEqual(indexed(self.char1), nickname_trigrams('Knight'))
+        self.assertEqual(search_nicknames('aladi'), [])
+        self.char1.nickname = 'Paladin'
+        self.char1.save()
+        self.assertEqual(indexed(self.char1), nickname_trigrams('Paladin'))
+        self.assertEqual(search_nicknames('night'), [])
+        self.assertEqual([hit.nickname for hit in search_nicknames('ALADI')], ['Paladin'])
+        character_id = self.char1.pk
+        self.char1.delete()
+        self.assertFalse(NicknameTrigram.objects.filter(character_id=character_id).exists())
+        self.assertEqual(search_nicknames('aladi'), [])
+
+    def test_trigrams_are_verified_as_substrings(self):
+        # Has every trigram of the query, but not the query
+        self.add_characters(['abcab'])
+        self.assertEqual(search_nicknames('bcabc'), [])
+        self.assertEqual(len(search_nicknames('bcab')), 1)
+
+    def test_ranking_matches_exact_similarity(self):
+        words = ['Dark', 'Knight', 'Dragon', 'Shadow', 'Lord', 'Dar']
+        self.add_characters([
+            f'{first}{second}{number}' for first in words for second in words for number in ('', '7', '2004')
+        ])
+        characters = list(Character.objects.values_list('pk', 'nickname'))
+        for query in ['dar', 'Dark', 'ark', 'rkKn', 'ordDa', 'ow20', 'ight']:
+            with self.subTest(query=query):
+                expected = sorted(
+                    (similarity(nickname, query) for pk, nickname in characters if query.lower() in nickname.lower()),
+                    reverse=True
+                )[:10]
+                hits = search_nicknames(query, limit=10)
+                self.assertEqual([hit.similarity for hit in hits], expected)
+                self.assertTrue(all(query.lower() in hit.nickname.lower() for hit in hits))
+
+    def test_short_queries_and_queryset_restriction(self):
+        mage = Character.objects.create(user=self.user2, game=self.game, nickname='Knightmage')
+        self.assertEqual({hit.character_id for hit in search_nicknames('kn')}, {self.char1.pk, mage.pk})
+
+        CharacterBlock.objects.create(blocker_character=mage, blocked_character=self.char1)
+        visible = Character.objects.visible_to(self.user1)
+        self.assertEqual([hit.character_id for hit in search_nicknames('night', queryset=visible)], [self.char1.pk])
+        self.assertEqual([hit.character_id for hit in search_nicknames('kn', queryset=visible)], [self.char1.pk])
+        self.assertEqual(search_nicknames('night', queryset=Character.objects.filter(user=self.user2)), [
+            (mage.pk, 'Knightmage', similarity('Knightmage', 'night'))
+        ])
+
+    def test_candidates_use_trigram_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('The trigram side table is only used on SQLite')
+        self.add_characters([f'Player{index}' for index in range(300)])
+        hits = search_nicknames('ayer12', limit=5)
+        self.assertEqual(hits[0].nickname, 'Player12')
+        self.assertEqual(len(hits), 5)
+        plan = rank_nicknames('ayer12').explain()
+        self.assertIn('USING COVERING INDEX', plan)
+        self.assertNotIn('SCAN app_nicknametrigram', plan)
+
+    def test_filtered_search_with_common_trigram(self):
+        other_game = Game.objects.create(name='Ultima Online', category=self.game.category)
+        self.add_characters([f'qzx{index}' for index in range(3200)])
+        legend = Character.objects.create(user=self.user2, game=other_game, nickname='TheLegendaryWarriorOfqzxLand')
+        queryset = Character.objects.filter(game=other_game)
+        self.assertEqual(list(queryset.filter(nickname__icontains='qzx')), [legend])
+        hits = search_nicknames('qzx', limit=100, queryset=queryset)
+        self.assertEqual([hit.character_id for hit in hits], [legend.pk])
+        self.assertEqual(rank_nicknames('qzx').count(), 3201)
+
+    def test_list_view_and_api(self):
+        Character.objects.create(user=self.user2, game=self.game, nickname='Knightmare')
+        response = self.client.get(reverse('character_list'), {'nickname': 'knight'})
+        self.assertEqual([character.nickname for character in response.context['characters']], ['Knight', 'Knightmare'])
+        # Every match can be paged to
+        self.add_characters([f'Knight{index:02d}' for index in range(20)])
+        response = self.client.get(reverse('character_list'), {'nickname': 'knight', 'page': 3})
+        self.assertEqual(response.context['paginator'].count, 22)
+        self.assertEqual(len(response.context['characters']), 2)
+
+        response = self.client.get('/api/v1/characters/search/', {'q': 'kn'})
+        self.assertEqual(response.status_code, 400)
+        data = self.client.get('/api/v1/characters/search/', {'q': 'nightm', 'limit': 5}).json()
+        self.assertEqual([item['character']['nickname'] for item in data], ['Knightmare'])
+        self.assertEqual(data[0]['similarity'], similarity('Knightmare', 'nightm'))
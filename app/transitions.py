@@ -0,0 +1,194 @@
+"""
+State transitions of POKEs and friend requests.
+
+Each transition locks its row, moves it with a guarded UPDATE
+(... WHERE status IN (<source states>)) and applies its side effects in the
+same transaction. When two requests race (double-click, retry) exactly one
+UPDATE matches and the other gets InvalidTransition instead of creating
+duplicate rows. UPDATE bypasses save() and post_save, so the side effects
+the signal receivers apply to ordinary saves (notification counters, the
+POKE inbox projection) are applied here explicitly.
+
+Rows that do not exist or do not belong to the acting user raise the
+model's DoesNotExist.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .counters import adjust_counters
+from .models import CharacterBlock, CharacterFriend, CharacterFriendRequest, Poke, PokeInboxEntry
+
+
+class InvalidTransition(Exception):
+    """The row is no longer in a state the transition starts from"""
+
+    def __init__(self, obj):
+        super().__init__(f"{obj._meta.object_name} {obj.pk} is {obj.status}")
+        self.obj = obj
+
+
+def _lock(queryset):
+    if connection.features.has_select_for_update_of:
+        return queryset.select_for_update(of=('self',))
+    return queryset.select_for_update()
+
+
+def transition(queryset, sources, target, **values):
+    """
+    Move the single row of queryset from one of the source statuses to
+    target, also setting values. Must run inside a transaction.
+    Returns (obj, previous_status) with obj updated in memory.
+    """
+    obj = _lock(queryset).get()
+    previous = obj.status
+    if previous not in sources:
+        raise InvalidTransition(obj)
+    # The status guard makes this safe even where SELECT FOR UPDATE is a no-op (SQLite)
+    updated = type(obj).objects.filter(pk=obj.pk, status__in=sources).update(status=target, **values)
+    if not updated:
+        raise InvalidTransition(obj)
+
+    obj.status = target
+    for field, value in values.items():
+        setattr(obj, field, value)
+    if hasattr(obj, '_loaded_state'):
+        obj._loaded_state['status'] = target
+    return obj, previous
+
+
+# POKEs ---------------------------------------------------
+
+def _received_poke(user, poke_id):
+    return Poke.objects.filter(pk=poke_id, receiver_character__user=user).select_related(
+        'sender_character', 'receiver_character'
+    )
+
+
+def _close_poke(poke, previous):
+    """Side effects of a poke leaving its previous status"""
+    if previous == 'PENDING' and not poke.is_read:
+        adjust_counters(poke.receiver_character.user_id, unread_pokes=-1)
+    PokeInboxEntry.sync_status(poke)
+
+
+def respond_poke(user, poke_id, content):
+    """PENDING -> RESPONDED, and POKE the sender back with content"""
+    with transaction.atomic():
+        poke, previous = transition(
+            _received_poke(user, poke_id), ['PENDING'], 'RESPONDED', responded_at=timezone.now()
+        )
+        _close_poke(poke, previous)
+        try:
+            with transaction.atomic():
+                Poke.objects.create(
+                    sender_character=poke.receiver_character,
+                    receiver_character=poke.sender_character,
+                    content=content,
+                    status='RESPONDED'
+                )
+        except IntegrityError:
+            # A POKE back already exists - the exchange is mutual either way
+            pass
+    return poke
+
+
+def ignore_poke(user, poke_id):
+    """PENDING -> IGNORED"""
+    with transaction.atomic():
+        poke, previous = transition(_received_poke(user, poke_id), ['PENDING'], 'IGNORED')
+        _close_poke(poke, previous)
+    return poke
+
+
+def block_poke(user, poke_id, reason='', report_spam=False):
+    """Any status -> BLOCKED, blocking further POKEs from the sender"""
+    values = {}
+    if report_spam:
+        values = {'reported_as_spam': True, 'reported_by': user, 'reported_at': timezone.now()}
+    sources = [status for status, label in Poke.STATUS_CHOICES if status != 'BLOCKED']
+    with transaction.atomic():
+        poke, previous = transition(_received_poke(user, poke_id), sources, 'BLOCKED', **values)
+        _close_poke(poke, previous)
+        CharacterBlock.block(
+            poke.receiver_character, poke.sender_character, scope=CharacterBlock.SCOPE_POKE, reason=reason
+        )
+    return poke
+
+
+# Friend requests -----------------------------------------
+
+def _received_friend_request(user, request_id):
+    return CharacterFriendRequest.objects.filter(pk=request_id, receiver_character__user=user).select_related(
+        'sender_character', 'receiver_character'
+    )
+
+
+def accept_friend_request(user, request_id):
+    """PENDING -> ACCEPTED, creating the friendship"""
+    with transaction.atomic():
+        friend_request, previous = transition(_received_friend_request(user, request_id), ['PENDING'], 'ACCEPTED')
+        adjust_counters(friend_request.receiver_character.user_id, pending_friend_requests=-1)
+        try:
+            with transaction.atomic():
+                CharacterFriend.objects.create(
+                    character1=friend_request.sender_character,
+                    character2=friend_request.receiver_character
+                )
+        except IntegrityError:
+            # Already friends (e.g. both sent a request and both were accepted)
+            pass
+    return friend_request
+
+
+def decline_friend_request(user, request_id):
+    """PENDING -> DECLINED"""
+    with transaction.atomic():
+        friend_request, previous = transition(_received_friend_request(user, request_id), ['PENDING'], 'DECLINED')
+        adjust_counters(friend_request.receiver_character.user_id, pending_friend_requests=-1)
+    return friend_request
+
+
+def _pending_received_friend_requests(user, request_ids=None, character_id=None):
+    queryset = CharacterFriendRequest.objects.filter(receiver_character__user=user, status='PENDING')
+    if request_ids is not None:
+        queryset = queryset.filter(pk__in=request_ids)
+    if character_id is not None:
+        queryset = queryset.filter(receiver_character_id=character_id)
+    return queryset.order_by()
+
+
+def bulk_accept_friend_requests(user, request_ids=None, character_id=None):
+    """
+    PENDING -> ACCEPTED for the user's received requests (the given ids
+    and/or all pending for one of their characters) in one transaction:
+    one UPDATE for the statuses and CharacterFriend.import_pairs (bulk_create
+    plus the friendship side effects) for the friendships of the requests
+    that UPDATE accepted. Returns the number of requests accepted.
+    """
+    with transaction.atomic():
+        rows = list(_lock(_pending_received_friend_requests(user, request_ids, character_id)).values_list(
+            'pk', 'sender_character_id', 'receiver_character_id'
+        ))
+        if not rows:
+            return 0
+        pending_ids = [row[0] for row in rows]
+        accepted = CharacterFriendRequest.objects.filter(
+            pk__in=pending_ids, status='PENDING'
+        ).update(status='ACCEPTED')
+        if accepted < len(rows):
+            # Some were declined or cancelled since they were read (no row locks, e.g. SQLite)
+            rows = list(CharacterFriendRequest.objects.filter(pk__in=pending_ids, status='ACCEPTED').values_list(
+                'pk', 'sender_character_id', 'receiver_character_id'
+            ))
+        adjust_counters(user.pk, pending_friend_requests=-accepted)
+
+        CharacterFriend.import_pairs((sender_id, receiver_id) for pk, sender_id, receiver_id in rows)
+    return accepted
+
+
+def bulk_decline_friend_requests(user, request_ids=None, character_id=None):
+    """PENDING -> DECLINED with one UPDATE; returns the number of requests declined"""
+    with transaction.atomic():
+        declined = _pending_received_friend_requests(user, request_ids, character_id).update(status='DECLINED')
+        adjust_counters(user.pk, pending_friend_requests=-declined)
+    return declined
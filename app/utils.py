@@ -1,21 +1,18 @@
 import hashlib
-import re
+from collections import namedtuple
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Q
+from django.db.models import Q, Exists, OuterRef
 
 
 def is_blocked(blocker_character, blocked_character):
     """
-    Check if blocker_character has blocked blocked_character.
-    Returns True if blocked, False otherwise.
+    Check if blocker_character has blocked blocked_character (full blocks,
+    checked in the database). Returns True if blocked, False otherwise.
     """
-    from app.models import CharacterBlock
-    return CharacterBlock.objects.filter(
-        blocker_character=blocker_character,
-        blocked_character=blocked_character
-    ).exists()
+    from app.blocks import has_block
+    return has_block(blocker_character.pk, blocked_character.pk, include_poke_blocks=False)
 
 def get_gravatar_url(email, size=40):
     email_hash = hashlib.md5(email.lower().encode('utf-8')).hexdigest()
@@ -32,6 +29,7 @@ def validate_poke_content(content):
     - Strip HTML tags
     """
     from django.utils.html import strip_tags
+    from app.content_filter import contains_email, contains_profanity, contains_url
     
     errors = []
     
@@ -46,99 +44,93 @@ def validate_poke_content(content):
         errors.append("HTML tags are not allowed")
     
     # Check for URLs/links
-    url_pattern = r'(http|https|www\.|\.com|\.net|\.org|://)'
     if getattr(settings, 'POKE_CONTENT_FILTER_URLS', True):
-        if re.search(url_pattern, content, re.IGNORECASE):
+        if contains_url(content):
             errors.append("URLs and links are not allowed in POKE content")
     
     # Check for email addresses
-    email_pattern = r'@'
     if getattr(settings, 'POKE_CONTENT_FILTER_EMAILS', True):
-        if re.search(email_pattern, content):
+        if contains_email(content):
             errors.append("Email addresses are not allowed in POKE content")
     
-    # Profanity filter (basic - can be enhanced)
+    # Profanity filter (Aho-Corasick over the wordlist, see app.content_filter)
     if getattr(settings, 'POKE_PROFANITY_FILTER_ENABLED', True):
-        profanity_list = getattr(settings, 'POKE_PROFANITY_WORDLIST', [])
-        content_lower = content.lower()
-        for word in profanity_list:
-            if word.lower() in content_lower:
-                errors.append("Inappropriate content is not allowed")
-                break
+        if contains_profanity(content):
+            errors.append("Inappropriate content is not allowed")
     
     return errors, clean_content if clean_content != content else content
 
 
+PokeEligibility = namedtuple('PokeEligibility', ['can_send', 'reason', 'pokes_remaining'])
+
+
+def poke_eligibility(user, receiver_characters):
+    """
+    Evaluate whether user can send a POKE to each of receiver_characters
+    (characters or their ids) with a single query, plus the count of POKEs
+    sent in the last 24 hours for the daily limit (app.ratelimit).
+    Returns {receiver_id: PokeEligibility(can_send, reason, pokes_remaining)};
+    unknown ids are left out.
+    """
+    from app.models import Poke, Character, CharacterBlock
+    from app.ratelimit import get_rate_limiter
+
+    receiver_ids = {getattr(receiver, 'pk', receiver) for receiver in receiver_characters}
+    if not receiver_ids:
+        return {}
+
+    daily_limit = get_rate_limiter('poke').check(user.pk)
+    cooldown_days = getattr(settings, 'POKE_COOLDOWN_DAYS', 30)
+    now = timezone.now()
+    sent_pokes = Poke.objects.filter(sender_character__user=user)
+
+    rows = Character.objects.filter(pk__in=receiver_ids).annotate(
+        sender_has_characters=Exists(Character.objects.filter(user=user)),
+        # Full and POKE-only blocks live in the same table
+        is_blocked=Exists(CharacterBlock.objects.filter(
+            blocker_character=OuterRef('pk'),
+            blocked_character__user=user
+        )),
+        recent_poke=Exists(sent_pokes.filter(
+            receiver_character=OuterRef('pk'),
+            sent_date__gte=now - timedelta(days=cooldown_days)
+        )),
+        existing_poke=Exists(sent_pokes.filter(receiver_character=OuterRef('pk'))),
+    ).values(
+        'pk', 'user_id', 'sender_has_characters', 'is_blocked', 'recent_poke', 'existing_poke'
+    )
+
+    results = {}
+    for row in rows:
+        # Checks in order of precedence - the first failing one is the reason
+        if not row['sender_has_characters']:
+            reason = "You need to create a character first to send POKEs"
+        elif row['user_id'] == user.pk:
+            reason = "You cannot send POKE to your own character"
+        elif row['is_blocked']:
+            reason = "You have been blocked by this character"
+        elif not daily_limit.allowed:
+            reason = f"You can send maximum {daily_limit.limit} POKEs per 24 hours"
+        elif row['recent_poke']:
+            reason = f"You can send only 1 POKE to the same character per {cooldown_days} days"
+        elif row['existing_poke']:
+            # unique_together constraint on (sender, receiver)
+            reason = "You have already sent a POKE to this character"
+        else:
+            reason = None
+        results[row['pk']] = PokeEligibility(reason is None, reason, daily_limit.remaining)
+    return results
+
+
 def can_send_poke(user, receiver_character):
     """
     Check if user can send POKE to receiver_character.
     Returns (can_send: bool, reason: str or None)
     """
-    from app.models import Poke, PokeBlock, Character, CharacterBlock
-    
-    # Check if user has characters
-    user_characters = Character.objects.filter(user=user)
-    if not user_characters.exists():
-        return False, "You need to create a character first to send POKEs"
-    
-    # Check if receiver is from different user
-    if receiver_character.user == user:
-        return False, "You cannot send POKE to your own character"
-    
-    # Check for general block (CharacterBlock) - takes precedence
-    is_blocked = CharacterBlock.objects.filter(
-        blocker_character=receiver_character,
-        blocked_character__in=user_characters
-    ).exists()
-    if is_blocked:
-        return False, "You have been blocked by this character"
-    
-    # Check for POKE-specific blocks (legacy)
-    is_blocked = PokeBlock.objects.filter(
-        blocker_character=receiver_character,
-        blocked_character__user=user
-    ).exists()
-    if is_blocked:
-        return False, "You have been blocked by this character"
-    
-    # Rate limiting: Check daily limit per user
-    max_per_day = getattr(settings, 'POKE_MAX_PER_USER_PER_DAY', 5)
-    yesterday = timezone.now() - timedelta(days=1)
-    today_poke_count = Poke.objects.filter(
-        sender_character__user=user,
-        sent_date__gte=yesterday
-    ).count()
-    if today_poke_count >= max_per_day:
-        return False, f"You can send maximum {max_per_day} POKEs per 24 hours"
-    
-    # Cooldown: Check if POKE was sent to same character recently
-    cooldown_days = getattr(settings, 'POKE_COOLDOWN_DAYS', 30)
-    cooldown_date = timezone.now() - timedelta(days=cooldown_days)
-    recent_poke = Poke.objects.filter(
-        sender_character__user=user,
-        receiver_character=receiver_character,
-        sent_date__gte=cooldown_date
-    ).exists()
-    if recent_poke:
-        return False, f"You can send only 1 POKE to the same character per {cooldown_days} days"
-    
-    # Check if POKE already exists (unique_together constraint)
-    existing_poke = Poke.objects.filter(
-        sender_character__user=user,
-        receiver_character=receiver_character
-    ).exists()
-    if existing_poke:
-        return False, "You have already sent a POKE to this character"
-    
-    # Check receiver's profile visibility (respect privacy settings)
-    receiver_user = receiver_character.user
-    if hasattr(receiver_user, 'profile_visibility'):
-        if receiver_user.profile_visibility == 'PRIVATE':
-            # For private profiles, we might want to restrict - but let's allow for now
-            # and let user decide to block if unwanted
-            pass
-    
-    return True, None
+    eligibility = poke_eligibility(user, [receiver_character]).get(receiver_character.pk)
+    if eligibility is None:
+        return False, "Character not found"
+    return eligibility.can_send, eligibility.reason
 
 
 def can_send_message(sender_character, receiver_character):
@@ -146,22 +138,11 @@ def can_send_message(sender_character, receiver_character):
     Check if sender_character can send full Message to receiver_character.
     Full messaging is unlocked after mutual POKE exchange.
     """
-    from app.models import Poke, PokeBlock, CharacterBlock
+    from app.models import Poke
+    from app.blocks import has_block
     
-    # Check for general block (CharacterBlock) - takes precedence
-    is_blocked = CharacterBlock.objects.filter(
-        blocker_character=receiver_character,
-        blocked_character=sender_character
-    ).exists()
-    if is_blocked:
-        return False, "You have been blocked by this character"
-    
-    # Check for POKE-specific blocks (legacy)
-    is_blocked = PokeBlock.objects.filter(
-        blocker_character=receiver_character,
-        blocked_character=sender_character
-    ).exists()
-    if is_blocked:
+    # Full and POKE-only blocks, from the database: this guards a write
+    if has_block(receiver_character.pk, sender_character.pk):
         return False, "You have been blocked by this character"
     
     # Check if mutual POKE exists
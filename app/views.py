@@ -7,15 +7,19 @@ from django.views.generic.detail import DetailView
 from django.db.models import Q
 from django.urls import reverse, reverse_lazy
 from django_registration.backends.one_step.views import RegistrationView
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, Http404, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.core.exceptions import PermissionDenied
-from django.db import IntegrityError
+from django.core.paginator import Paginator
+from django.db import transaction
 import json
+import time
+import uuid
 
 from .forms import (
     AddCharacterForm, CharacterFilterForm, UserEditForm, GameForm,
@@ -24,10 +28,19 @@ from .forms import (
 )
 from .models import (
     Game, Character, Message, CustomUser, GameCategory, ProposedGame, Vote,
-    CharacterFriend, CharacterFriendRequest, CharacterProfile, Poke, PokeBlock,
-    CharacterIdentityReveal, CharacterBlock
+    CharacterFriend, CharacterFriendRequest, CharacterProfile, Poke,
+    CharacterIdentityReveal, CharacterBlock, Conversation, MessageArchive, PokeInboxEntry, UserFriendship
 )
-from .utils import can_send_poke, can_send_message
+from .utils import can_send_poke, can_send_message, poke_eligibility
+from .ratelimit import get_rate_limiter, rate_limit_message
+from .pagination import KeysetPaginator
+from . import transitions
+from .relationships import annotate_relationships
+from .blocks import get_block_set, has_block
+from .counters import adjust_counters, get_counters
+from .events import get_event_backend
+from .search import search_messages
+from .nickname_search import rank_nicknames
 
 
 
@@ -41,6 +54,17 @@ class BaseViewMixin:
 		return context
 
 
+class RelationshipMixin:
+	"""Attach the viewer's relationship (character.relationship) to the characters on the page"""
+
+	def get_context_data(self, **kwargs):
+		context = super().get_context_data(**kwargs)
+		context[self.context_object_name] = annotate_relationships(
+			self.request.user, context[self.context_object_name]
+		)
+		return context
+
+
 
 ### Simple Views --------------------------------------
 
@@ -233,16 +257,7 @@ class UserProfileDisplayView(DetailView):
 	
 	def _are_friends(self, user1, user2):
 		"""Check if users are friends through any characters"""
-		if not user2.is_authenticated:
-			return False
-		
-		user1_characters = Character.objects.filter(user=user1)
-		user2_characters = Character.objects.filter(user=user2)
-		
-		return CharacterFriend.objects.filter(
-			(Q(character1__in=user1_characters) & Q(character2__in=user2_characters)) |
-			(Q(character1__in=user2_characters) & Q(character2__in=user1_characters))
-		).exists()
+		return UserFriendship.are_friends(user1, user2)
 	
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
@@ -366,7 +381,7 @@ class AddCharacterView(BaseViewMixin, LoginRequiredMixin, CreateView):
 		return render(request, self.template_name, context)
 
 
-class CharacterListView(BaseViewMixin, ListView):
+class CharacterListView(RelationshipMixin, BaseViewMixin, ListView):
 	model = Character
 	template_name = 'characters/character_list.html'
 	current_page = 'characters'
@@ -377,7 +392,7 @@ class CharacterListView(BaseViewMixin, ListView):
 		form = CharacterFilterForm(self.request.GET)
 		game_slug = self.kwargs.get('game_slug')  # Pobieranie sluga gry z URL
 
-		queryset = Character.objects.select_related('user', 'game').all()
+		queryset = Character.objects.visible_to(self.request.user).select_related('user', 'game')
 
 		if form.is_valid():
 			game = form.cleaned_data.get('game') or game_slug
@@ -397,7 +412,8 @@ class CharacterListView(BaseViewMixin, ListView):
 				)
 
 			if nickname:
-				queryset = queryset.filter(nickname__icontains=nickname)
+				# Every match through the nickname index, closest first, paginated like the rest
+				return rank_nicknames(nickname, queryset)
 
 			return queryset
 
@@ -511,13 +527,10 @@ class CharacterView(BaseViewMixin, DetailView):
 			
 			# Check if character is blocked by any of user's characters
 			is_blocked_by_user = False
-			blocking_block = None
 			if character.user != user and user_characters.exists():
-				blocking_block = CharacterBlock.objects.filter(
-					blocker_character__in=user_characters,
-					blocked_character=character
-				).first()
-				is_blocked_by_user = blocking_block is not None
+				is_blocked_by_user = bool(
+					get_block_set(character.pk).blocked_by & {c.pk for c in user_characters}
+				)
 			
 			context['is_friend'] = is_friend
 			context['pending_request'] = pending_request
@@ -526,7 +539,6 @@ class CharacterView(BaseViewMixin, DetailView):
 			context['can_send_full_message'] = can_send_full_message
 			context['matching_character'] = matching_character
 			context['is_blocked_by_user'] = is_blocked_by_user
-			context['blocking_block'] = blocking_block
 		
 		# Get character profile if exists
 		try:
@@ -550,6 +562,7 @@ class FriendRequestListView(LoginRequiredMixin, ListView):
 	template_name = 'friends/friend_request_list.html'
 	context_object_name = 'friend_requests'
 	current_page = 'friends'
+	paginate_by = 20
 	
 	def get_queryset(self):
 		user_characters = Character.objects.filter(user=self.request.user)
@@ -558,7 +571,9 @@ class FriendRequestListView(LoginRequiredMixin, ListView):
 		return CharacterFriendRequest.objects.filter(
 			receiver_character__in=user_characters,
 			status='PENDING'
-		).select_related('sender_character', 'sender_character__game', 'sender_character__user').order_by('-sent_date')
+		).select_related(
+			'sender_character', 'sender_character__game', 'sender_character__user', 'receiver_character'
+		).order_by('-sent_date', '-id')
 	
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
@@ -573,22 +588,10 @@ class AcceptFriendRequestView(LoginRequiredMixin, View):
 	"""Accept a friend request"""
 	
 	def post(self, request, request_id):
-		friend_request = get_object_or_404(
-			CharacterFriendRequest,
-			id=request_id,
-			receiver_character__user=request.user,
-			status='PENDING'
-		)
-		
-		# Create friendship
-		CharacterFriend.objects.create(
-			character1=friend_request.sender_character,
-			character2=friend_request.receiver_character
-		)
-		
-		# Update request status
-		friend_request.status = 'ACCEPTED'
-		friend_request.save()
+		try:
+			friend_request = transitions.accept_friend_request(request.user, request_id)
+		except (CharacterFriendRequest.DoesNotExist, transitions.InvalidTransition):
+			raise Http404(_("Friend request not found."))
 		
 		messages.success(request, f'Accepted friend request from {friend_request.sender_character.nickname}!')
 		return redirect('friend_request_list')
@@ -598,20 +601,46 @@ class DeclineFriendRequestView(LoginRequiredMixin, View):
 	"""Decline a friend request"""
 	
 	def post(self, request, request_id):
-		friend_request = get_object_or_404(
-			CharacterFriendRequest,
-			id=request_id,
-			receiver_character__user=request.user,
-			status='PENDING'
-		)
-		
-		friend_request.status = 'DECLINED'
-		friend_request.save()
+		try:
+			friend_request = transitions.decline_friend_request(request.user, request_id)
+		except (CharacterFriendRequest.DoesNotExist, transitions.InvalidTransition):
+			raise Http404(_("Friend request not found."))
 		
 		messages.info(request, f'Declined friend request from {friend_request.sender_character.nickname}.')
 		return redirect('friend_request_list')
 
 
+class BulkFriendRequestView(LoginRequiredMixin, View):
+	"""Accept or decline many friend requests at once: the selected ones, all pending for one character, or all"""
+	
+	def post(self, request):
+		action = request.POST.get('action')
+		if action not in ('accept', 'decline'):
+			messages.error(request, _('Unknown action.'))
+			return redirect('friend_request_list')
+		
+		request_ids = None
+		character_id = None
+		if request.POST.get('character'):
+			try:
+				character_id = uuid.UUID(request.POST['character'])
+			except ValueError:
+				raise Http404(_("Character not found."))
+		elif not request.POST.get('all'):
+			request_ids = [int(pk) for pk in request.POST.getlist('request_ids') if pk.isdigit()]
+			if not request_ids:
+				messages.info(request, _('No friend requests selected.'))
+				return redirect('friend_request_list')
+		
+		if action == 'accept':
+			count = transitions.bulk_accept_friend_requests(request.user, request_ids, character_id)
+			messages.success(request, _('Accepted %(count)d friend requests.') % {'count': count})
+		else:
+			count = transitions.bulk_decline_friend_requests(request.user, request_ids, character_id)
+			messages.info(request, _('Declined %(count)d friend requests.') % {'count': count})
+		return redirect('friend_request_list')
+
+
 class SendFriendRequestView(LoginRequiredMixin, View):
 	"""Handle friend request sending from UI"""
 	
@@ -644,13 +673,15 @@ class SendFriendRequestView(LoginRequiredMixin, View):
 			return redirect('character_detail', nickname=nickname, hash_id=hash_id)
 		
 		# Check if receiver has blocked sender
-		if CharacterBlock.objects.filter(
-			blocker_character=receiver_character,
-			blocked_character=sender_character
-		).exists():
+		if has_block(receiver_character.pk, sender_character.pk, include_poke_blocks=False):
 			messages.error(request, _('You cannot send a friend request to this character.'))
 			return redirect('character_detail', nickname=nickname, hash_id=hash_id)
 		
+		rate_limit = get_rate_limiter('friend_request').check(request.user.id)
+		if not rate_limit.allowed:
+			messages.error(request, rate_limit_message(rate_limit))
+			return redirect('character_detail', nickname=nickname, hash_id=hash_id)
+		
 		# Create friend request
 		friend_request = CharacterFriendRequest.objects.create(
 			sender_character=sender_character,
@@ -877,7 +908,7 @@ class GameDetailView(BaseViewMixin, DetailView):
 
 		return context
 
-class GamePlayersView(BaseViewMixin, ListView):
+class GamePlayersView(RelationshipMixin, BaseViewMixin, ListView):
 	model = Character
 	template_name = 'games/game_players.html'
 	context_object_name = 'characters'
@@ -886,7 +917,7 @@ class GamePlayersView(BaseViewMixin, ListView):
 
 	def get_queryset(self):
 		game_slug = self.kwargs.get('slug')
-		return Character.objects.filter(game__slug=game_slug).select_related('user', 'game')
+		return Character.objects.visible_to(self.request.user).filter(game__slug=game_slug).select_related('user', 'game')
 
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
@@ -949,11 +980,37 @@ class GameDeleteView(BaseViewMixin, DeleteView):
 		return super().delete(request, *args, **kwargs)
 
 ### Played Games --------------------------------------
+def wants_json(request):
+    """True for fetch() calls that asked for a JSON response"""
+    return request.headers.get('Accept', '').startswith('application/json')
+
 class MessageListView(LoginRequiredMixin, ListView):
     model = Message
     context_object_name = 'messages'
     template_name = 'messages/message_list.html'
-    paginate_by = 50
+    paginate_by = None  # Threads use keyset pagination, see get_thread_page()
+    thread_page = None
+
+    def get_thread_page(self, thread_id):
+        """Newest messages of a thread, or the slice around ?before= / ?after= cursor"""
+        paginator = KeysetPaginator(
+            Message.objects.filter(thread_id=thread_id).select_related(
+                'sender_character', 'sender_character__user'
+            ),
+            per_page=getattr(settings, 'MESSAGE_THREAD_PAGE_SIZE', 50)
+        )
+        before = self.request.GET.get('before')
+        after = self.request.GET.get('after')
+        try:
+            self.thread_page = paginator.page(before=before, after=after)
+        except ValueError:
+            # Malformed cursor - fall back to the newest messages
+            before = after = None
+            self.thread_page = paginator.page()
+        if not self.thread_page.has_older and MessageArchive.restore(thread_id):
+            # Reached the start of an archived thread - its older messages are back now
+            self.thread_page = paginator.page(before=before, after=after)
+        return self.thread_page.object_list
 
     def get(self, request, *args, **kwargs):
         """Mark messages as read when viewing a thread"""
@@ -961,12 +1018,9 @@ class MessageListView(LoginRequiredMixin, ListView):
         
         thread_id = request.GET.get('thread_id')
         if thread_id:
+            # Move the read watermark instead of updating every unread message
             user_characters = Character.objects.filter(user=request.user)
-            Message.objects.filter(
-                thread_id=thread_id,
-                receiver_character__in=user_characters,
-                is_read=False
-            ).update(is_read=True, read_at=timezone.now())
+            Conversation.mark_read(user_characters, thread_ids=thread_id)
         
         return response
 
@@ -976,20 +1030,21 @@ class MessageListView(LoginRequiredMixin, ListView):
         user_characters = Character.objects.filter(user=self.request.user)
 
         if thread_id:
-            # Jeśli mamy thread_id, pobierz wszystkie wiadomości z tej konwersacji
-            return Message.objects.filter(thread_id=thread_id).order_by('sent_date')
+            # Jeśli mamy thread_id, pobierz najnowsze wiadomości z tej konwersacji
+            return self.get_thread_page(thread_id)
         elif receiver_character_id:
             # Jeśli mamy character_id, znajdź lub utwórz nowy wątek
             try:
                 receiver_character = Character.objects.get(id=receiver_character_id)
                 # Znajdź istniejący wątek
-                existing_thread = Message.objects.filter(
-                    models.Q(sender_character__in=user_characters, receiver_character=receiver_character) |
-                    models.Q(receiver_character__in=user_characters, sender_character=receiver_character)
-                ).values_list('thread_id', flat=True).first()
+                sender_character_id = self.request.GET.get('sender')
+                if sender_character_id and user_characters.filter(id=sender_character_id).exists():
+                    existing_thread = Conversation.thread_id_for(sender_character_id, receiver_character.id)
+                else:
+                    existing_thread = Conversation.find_thread_id(user_characters, receiver_character)
 
                 if existing_thread:
-                    return Message.objects.filter(thread_id=existing_thread).order_by('sent_date')
+                    return self.get_thread_page(existing_thread)
                 else:
                     return Message.objects.none()
             except Character.DoesNotExist:
@@ -1010,59 +1065,47 @@ class MessageListView(LoginRequiredMixin, ListView):
             context['error_message'] = _("You need to create a character first to send messages.")
             return context
 
-        # Build conversation list for sidebar
-        user_threads = Message.objects.filter(
-            models.Q(sender_character__in=user_characters) |
-            models.Q(receiver_character__in=user_characters)
-        ).values_list('thread_id', flat=True).distinct()
+        # Build conversation list for sidebar from the materialized conversation index
+        conversation_rows = Conversation.for_characters(user_characters).select_related(
+            'character_a',
+            'character_b',
+            'character_a__game',
+            'character_b__game',
+            'last_message'
+        ).order_by('-last_sent_date')
+        sidebar_page = Paginator(
+            conversation_rows,
+            getattr(settings, 'MESSAGE_SIDEBAR_PAGE_SIZE', 30)
+        ).get_page(self.request.GET.get('conversations_page'))
+        user_character_ids = set(user_characters.values_list('id', flat=True))
 
         conversations = []
-        for thread_id_value in user_threads:
-            thread_messages = Message.objects.filter(
-                thread_id=thread_id_value
-            ).select_related(
-                'sender_character',
-                'receiver_character',
-                'sender_character__game',
-                'receiver_character__game'
-            ).order_by('-sent_date')
-
-            if thread_messages.exists():
-                latest_message = thread_messages.first()
-
-                # Determine other character (not user's character)
-                if latest_message.sender_character in user_characters:
-                    other_character = latest_message.receiver_character
-                else:
-                    other_character = latest_message.sender_character
-
-                # Count unread messages for this thread
-                unread_count = Message.objects.filter(
-                    thread_id=thread_id_value,
-                    receiver_character__in=user_characters,
-                    is_read=False
-                ).count()
-
-                # Get message preview (first 100 chars)
-                preview = latest_message.content[:100]
-                if len(latest_message.content) > 100:
-                    preview += "..."
-
-                conversations.append({
-                    'thread_id': thread_id_value,
-                    'other_character': other_character,
-                    'latest_message': latest_message,
-                    'unread_count': unread_count,
-                    'message_preview': preview,
-                })
-
-        # Sort by latest message date (newest first)
-        conversations.sort(
-            key=lambda x: x['latest_message'].sent_date,
-            reverse=True
-        )
+        for conversation in sidebar_page:
+            # Determine user's side of the conversation
+            own_character_id = (
+                conversation.character_a_id
+                if conversation.character_a_id in user_character_ids
+                else conversation.character_b_id
+            )
+            latest_message = conversation.last_message
+
+            # Get message preview (first 100 chars)
+            preview = latest_message.content[:100] if latest_message else ''
+            if latest_message and len(latest_message.content) > 100:
+                preview += "..."
+
+            conversations.append({
+                'thread_id': conversation.thread_id,
+                'other_character': conversation.other_character(own_character_id),
+                'latest_message': latest_message,
+                'last_sent_date': conversation.last_sent_date,
+                'unread_count': conversation.unread_count_for(own_character_id),
+                'message_preview': preview,
+            })
 
         context['conversations'] = conversations
+        context['conversations_page'] = sidebar_page
+        context['thread_page'] = self.thread_page
         context['current_thread_id'] = thread_id
         context['current_character_id'] = receiver_character_id
 
@@ -1173,6 +1216,10 @@ class MessageListView(LoginRequiredMixin, ListView):
             receiver_character=receiver_character
         )
 
+        rate_limit = get_rate_limiter('message').check(request.user.id)
+        if not rate_limit.allowed:
+            form.add_error(None, rate_limit_message(rate_limit))
+
         if form.is_valid():
             message = form.save(commit=False)
             sender_character_id = request.POST.get('sender_character')
@@ -1199,29 +1246,7 @@ class MessageListView(LoginRequiredMixin, ListView):
 
                 message.sender_character = matching_character
 
-            # Sprawdź czy istnieje już wątek dla tej pary rozmówców
-            thread_id = request.GET.get('thread_id')
-
-            if thread_id:
-                # Użyj istniejącego thread_id jeśli jest dostępny
-                message.thread_id = thread_id
-            else:
-                # Spróbuj znaleźć istniejący wątek dla tych rozmówców
-                existing_thread = Message.objects.filter(
-                    models.Q(
-                        sender_character=message.sender_character,
-                        receiver_character=message.receiver_character
-                    ) | models.Q(
-                        sender_character=message.receiver_character,
-                        receiver_character=message.sender_character
-                    )
-                ).values_list('thread_id', flat=True).first()
-
-                if existing_thread:
-                    # Użyj istniejącego thread_id
-                    message.thread_id = existing_thread
-                # W przeciwnym razie zostanie wygenerowane nowe thread_id
-
+            # thread_id jest wyznaczany z pary rozmówców w Message.save()
             message.save()
 
             # Przekieruj z powrotem do konwersacji z zachowaniem informacji o nadawcy
@@ -1233,12 +1258,149 @@ class MessageListView(LoginRequiredMixin, ListView):
             # Zawsze dołącz thread_id do URL, aby zapewnić spójność konwersacji
             redirect_url += f"&thread_id={message.thread_id}"
 
+            if wants_json(request):
+                # The page appends the message itself when the live event arrives
+                return JsonResponse({'id': message.id, 'thread_id': str(message.thread_id), 'url': redirect_url})
             return redirect(redirect_url)
 
+        if wants_json(request):
+            return JsonResponse({'errors': form.errors}, status=400)
+
         # Jeśli formularz jest nieprawidłowy, pokaż stronę z błędami
         context = self.get_context_data(object_list=self.get_queryset(), form=form)
         return self.render_to_response(context)
 
+class MarkConversationsReadView(LoginRequiredMixin, View):
+    """Mark many conversations (or all of them with all=1) as read at once"""
+
+    def post(self, request, *args, **kwargs):
+        user_characters = Character.objects.filter(user=request.user)
+        thread_ids = None
+        if request.POST.get('all') != '1':
+            thread_ids = request.POST.getlist('thread_id')
+            try:
+                thread_ids = [uuid.UUID(thread_id) for thread_id in thread_ids]
+            except ValueError:
+                return JsonResponse({'error': _('Invalid thread id.')}, status=400)
+
+        updated = Conversation.mark_read(user_characters, thread_ids=thread_ids)
+
+        if wants_json(request):
+            return JsonResponse({'updated': updated})
+        messages.success(request, _("Conversations marked as read."))
+        return redirect('message_list')
+
+class MessageThreadSliceView(LoginRequiredMixin, View):
+    """Return older (?before=) or newer (?after=) messages of a thread as JSON"""
+
+    def get(self, request, thread_id):
+        user_characters = Character.objects.filter(user=request.user)
+        if not Conversation.for_characters(user_characters).filter(thread_id=thread_id).exists():
+            raise Http404(_("Conversation not found."))
+
+        paginator = KeysetPaginator(
+            Message.objects.filter(thread_id=thread_id).select_related(
+                'sender_character', 'sender_character__user'
+            ),
+            per_page=getattr(settings, 'MESSAGE_THREAD_PAGE_SIZE', 50)
+        )
+        try:
+            page = paginator.page(
+                before=request.GET.get('before'),
+                after=request.GET.get('after')
+            )
+            if not page.has_older and MessageArchive.restore(thread_id):
+                page = paginator.page(before=request.GET.get('before'), after=request.GET.get('after'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        user_character_ids = set(user_characters.values_list('id', flat=True))
+        include_html = request.GET.get('html') == '1'
+        thread_messages = []
+        for message in page:
+            data = {
+                'id': message.id,
+                'sender_character': str(message.sender_character_id),
+                'sender_nickname': message.sender_character.nickname if message.sender_character else None,
+                'is_own': message.sender_character_id in user_character_ids,
+                'content': message.content,
+                'sent_date': message.sent_date.isoformat(),
+                'privacy_mode': message.privacy_mode,
+                'identity_revealed': message.identity_revealed,
+            }
+            if include_html:
+                # Same markup as the thread page, for appending live messages
+                data['html'] = render_to_string('messages/message_bubble.html', {'message': message}, request=request)
+            thread_messages.append(data)
+
+        return JsonResponse({
+            'messages': thread_messages,
+            'has_older': page.has_older,
+            'has_newer': page.has_newer,
+            'older_cursor': page.older_cursor,
+            'newer_cursor': page.newer_cursor,
+        })
+
+class MessageSearchView(LoginRequiredMixin, TemplateView):
+    """Full-text search over the user's conversations"""
+    template_name = 'messages/message_search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        try:
+            page = int(self.request.GET.get('page', 1))
+        except ValueError:
+            page = 1
+
+        context['query'] = query
+        context['page_obj'] = search_messages(
+            self.request.user,
+            query,
+            page=page,
+            per_page=getattr(settings, 'MESSAGE_SEARCH_PAGE_SIZE', 20)
+        )
+        return context
+
+class EventStreamView(View):
+    """
+    Server-Sent Events stream of live events (messages, POKEs, friend requests)
+    for the logged-in user. Meant to be served by the ASGI application, so it
+    is off unless EVENT_STREAM_ENABLED.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        if not getattr(settings, 'EVENT_STREAM_ENABLED', False):
+            # 204 tells EventSource not to reconnect
+            return HttpResponse(status=204)
+
+        response = StreamingHttpResponse(self.stream(user.pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx: do not buffer the stream
+        return response
+
+    async def stream(self, user_id):
+        heartbeat = getattr(settings, 'EVENT_STREAM_HEARTBEAT', 15)
+        # Streams are recycled periodically; EventSource reconnects on its own
+        deadline = time.monotonic() + getattr(settings, 'EVENT_STREAM_MAX_AGE', 300)
+
+        events = get_event_backend().listen(user_id, timeout=heartbeat)
+        try:
+            await anext(events)  # subscribed - nothing published from now on is missed
+            yield f"retry: {heartbeat * 1000}\n\n"
+            async for event in events:
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if time.monotonic() >= deadline:
+                    break
+        finally:
+            await events.aclose()
+
 class UserCharactersListView(BaseViewMixin, ListView):
     model = Character
     template_name = 'characters/user_characters_list.html'
@@ -1316,19 +1478,18 @@ class SendMessageView(LoginRequiredMixin, FormView):
             )
             return redirect(f"{reverse('send_poke')}?character={receiver_character.id}&sender_character={matching_character.id}")
 
-        message.sender_character = matching_character
-        thread_id = self.request.GET.get('thread_id')
-
-        if thread_id:
-            message.thread_id = thread_id
+        rate_limit = get_rate_limiter('message').check(self.request.user.id)
+        if not rate_limit.allowed:
+            form.add_error(None, rate_limit_message(rate_limit))
+            return self.form_invalid(form)
 
+        message.sender_character = matching_character
+        # thread_id is derived from the character pair in Message.save()
         message.save()
 
         # Redirect back to conversation
         redirect_url = f"{reverse('message_list')}?character={message.receiver_character.id}"
-        
-        if thread_id:
-            redirect_url += f"&thread_id={message.thread_id}"
+        redirect_url += f"&thread_id={message.thread_id}"
 
         return redirect(redirect_url)
 
@@ -1336,8 +1497,8 @@ class SendMessageView(LoginRequiredMixin, FormView):
 ### POKE System Views --------------------------------------
 
 class PokeListView(BaseViewMixin, LoginRequiredMixin, ListView):
-    """List received and sent POKEs"""
-    model = Poke
+    """List received and sent POKEs, paged with cursors over the POKE inbox projection"""
+    model = PokeInboxEntry
     template_name = 'pokes/poke_list.html'
     context_object_name = 'pokes'
     paginate_by = 50
@@ -1346,42 +1507,37 @@ class PokeListView(BaseViewMixin, LoginRequiredMixin, ListView):
     def get_queryset(self):
         user_characters = Character.objects.filter(user=self.request.user)
         status_filter = self.request.GET.get('status', 'all')
-        
-        # Get received POKEs
-        received_pokes = Poke.objects.filter(
-            receiver_character__in=user_characters
-        ).select_related('sender_character', 'sender_character__game', 'sender_character__user')
-        
-        # Get sent POKEs
-        sent_pokes = Poke.objects.filter(
-            sender_character__in=user_characters
-        ).select_related('receiver_character', 'receiver_character__game', 'receiver_character__user')
+        queryset = PokeInboxEntry.objects.filter(owner_character__in=user_characters)
         
         # Filter by status
         if status_filter == 'received':
-            queryset = received_pokes
+            queryset = queryset.filter(direction=PokeInboxEntry.RECEIVED)
         elif status_filter == 'sent':
-            queryset = sent_pokes
+            queryset = queryset.filter(direction=PokeInboxEntry.SENT)
         elif status_filter == 'pending':
-            queryset = received_pokes.filter(status='PENDING')
-        else:
-            # Combine both, prioritizing received
-            queryset = received_pokes.union(sent_pokes, all=True)
+            queryset = queryset.filter(direction=PokeInboxEntry.RECEIVED, status='PENDING')
         
-        return queryset.order_by('-sent_date')
+        return queryset.select_related(
+            'other_character', 'poke', 'poke__sender_character__game'
+        )
+    
+    def paginate_queryset(self, queryset, page_size):
+        """Keyset pages (?before=/?after= cursors) - no COUNT, no OFFSET"""
+        paginator = KeysetPaginator(queryset, page_size, newest_first=True)
+        try:
+            page = paginator.page(
+                before=self.request.GET.get('before'),
+                after=self.request.GET.get('after')
+            )
+        except ValueError:
+            raise Http404(_("Invalid cursor."))
+        return paginator, page, page.object_list, page.has_older or page.has_newer
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user_characters = Character.objects.filter(user=self.request.user)
-        
-        # Count unread POKEs
-        unread_count = Poke.objects.filter(
-            receiver_character__in=user_characters,
-            is_read=False,
-            status='PENDING'
-        ).count()
         
-        context['unread_count'] = unread_count
+        # Unread POKEs come from the maintained notification counters
+        context['unread_count'] = get_counters(self.request.user.id)['unread_pokes']
         context['status_filter'] = self.request.GET.get('status', 'all')
         context['title'] = _('POKEs')
         context['content_template'] = 'pokes/poke_list_content.html'
@@ -1433,17 +1589,19 @@ class SendPokeView(BaseViewMixin, LoginRequiredMixin, FormView):
         # Get user's characters for selection
         context['user_characters'] = Character.objects.filter(user=self.request.user)
         
-        # Check rate limits
-        from django.utils import timezone
-        from datetime import timedelta
+        # Rate limits - reuse the eligibility already evaluated by the form on POST
         from django.conf import settings
-        yesterday = timezone.now() - timedelta(days=1)
-        today_poke_count = Poke.objects.filter(
-            sender_character__user=self.request.user,
-            sent_date__gte=yesterday
-        ).count()
+        eligibility = getattr(context.get('form'), 'eligibility', None)
+        if eligibility is None and 'receiver_character' in context:
+            eligibility = poke_eligibility(self.request.user, [context['receiver_character']])[
+                context['receiver_character'].pk
+            ]
+        context['poke_eligibility'] = eligibility
+        if eligibility is not None:
+            context['pokes_remaining'] = eligibility.pokes_remaining
+        else:
+            context['pokes_remaining'] = get_rate_limiter('poke').check(self.request.user.id).remaining
         max_per_day = getattr(settings, 'POKE_MAX_PER_USER_PER_DAY', 5)
-        context['pokes_remaining'] = max(0, max_per_day - today_poke_count)
         context['max_per_day'] = max_per_day
         
         return context
@@ -1471,13 +1629,13 @@ class PokeDetailView(BaseViewMixin, LoginRequiredMixin, DetailView):
     
     def get_object(self, queryset=None):
         poke = super().get_object(queryset)
-        # Mark as read if user is receiver
-        user_characters = Character.objects.filter(user=self.request.user)
-        if poke.receiver_character in user_characters and not poke.is_read:
-            poke.is_read = True
-            from django.utils import timezone
+        # Mark as read if user is receiver (guarded UPDATE - no write if already read)
+        if poke.receiver_character.user_id == self.request.user.id and not poke.is_read:
             poke.read_at = timezone.now()
-            poke.save(update_fields=['is_read', 'read_at'])
+            poke.is_read = True
+            marked = Poke.objects.filter(pk=poke.pk, is_read=False).update(is_read=True, read_at=poke.read_at)
+            if marked and poke.status == 'PENDING':
+                adjust_counters(self.request.user.id, unread_pokes=-1)
         return poke
     
     def get_context_data(self, **kwargs):
@@ -1497,95 +1655,65 @@ class PokeDetailView(BaseViewMixin, LoginRequiredMixin, DetailView):
         return context
 
 
+class MarkPokesReadView(LoginRequiredMixin, View):
+    """Mark all received POKEs as read with a single UPDATE"""
+    def post(self, request):
+        now = timezone.now()
+        unread_pokes = Poke.objects.filter(receiver_character__user=request.user, is_read=False)
+        with transaction.atomic():
+            marked_pending = unread_pokes.filter(status='PENDING').update(is_read=True, read_at=now)
+            unread_pokes.update(is_read=True, read_at=now)
+            adjust_counters(request.user.id, unread_pokes=-marked_pending)
+        messages.success(request, _("All POKEs marked as read."))
+        return redirect('poke_list')
+
+
 class RespondPokeView(LoginRequiredMixin, View):
     """Respond to POKE by sending POKE back"""
     def post(self, request, poke_id):
-        poke = get_object_or_404(
-            Poke.objects.select_related('sender_character', 'receiver_character'),
-            id=poke_id
-        )
-        
-        # Verify user is receiver
-        user_characters = Character.objects.filter(user=request.user)
-        if poke.receiver_character not in user_characters:
-            raise PermissionDenied("You can only respond to POKEs sent to your characters")
-        
-        if poke.status != 'PENDING':
+        try:
+            # Default response, can be customized later
+            transitions.respond_poke(request.user, poke_id, content=_("Hello! I received your POKE."))
+        except Poke.DoesNotExist:
+            raise Http404(_("POKE not found."))
+        except transitions.InvalidTransition:
             messages.error(request, _("This POKE has already been handled."))
             return redirect('poke_detail', poke_id=poke_id)
         
-        # Create response POKE
-        try:
-            response_poke = Poke.objects.create(
-                sender_character=poke.receiver_character,
-                receiver_character=poke.sender_character,
-                content=_("Hello! I received your POKE."),  # Default response, can be customized later
-                status='RESPONDED'
-            )
-            
-            # Mark original POKE as responded
-            from django.utils import timezone
-            poke.status = 'RESPONDED'
-            poke.responded_at = timezone.now()
-            poke.save(update_fields=['status', 'responded_at'])
-            
-            messages.success(request, _("POKE sent! You can now send full messages."))
-        except IntegrityError:
-            messages.error(request, _("You have already sent a POKE to this character."))
-        
+        messages.success(request, _("POKE sent! You can now send full messages."))
         return redirect('poke_list')
 
 
 class IgnorePokeView(LoginRequiredMixin, View):
     """Ignore a POKE"""
     def post(self, request, poke_id):
-        poke = get_object_or_404(Poke, id=poke_id)
-        
-        # Verify user is receiver
-        user_characters = Character.objects.filter(user=request.user)
-        if poke.receiver_character not in user_characters:
-            raise PermissionDenied("You can only ignore POKEs sent to your characters")
-        
-        if poke.status != 'PENDING':
+        try:
+            transitions.ignore_poke(request.user, poke_id)
+        except Poke.DoesNotExist:
+            raise Http404(_("POKE not found."))
+        except transitions.InvalidTransition:
             messages.error(request, _("This POKE has already been handled."))
             return redirect('poke_detail', poke_id=poke_id)
         
-        poke.status = 'IGNORED'
-        poke.save(update_fields=['status'])
         messages.info(request, _("POKE ignored."))
-        
         return redirect('poke_list')
 
 
 class BlockPokeView(LoginRequiredMixin, View):
     """Block a sender and optionally report as spam"""
     def post(self, request, poke_id):
-        poke = get_object_or_404(
-            Poke.objects.select_related('sender_character', 'receiver_character'),
-            id=poke_id
-        )
-        
-        # Verify user is receiver
-        user_characters = Character.objects.filter(user=request.user)
-        if poke.receiver_character not in user_characters:
-            raise PermissionDenied("You can only block POKEs sent to your characters")
-        
-        # Create block
-        PokeBlock.objects.get_or_create(
-            blocker_character=poke.receiver_character,
-            blocked_character=poke.sender_character,
-            defaults={'reason': request.POST.get('reason', '')}
-        )
-        
-        # Mark POKE as blocked and optionally report as spam
-        poke.status = 'BLOCKED'
-        if request.POST.get('report_spam') == 'on':
-            poke.reported_as_spam = True
-            poke.reported_by = request.user
-            from django.utils import timezone
-            poke.reported_at = timezone.now()
-        
-        poke.save()
+        try:
+            transitions.block_poke(
+                request.user,
+                poke_id,
+                reason=request.POST.get('reason', ''),
+                report_spam=request.POST.get('report_spam') == 'on'
+            )
+        except Poke.DoesNotExist:
+            raise Http404(_("POKE not found."))
+        except transitions.InvalidTransition:
+            # Already blocked - blocking again changes nothing
+            pass
         
         messages.success(request, _("Sender blocked. You will not receive more POKEs from this character."))
         return redirect('poke_list')
@@ -1632,14 +1760,12 @@ class BlockCharacterView(LoginRequiredMixin, View):
             
             # Create block
             from django.utils import timezone
-            block, created = CharacterBlock.objects.get_or_create(
-                blocker_character=blocking_character,
-                blocked_character=character_to_block,
-                defaults={
-                    'reason': reason,
-                    'reported_as_spam': report_spam,
-                    'reported_at': timezone.now() if report_spam else None
-                }
+            block, created = CharacterBlock.block(
+                blocking_character,
+                character_to_block,
+                reason=reason,
+                reported_as_spam=report_spam,
+                reported_at=timezone.now() if report_spam else None
             )
             
             if created:
@@ -0,0 +1,9 @@
+# game_player_nick_finder/asgi.py
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'game_player_nick_finder.settings')
+
+application = get_asgi_application()
@@ -58,12 +58,15 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'app.context_processors.notification_counts',
+                'app.context_processors.live_events',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'game_player_nick_finder.wsgi.application'
+ASGI_APPLICATION = 'game_player_nick_finder.asgi.application'
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -125,10 +128,46 @@ ACCOUNT_USER_MODEL_USERNAME_FIELD = 'username'
 POKE_MAX_CONTENT_LENGTH = 100
 POKE_MAX_PER_USER_PER_DAY = 5
 POKE_COOLDOWN_DAYS = 30  # Days between POKEs to same character
+POKE_EXPIRE_AFTER_DAYS = 30  # expire_pokes: PENDING POKEs older than this become EXPIRED
+POKE_PURGE_AFTER_DAYS = 180  # expire_pokes: IGNORED/BLOCKED/EXPIRED POKEs older than this are deleted
 POKE_CONTENT_FILTER_URLS = True
 POKE_CONTENT_FILTER_EMAILS = True
 POKE_PROFANITY_FILTER_ENABLED = True
 POKE_PROFANITY_WORDLIST = []  # Can be loaded from file or environment
+# One term per line, reloaded when modified
+POKE_PROFANITY_WORDLIST_FILE = os.environ.get('POKE_PROFANITY_WORDLIST_FILE')
+
+# Rate limits of write actions per user (see app/ratelimit.py). Entries replace
+# the defaults whole; the POKE limit follows POKE_MAX_PER_USER_PER_DAY unless
+# overridden here. Daily limits are 'exact' (counted in the database) so they
+# hold across workers.
+RATE_LIMITS = {
+    'friend_request': {'algorithm': 'sliding_window', 'limit': 20, 'window': 24 * 60 * 60, 'exact': True},
+    'message': {'algorithm': 'token_bucket', 'capacity': 20, 'rate': 1 / 3},  # burst of 20, then one per 3s
+}
+
+# Messaging Settings
+MESSAGE_SIDEBAR_PAGE_SIZE = 30  # Conversations per sidebar page
+MESSAGE_THREAD_PAGE_SIZE = 50  # Messages per thread slice
+MESSAGE_SEARCH_PAGE_SIZE = 20  # Hits per message search page
+MESSAGE_ARCHIVE_AFTER_MONTHS = 6  # archive_inactive_threads: inactivity before a thread is archived
+NOTIFICATION_COUNTS_CACHE_TIMEOUT = 300  # Seconds to cache navbar badge counters
+
+# "Players you might know" (see app/suggestions.py)
+SUGGESTIONS_TOP_K = 20  # Suggestions cached per character
+SUGGESTIONS_MAX_FRONTIER = 500  # Friends expanded for the second hop
+SUGGESTIONS_MUTUAL_FRIEND_WEIGHT = 3
+SUGGESTIONS_SHARED_GAME_WEIGHT = 1
+
+# Live events (Server-Sent Events stream, see app/events.py)
+# Each open tab holds a stream for EVENT_STREAM_MAX_AGE, which ties up a whole
+# worker under WSGI: only enable it when served through asgi.py (uvicorn/daphne).
+# Without it pages poll the open thread every EVENT_POLL_INTERVAL seconds.
+EVENT_STREAM_ENABLED = os.environ.get('EVENT_STREAM_ENABLED', '').lower() in ('1', 'true')
+EVENT_POLL_INTERVAL = 15
+EVENT_BACKEND = 'app.events.InProcessEventBackend'
+EVENT_STREAM_HEARTBEAT = 15  # Seconds between keep-alive comments
+EVENT_STREAM_MAX_AGE = 300  # Seconds before a stream is closed and the browser reconnects
 
 # Social Account Providers
 SOCIALACCOUNT_PROVIDERS = {
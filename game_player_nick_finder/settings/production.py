@@ -41,6 +41,10 @@ else:
         }
     }
 
+# Live events across workers need a shared pub/sub
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    EVENT_BACKEND = 'app.events.PostgresEventBackend'
+
 # Session settings
 SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
 SESSION_COOKIE_SECURE = True  # Require HTTPS
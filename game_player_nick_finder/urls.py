@@ -18,6 +18,7 @@ router.register(r'characters', api_views.CharacterViewSet)
 router.register(r'friend-requests', api_views.CharacterFriendRequestViewSet, basename='friend-request')
 router.register(r'character-profiles', api_views.CharacterProfileViewSet, basename='character-profile')
 router.register(r'user-profiles', api_views.UserProfileViewSet, basename='user-profile')
+router.register(r'messages', api_views.MessageViewSet, basename='message')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -76,6 +77,10 @@ urlpatterns = [
 
     path('messages/', MessageListView.as_view(), name='message_list'),
     path('messages/send/', SendMessageView.as_view(), name='send_message'),
+    path('messages/thread/<uuid:thread_id>/', views.MessageThreadSliceView.as_view(), name='message_thread_slice'),
+    path('messages/search/', views.MessageSearchView.as_view(), name='message_search'),
+    path('events/stream/', views.EventStreamView.as_view(), name='event_stream'),
+    path('messages/mark-read/', views.MarkConversationsReadView.as_view(), name='mark_conversations_read'),
 
     path('api/v1/', include(router.urls)),
 
@@ -87,12 +92,14 @@ urlpatterns = [
     
     # Friend requests
     path('friends/requests/', views.FriendRequestListView.as_view(), name='friend_request_list'),
+    path('friends/requests/bulk/', views.BulkFriendRequestView.as_view(), name='bulk_friend_requests'),
     path('friends/requests/<int:request_id>/accept/', views.AcceptFriendRequestView.as_view(), name='accept_friend_request'),
     path('friends/requests/<int:request_id>/decline/', views.DeclineFriendRequestView.as_view(), name='decline_friend_request'),
     
     # POKE system
     path('pokes/', PokeListView.as_view(), name='poke_list'),
     path('pokes/send/', SendPokeView.as_view(), name='send_poke'),
+    path('pokes/mark-read/', views.MarkPokesReadView.as_view(), name='mark_pokes_read'),
     path('pokes/<uuid:poke_id>/', PokeDetailView.as_view(), name='poke_detail'),
     path('pokes/<uuid:poke_id>/respond/', RespondPokeView.as_view(), name='respond_poke'),
     path('pokes/<uuid:poke_id>/ignore/', IgnorePokeView.as_view(), name='ignore_poke'),